@@ -1,3 +1,37 @@
 from django.contrib import admin
 
-# Register your models here.
+from .pagination import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist без полных COUNT и перечисления значений в фильтрах."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class SoftDeleteAdmin(LargeTableAdmin):
+    """Удаление через пометку, строки удаляет purge_deleted.
+
+    Страница подтверждения не обходит связанные объекты: у автора
+    с тысячами рецептов это загрузило бы их все в память.
+    """
+
+    def soft_delete(self, queryset):
+        raise NotImplementedError
+
+    def delete_model(self, request, obj):
+        self.soft_delete(self.model._default_manager.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        self.soft_delete(queryset)
+
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        return (
+            [str(obj) for obj in objs],
+            {self.model._meta.verbose_name_plural: len(objs)},
+            set(),
+            [],
+        )
@@ -0,0 +1,265 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
+
+from users.models import Subscription
+
+from .compression import precompress
+
+
+def make_etag(*values):
+    return f'"{hashlib.md5(repr(values).encode()).hexdigest()}"'
+
+
+def is_shared(alias):
+    """Видят ли все процессы одни и те же значения кеша alias.
+
+    У LocMemCache свой кеш в каждом процессе: сброс поколения в одном
+    процессе не доходит до остальных.
+    """
+    backend = settings.CACHES[alias]['BACKEND']
+    return not backend.endswith(('.LocMemCache', '.DummyCache'))
+
+
+class ConditionalRetrieveMixin:
+    """ETag и Last-Modified для retrieve с ответом 304 без сериализации.
+
+    View реализует get_validators(), который возвращает пару
+    (etag, last_modified) одним легким запросом.
+    """
+
+    def get_validators(self):
+        raise NotImplementedError
+
+    def retrieve(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        timestamp = last_modified.timestamp() if last_modified else None
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(
+                response, public=True, max_age=settings.PUBLIC_CACHE_MAX_AGE
+            )
+        patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
+
+
+class FeedCache:
+    """Кеш страниц ленты рецептов для анонимов.
+
+    Ключ страницы включает поколения тегов и авторов из фильтра (или общее
+    поколение ленты без фильтров), поэтому изменение рецепта сбрасывает
+    только страницы с его тегами и автором. Переименование тега или
+    ингредиента сбрасывает все страницы через глобальное поколение.
+    Пересчет страницы выполняет один процесс, остальные ждут готовый
+    результат.
+
+    Сброс работает только в общем для процессов кеше, поэтому при
+    FEED_CACHE['ENABLED'] = None кеш включается лишь тогда, когда кеш
+    alias общий (Redis, Memcached).
+    """
+
+    params = frozenset((
+        'page', 'page_size', 'author', 'tag', 'fields', 'expand'
+    ))
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def enabled(self):
+        enabled = settings.FEED_CACHE['ENABLED']
+        return is_shared(self.alias) if enabled is None else enabled
+
+    def generation_keys(self, tags, authors):
+        if not tags and not authors:
+            return ['feed:gen:global', 'feed:gen:all']
+        return (
+            ['feed:gen:global']
+            + [f'feed:gen:tag:{slug}' for slug in tags]
+            + [f'feed:gen:author:{author}' for author in authors]
+        )
+
+    def get_generations(self, keys):
+        generations = self.cache.get_many(keys)
+        for key in keys:
+            if key not in generations:
+                # Начинаем со времени, чтобы вытесненный счетчик
+                # не вернул старые страницы.
+                self.cache.add(key, time.time_ns(), None)
+                generations[key] = self.cache.get(key)
+        return [generations[key] for key in keys]
+
+    def key(self, request):
+        params = request.query_params
+        if not self.enabled or not set(params) <= self.params:
+            return None
+        normalized = sorted(
+            (name, sorted(params.getlist(name))) for name in params
+        )
+        tags = sorted(set(params.getlist('tag')))
+        authors = sorted(set(params.getlist('author')))
+        generations = self.get_generations(
+            self.generation_keys(tags, authors)
+        )
+        digest = hashlib.md5(
+            repr((request.get_host(), normalized, generations)).encode()
+        ).hexdigest()
+        return f'feed:page:{digest}'
+
+    def get_or_set(self, key, compute):
+        config = settings.FEED_CACHE
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+
+        lock = f'{key}:lock'
+        deadline = time.monotonic() + config['LOCK_TIMEOUT']
+        locked = self.cache.add(lock, 1, config['LOCK_TIMEOUT'])
+        while not locked and time.monotonic() < deadline:
+            time.sleep(0.05)
+            data = self.cache.get(key)
+            if data is not None:
+                return data
+            locked = self.cache.add(lock, 1, config['LOCK_TIMEOUT'])
+
+        try:
+            data = compute()
+            self.cache.set(key, data, config['TIMEOUT'])
+        finally:
+            if locked:
+                self.cache.delete(lock)
+        return data
+
+    def invalidate(self, author_id=None, tags=()):
+        keys = ['feed:gen:all', *(f'feed:gen:tag:{slug}' for slug in tags)]
+        if author_id is not None:
+            keys.append(f'feed:gen:author:{author_id}')
+        self.bump(keys)
+
+    def invalidate_all(self):
+        self.bump(['feed:gen:global'])
+
+    def bump(self, keys):
+        for key in keys:
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.add(key, time.time_ns(), None)
+
+
+feed_cache = FeedCache()
+
+
+class PrecompressedCache:
+    """Отрендеренный ответ вместе с заранее сжатыми вариантами."""
+
+    def __init__(self, name, alias='default'):
+        self.name = name
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get_or_set(self, version, render):
+        generation_key = f'{self.name}:gen'
+        self.cache.add(generation_key, time.time_ns(), None)
+        key = f'{self.name}:{self.cache.get(generation_key)}:{version}'
+        entry = self.cache.get(key)
+        if entry is None:
+            content = render()
+            entry = {
+                'etag': make_etag(content),
+                'variants': precompress(content),
+            }
+            self.cache.set(key, entry, settings.CATALOG_CACHE_TIMEOUT)
+        return entry
+
+    def invalidate(self):
+        try:
+            self.cache.incr(f'{self.name}:gen')
+        except ValueError:
+            pass
+
+
+catalog_cache = PrecompressedCache('catalog:ingredients')
+
+
+class SubscriberCountCache:
+    """Число подписчиков пользователей, считается только для промахов.
+
+    Подписчики, помеченные на удаление, не считаются. Как и FeedCache,
+    при SUBSCRIBER_COUNT_CACHE = None кеширует только в общем кеше:
+    сброс в памяти одного процесса остальные не увидят.
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def enabled(self):
+        enabled = settings.SUBSCRIBER_COUNT_CACHE
+        return is_shared(self.alias) if enabled is None else enabled
+
+    def count(self, user_ids):
+        counts = dict.fromkeys(user_ids, 0)
+        counts.update(Subscription.objects.filter(
+            author_id__in=user_ids, user__deleted_at__isnull=True
+        ).values('author_id').annotate(
+            total=Count('id')
+        ).values_list('author_id', 'total').order_by())
+        return counts
+
+    def key(self, user_id):
+        return f'user:subscribers:{user_id}'
+
+    def get_many(self, user_ids):
+        if not self.enabled:
+            return self.count(user_ids)
+        keys = {self.key(pk): pk for pk in user_ids}
+        counts = {
+            keys[key]: value
+            for key, value in self.cache.get_many(keys).items()
+        }
+        missing = [pk for pk in user_ids if pk not in counts]
+        if missing:
+            fresh = self.count(missing)
+            self.cache.set_many(
+                {self.key(pk): value for pk, value in fresh.items()},
+                settings.SUBSCRIBER_COUNT_TIMEOUT
+            )
+            counts.update(fresh)
+        return counts
+
+    def invalidate(self, user_id):
+        self.cache.delete(self.key(user_id))
+
+    def invalidate_many(self, user_ids):
+        self.cache.delete_many([self.key(pk) for pk in user_ids])
+
+
+subscriber_counts = SubscriberCountCache()
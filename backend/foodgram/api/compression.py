@@ -0,0 +1,48 @@
+import gzip
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def available_encodings():
+    return tuple(
+        encoding for encoding in settings.RESPONSE_COMPRESSION['ENCODINGS']
+        if encoding != 'br' or brotli is not None
+    )
+
+
+def choose_encoding(accept_encoding):
+    """Первое из настроенных сжатий, которое клиент принимает с q > 0."""
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in available_encodings():
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(content, encoding):
+    config = settings.RESPONSE_COMPRESSION
+    if encoding == 'br':
+        return brotli.compress(content, quality=config['BROTLI_QUALITY'])
+    return gzip.compress(content, compresslevel=config['GZIP_LEVEL'], mtime=0)
+
+
+def precompress(content):
+    variants = {'identity': content}
+    if len(content) >= settings.RESPONSE_COMPRESSION['MIN_SIZE']:
+        for encoding in available_encodings():
+            variants[encoding] = compress(content, encoding)
+    return variants
@@ -0,0 +1,121 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import CASCADE, SET_NULL
+from django.db.models.deletion import get_candidate_relations_to_delete
+from django.utils import timezone
+
+from recipe.models import Recipe, Tag
+from sync.log import record
+from sync.models import Change
+from users.models import Subscription
+
+from .cache import feed_cache, subscriber_counts
+
+User = get_user_model()
+
+
+def soft_delete_recipes(recipes):
+    """Скрывает рецепты сразу, строки удаляет purge()."""
+    rows = list(recipes.values_list('id', 'author_id'))
+    if not rows:
+        return 0
+    ids = [pk for pk, _ in rows]
+    tags = list(Tag.objects.filter(
+        recipes__in=recipes.values('id')
+    ).values_list('slug', flat=True).distinct())
+    recipes.update(deleted_at=timezone.now())
+    for author_id in {author_id for _, author_id in rows}:
+        feed_cache.invalidate(author_id, tags)
+    record(Change.RECIPE, ids, deleted=True)
+    return len(ids)
+
+
+def soft_delete_users(users):
+    """Блокирует пользователей и скрывает их рецепты."""
+    ids = list(users.filter(deleted_at__isnull=True).values_list(
+        'id', flat=True
+    ))
+    if not ids:
+        return 0
+    soft_delete_recipes(Recipe.objects.filter(author__in=ids))
+    User.objects.filter(id__in=ids).update(
+        is_active=False, deleted_at=timezone.now()
+    )
+    # Удаленные подписчики больше не входят в число подписчиков.
+    subscriber_counts.invalidate_many(Subscription.objects.filter(
+        user__in=ids
+    ).values_list('author_id', flat=True).distinct())
+    record(Change.USER, ids, deleted=True)
+    return len(ids)
+
+
+def purge_rows(queryset, batch_size):
+    """Удаляет строки и все зависимые от них пакетами по batch_size.
+
+    В отличие от QuerySet.delete() объекты не загружаются в память и
+    сигналы не отправляются: каждый пакет зависимых удаляется одним
+    DELETE ... WHERE id IN (...), поэтому блокировки короткие.
+    """
+    model = queryset.model
+    total = 0
+    while ids := list(queryset.values_list('pk', flat=True)[:batch_size]):
+        for relation in get_candidate_relations_to_delete(model._meta):
+            name = relation.field.name
+            related = relation.related_model._base_manager.filter(
+                **{f'{name}__in': ids}
+            )
+            if relation.on_delete is CASCADE:
+                purge_rows(related, batch_size)
+            elif relation.on_delete is SET_NULL:
+                related.update(**{name: None})
+        rows = model._base_manager.filter(pk__in=ids)
+        total += rows._raw_delete(rows.db)
+    return total
+
+
+def purge_users(batch_size):
+    users = User.objects.filter(deleted_at__isnull=False)
+    authors = Subscription.objects.filter(
+        user__in=users.values('id')
+    ).values_list('author_id', flat=True).distinct()
+    for author_id in authors.iterator():
+        subscriber_counts.invalidate(author_id)
+    return purge_rows(users, batch_size)
+
+
+def delete_orphan_images():
+    """Удаляет из каталога картинок рецептов файлы без рецепта.
+
+    Свежие файлы не трогаем: их рецепт может быть еще не закоммичен.
+    """
+    field = Recipe._meta.get_field('image')
+    storage = field.storage
+    try:
+        _, files = storage.listdir(field.upload_to)
+    except FileNotFoundError:
+        return 0
+    used = set(Recipe.all_objects.exclude(image='').values_list(
+        'image', flat=True
+    ))
+    horizon = timezone.now() - timedelta(
+        seconds=settings.PURGE['ORPHAN_GRACE']
+    )
+    removed = 0
+    for name in files:
+        path = f'{field.upload_to}/{name}'
+        if path in used or storage.get_modified_time(path) > horizon:
+            continue
+        storage.delete(path)
+        removed += 1
+    return removed
+
+
+def purge(batch_size=None):
+    batch_size = batch_size or settings.PURGE['BATCH_SIZE']
+    recipes = purge_rows(
+        Recipe.all_objects.filter(deleted_at__isnull=False), batch_size
+    )
+    users = purge_users(batch_size)
+    return recipes, users, delete_orphan_images()
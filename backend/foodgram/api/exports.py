@@ -0,0 +1,53 @@
+from functools import cache
+from io import BytesIO
+
+from .meal_plan import cart_ingredients
+
+
+@cache
+def load_reportlab():
+    """ReportLab (вместе с PIL) импортируется при первом PDF.
+
+    Так процессы и команды manage.py, которые не строят PDF, не платят за
+    импорт при старте. Шрифт регистрируется один раз на процесс.
+    """
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    pdfmetrics.registerFont(TTFont('Vera', 'Vera.ttf', 'UTF-8'))
+    return canvas
+
+
+def render_shopping_cart(user):
+    """PDF со списком покупок пользователя."""
+    canvas = load_reportlab()
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer)
+    x = 50
+    y = 800
+    indent = 15
+    shopping_cart = sorted(
+        cart_ingredients(user), key=lambda item: item['amount']
+    )
+    if not shopping_cart:
+        p.setFont('Vera', 20)
+        p.drawString(x, y, 'Список пуст')
+        p.save()
+        return buffer.getvalue()
+
+    p.setFont('Vera', 20)
+    p.drawString(x, y, 'Список покупок :')
+    p.setFont('Vera', 16)
+    for i, recipe in enumerate(shopping_cart, start=1):
+        p.drawString(
+            x, y - indent, f'{i}. {recipe["name"]} -'
+            f'{recipe["amount"]} {recipe["measurement_unit"]}.'
+        )
+        y -= 15
+        if y <= 50:
+            p.showPage()
+            p.setFont('Vera', 16)
+            y = 800
+    p.save()
+    return buffer.getvalue()
@@ -0,0 +1,109 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from recipe.models import IngredientAmount, Recipe
+from .metrics import timed_serialization
+
+User = get_user_model()
+
+RECIPE_FIELDS = (
+    'id', 'author_id', 'image', 'is_in_shopping_cart', 'is_favorited',
+    'name', 'text', 'cooking_time', 'pub_date'
+)
+
+
+def datetime_representation(value):
+    if settings.USE_TZ and timezone.is_aware(value):
+        value = value.astimezone(timezone.get_current_timezone())
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+class FastRecipeListSerializer:
+    """Чтение ленты без ModelSerializer, вывод совпадает с RecipeSerializer.
+
+    Принимает строки .values(RECIPE_FIELDS) и подгружает авторов, теги и
+    ингредиенты тремя запросами для всей страницы.
+    """
+
+    def __init__(self, rows, request, subscribed_flag):
+        self.rows = rows
+        self.request = request
+        self.subscribed_flag = subscribed_flag
+        self.storage = Recipe._meta.get_field('image').storage
+
+    def get_authors(self):
+        authors = User.objects.filter(
+            id__in={row['author_id'] for row in self.rows}
+        ).annotate(is_subscribed=self.subscribed_flag).values(
+            'id', 'username', 'email', 'first_name', 'last_name',
+            'is_subscribed'
+        )
+        return {author['id']: author for author in authors}
+
+    def get_tags(self, ids):
+        tags = defaultdict(list)
+        rows = Recipe.tags.through.objects.filter(
+            recipe_id__in=ids
+        ).order_by('-tag_id').values_list(
+            'recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug'
+        )
+        for recipe_id, pk, name, color, slug in rows:
+            tags[recipe_id].append(
+                {'id': pk, 'name': name, 'color': color, 'slug': slug}
+            )
+        return tags
+
+    def get_ingredients(self, ids):
+        ingredients = defaultdict(list)
+        rows = IngredientAmount.objects.filter(
+            recipe_id__in=ids
+        ).order_by('id').values_list(
+            'recipe_id', 'ingredient_id', 'ingredient__name', 'amount',
+            'ingredient__measurement_unit'
+        )
+        for recipe_id, pk, name, amount, unit in rows:
+            ingredients[recipe_id].append({
+                'id': pk, 'name': name, 'amount': amount,
+                'measurement_unit': unit,
+            })
+        return ingredients
+
+    def get_image(self, name):
+        if not name:
+            return None
+        return self.request.build_absolute_uri(self.storage.url(name))
+
+    @property
+    def data(self):
+        with timed_serialization(self.request):
+            return self.to_representation()
+
+    def to_representation(self):
+        if not self.rows:
+            return []
+        ids = [row['id'] for row in self.rows]
+        authors = self.get_authors()
+        tags = self.get_tags(ids)
+        ingredients = self.get_ingredients(ids)
+        return [
+            {
+                'id': row['id'],
+                'author': authors[row['author_id']],
+                'ingredients': ingredients[row['id']],
+                'tags': tags[row['id']],
+                'image': self.get_image(row['image']),
+                'is_in_shopping_cart': row['is_in_shopping_cart'],
+                'is_favorited': row['is_favorited'],
+                'name': row['name'],
+                'text': row['text'],
+                'cooking_time': row['cooking_time'],
+                'pub_date': datetime_representation(row['pub_date']),
+            }
+            for row in self.rows
+        ]
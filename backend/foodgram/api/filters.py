@@ -1,5 +1,9 @@
+import sys
+
 import django_filters
 from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.db.models.functions import Upper
 from django_filters.fields import MultipleChoiceField
 
 from recipe.models import Ingredient, Recipe
@@ -22,25 +26,81 @@ class TagMultipleChoiceField(MultipleChoiceField):
                 )
 
 
-class TagFilter(django_filters.AllValuesFilter):
+class TagFilter(django_filters.MultipleChoiceFilter):
     field_class = TagMultipleChoiceField
 
 
 class RecipeFilter(django_filters.FilterSet):
     author = django_filters.ModelChoiceFilter(queryset=User.objects.all())
-    tag = TagFilter(field_name='tag')
+    tag = TagFilter(field_name='tags__slug')
     is_favorited = django_filters.BooleanFilter(field_name='is_favorited')
     is_in_shopping_cart = django_filters.BooleanFilter(
         field_name='is_in_shopping_cart')
+    ordering = django_filters.ChoiceFilter(
+        choices=(('popular', 'popular'),), method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tag', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tag', 'is_favorited', 'is_in_shopping_cart',
+                  'ordering')
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(
+            F('popularity__score').desc(nulls_last=True), '-pub_date'
+        )
 
 
 class IngrediendFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(lookup_expr='isstartswith')
+    name = django_filters.CharFilter(lookup_expr='istartswith')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
+
+
+def prefix_bound(prefix):
+    """Наименьшая строка больше всех строк, начинающихся с prefix.
+
+    None, если prefix состоит только из U+10FFFF и верхней границы нет.
+    Суррогаты пропускаются: их нельзя передать в базу.
+    """
+    stripped = prefix.rstrip(chr(sys.maxunicode))
+    if not stripped:
+        return None
+    code = ord(stripped[-1]) + 1
+    if 0xD800 <= code <= 0xDFFF:
+        code = 0xE000
+    return stripped[:-1] + chr(code)
+
+
+class UserFilter(django_filters.FilterSet):
+    """Поиск пользователей по началу username, имени или фамилии.
+
+    Условие - диапазон по UPPER(поле), чтобы работали функциональные индексы
+    на User, LIKE лишь перепроверяет найденные строки.
+    """
+
+    search_fields = ('username', 'first_name', 'last_name')
+
+    search = django_filters.CharFilter(method='filter_search')
+
+    class Meta:
+        model = User
+        fields = ('search',)
+
+    def filter_search(self, queryset, name, value):
+        prefix = value.upper()
+        bound = prefix_bound(prefix)
+        condition = Q()
+        for field in self.search_fields:
+            lookups = {
+                f'{field}_upper__gte': prefix,
+                f'{field}_upper__startswith': prefix,
+            }
+            if bound is not None:
+                lookups[f'{field}_upper__lt'] = bound
+            condition |= Q(**lookups)
+        return queryset.annotate(**{
+            f'{field}_upper': Upper(field) for field in self.search_fields
+        }).filter(condition)
@@ -0,0 +1,117 @@
+import json
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from recipe.models import Recipe
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = max(0, round(percent / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = 'Замер задержки, числа запросов и памяти основных эндпоинтов API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--email', default=None,
+                            help='Пользователь, от имени которого идут '
+                                 'запросы')
+        parser.add_argument('--host', default='localhost',
+                            help='Значение заголовка Host')
+        parser.add_argument('--output', default=None,
+                            help='Файл для результатов в JSON')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['email'])
+        recipe = Recipe.objects.order_by('-pub_date').first()
+        if recipe is None:
+            raise CommandError('Нет рецептов, выполните seed_benchmark')
+
+        client = APIClient(HTTP_HOST=options['host'])
+        client.force_authenticate(user)
+        scenarios = (
+            ('recipe_list', 'get', reverse('recipe_list')),
+            ('recipe_detail', 'get',
+             reverse('recipe_detail', args=(recipe.id,))),
+            ('subscription_list', 'get', reverse('subscription_list')),
+            ('ingredient_list', 'get', reverse('ingredient_list')),
+            ('download_shopping_cart', 'post',
+             reverse('download_shopping_cart')),
+        )
+
+        # Без лимитов: иначе повторы упираются в 429 и замеряется отказ.
+        results = {}
+        with override_settings(REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}
+        }):
+            for name, method, url in scenarios:
+                request = getattr(client, method)
+                results[name] = self.measure(
+                    request, url, options['iterations'], options['warmup']
+                )
+                self.report(name, results[name])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2)
+
+    def get_user(self, email):
+        users = User.objects.all()
+        if email:
+            users = users.filter(email=email)
+        else:
+            users = users.filter(shopping_cart__isnull=False)
+        user = users.first()
+        if user is None:
+            raise CommandError('Не найден пользователь для замеров')
+        return user
+
+    def measure(self, request, url, iterations, warmup):
+        for _ in range(warmup):
+            request(url)
+
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            response = request(url)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        # Память и запросы меряем отдельно, чтобы tracemalloc
+        # не искажал задержку.
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            response = request(url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'status': response.status_code,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries': len(queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+            'response_bytes': len(response.content),
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<24} status={result["status"]} '
+            f'p50={result["p50_ms"]}ms p95={result["p95_ms"]}ms '
+            f'queries={result["queries"]} '
+            f'memory={result["peak_memory_kb"]}KB'
+        )
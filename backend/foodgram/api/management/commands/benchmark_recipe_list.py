@@ -0,0 +1,49 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Сравнение быстрой и обычной сериализации ленты рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--page-sizes', type=int, nargs='+',
+                            default=(6, 50, 200))
+        parser.add_argument('--host', default='localhost',
+                            help='Значение заголовка Host')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(recipe__isnull=False).first()
+        if user is None:
+            raise CommandError('Нет рецептов, выполните seed_benchmark')
+        # Авторизованные запросы не попадают в кеш ленты.
+        client = APIClient(HTTP_HOST=options['host'])
+        client.force_authenticate(user)
+
+        for page_size in options['page_sizes']:
+            url = f'{reverse("recipe_list")}?page_size={page_size}'
+            with override_settings(FAST_RECIPE_LIST=False):
+                regular = self.measure(client, url, options['iterations'])
+            fast = self.measure(client, url, options['iterations'])
+            self.stdout.write(
+                f'page_size={page_size:<4} '
+                f'serializer={regular:.2f}ms fast={fast:.2f}ms '
+                f'speedup={regular / fast:.1f}x'
+            )
+
+    def measure(self, client, url, iterations):
+        client.get(url)
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,77 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.urls import reverse
+
+# Выполняется в новом процессе: импорты должны быть холодными.
+SCRIPT = '''
+import json
+import sys
+import time
+
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+result = {'setup': time.perf_counter() - start, 'warmup': 0.0}
+if sys.argv[1] == 'warm':
+    from api.warmup import warmup
+    start = time.perf_counter()
+    warmup()
+    result['warmup'] = time.perf_counter() - start
+from django.test import Client
+client = Client(HTTP_HOST=sys.argv[2])
+start = time.perf_counter()
+for path in sys.argv[3:]:
+    client.get(path)
+result['first_requests'] = time.perf_counter() - start
+result['modules'] = len(sys.modules)
+print(json.dumps(result))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Время запуска процесса и первых запросов без прогрева и с ним'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--host', default='localhost',
+                            help='Значение заголовка Host')
+
+    def handle(self, *args, **options):
+        paths = [
+            reverse('ingredient_list'), reverse('tag_list'),
+            reverse('recipe_list'),
+        ]
+        for mode in ('cold', 'warm'):
+            runs = [
+                self.run(mode, options['host'], paths)
+                for _ in range(options['iterations'])
+            ]
+            median = {
+                name: statistics.median(run[name] for run in runs)
+                for name in runs[0]
+            }
+            self.stdout.write(
+                f'{mode}: setup={median["setup"] * 1000:.0f}ms '
+                f'warmup={median["warmup"] * 1000:.0f}ms '
+                f'first_requests={median["first_requests"] * 1000:.0f}ms '
+                f'modules={median["modules"]:.0f}'
+            )
+
+    def run(self, mode, host, paths):
+        env = {
+            **os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE
+        }
+        output = subprocess.run(
+            [sys.executable, '-c', SCRIPT, mode, host, *paths],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, check=True,
+            text=True
+        ).stdout
+        return json.loads(output.splitlines()[-1])
@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from api.deletion import purge
+
+
+class Command(BaseCommand):
+    help = 'Удаление помеченных рецептов и пользователей и лишних картинок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="По умолчанию PURGE['BATCH_SIZE']")
+
+    def handle(self, *args, **options):
+        recipes, users, images = purge(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено строк рецептов: {recipes}, пользователей: {users}, '
+            f'файлов картинок: {images}'
+        ))
@@ -0,0 +1,61 @@
+import glob
+import json
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+ORDERINGS = ('total_ms', 'count', 'max_ms', 'duplicates', 'slow')
+
+
+class Command(BaseCommand):
+    help = 'Самые тяжелые и повторяющиеся SQL-запросы по логу QUERY_SAMPLER'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log', default=str(settings.QUERY_SAMPLER['LOG_FILE']),
+            help='Путь к логу (ротированные файлы читаются тоже)'
+        )
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--order-by', choices=ORDERINGS,
+                            default='total_ms')
+
+    def handle(self, *args, **options):
+        stats = defaultdict(lambda: {
+            'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'duplicates': 0,
+            'slow': 0, 'requests': 0, 'call_sites': Counter(), 'views': set(),
+        })
+        for path in sorted(glob.glob(f'{options["log"]}*')):
+            with open(path, encoding='utf-8') as file:
+                for line in file:
+                    record = json.loads(line)
+                    item = stats[record['fingerprint']]
+                    item['sql'] = record['sql']
+                    item['requests'] += 1
+                    item['count'] += record['count']
+                    item['total_ms'] += record['total_ms']
+                    item['max_ms'] = max(item['max_ms'], record['max_ms'])
+                    item['duplicates'] += record['duplicate']
+                    item['slow'] += record['slow']
+                    item['call_sites'].update(record['call_sites'])
+                    item['views'].add(record['view'])
+
+        if not stats:
+            self.stdout.write('Лог пуст')
+            return
+
+        ordered = sorted(
+            stats.items(), key=lambda item: item[1][options['order_by']],
+            reverse=True
+        )
+        for key, item in ordered[:options['top']]:
+            self.stdout.write(self.style.SUCCESS(
+                f'{key} total={item["total_ms"]:.1f}ms '
+                f'max={item["max_ms"]:.1f}ms count={item["count"]} '
+                f'requests={item["requests"]} '
+                f'duplicates={item["duplicates"]} slow={item["slow"]}'
+            ))
+            self.stdout.write(f'  views: {", ".join(sorted(item["views"]))}')
+            for site, count in item['call_sites'].most_common(3):
+                self.stdout.write(f'  {count} x {site}')
+            self.stdout.write(f'  {item["sql"][:300]}')
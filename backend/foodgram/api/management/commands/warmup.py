@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from api.warmup import warmup
+
+
+class Command(BaseCommand):
+    help = 'Прогрев маршрутов, сериализаторов, библиотек и кеша каталога'
+
+    def handle(self, *args, **options):
+        for name, duration in warmup().items():
+            self.stdout.write(f'{name:<12} {duration:.1f}ms')
@@ -0,0 +1,58 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from recipe.models import IngredientAmount
+
+AMOUNT_FIELDS = (
+    'recipe_id', 'ingredient_id', 'ingredient__name',
+    'ingredient__measurement_unit', 'amount'
+)
+
+
+def aggregate_ingredients(amounts, servings=None):
+    """Сводный список ингредиентов для набора рецептов.
+
+    amounts - queryset IngredientAmount, читается одним запросом.
+    servings - множители порций по id рецепта (Decimal с двумя знаками),
+    по умолчанию 1. Суммирование идет в сотых долях целыми числами по id
+    ингредиента, результат отсортирован по названию.
+    """
+    scale = {
+        pk: int(value * 100) for pk, value in (servings or {}).items()
+    }
+    totals = defaultdict(int)
+    ingredients = {}
+    for recipe_id, pk, name, unit, amount in amounts.values_list(
+            *AMOUNT_FIELDS).order_by():
+        totals[pk] += amount * scale.get(recipe_id, 100)
+        ingredients[pk] = (name, unit)
+
+    result = []
+    for pk, total in totals.items():
+        name, unit = ingredients[pk]
+        whole, cents = divmod(total, 100)
+        result.append({
+            'id': pk, 'name': name,
+            'amount': Decimal(total) / 100 if cents else whole,
+            'measurement_unit': unit,
+        })
+    result.sort(key=lambda item: (item['name'], item['id']))
+    return result
+
+
+def plan_ingredients(servings):
+    """Ингредиенты плана питания {id рецепта: множитель порций}."""
+    return aggregate_ingredients(
+        IngredientAmount.objects.filter(
+            recipe_id__in=servings, recipe__deleted_at__isnull=True
+        ),
+        servings
+    )
+
+
+def cart_ingredients(user):
+    return aggregate_ingredients(
+        IngredientAmount.objects.filter(
+            recipe__shopping_cart__user=user, recipe__deleted_at__isnull=True
+        )
+    )
@@ -0,0 +1,144 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from rest_framework.serializers import ListSerializer
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (
+    1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216
+)
+
+
+class Histogram:
+    """Гистограмма в памяти процесса, совместимая с форматом Prometheus."""
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, view, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(view)
+            if counts is None:
+                counts = self.values[view] = [0] * (len(self.buckets) + 3)
+            counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def expose(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} histogram',
+        ]
+        with self.lock:
+            values = {view: list(counts) for view, counts in
+                      self.values.items()}
+        for view, counts in sorted(values.items()):
+            total = 0
+            for bound, count in zip(self.buckets, counts):
+                total += count
+                lines.append(
+                    f'{self.name}_bucket{{view="{view}",le="{bound}"}} '
+                    f'{total}'
+                )
+            lines.append(
+                f'{self.name}_bucket{{view="{view}",le="+Inf"}} '
+                f'{counts[-1]}'
+            )
+            lines.append(f'{self.name}_sum{{view="{view}"}} {counts[-2]}')
+            lines.append(f'{self.name}_count{{view="{view}"}} {counts[-1]}')
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    'foodgram_request_duration_seconds',
+    'Полное время обработки запроса', DURATION_BUCKETS
+)
+DB_DURATION = Histogram(
+    'foodgram_db_duration_seconds',
+    'Время выполнения SQL-запросов за запрос', DURATION_BUCKETS
+)
+SERIALIZE_DURATION = Histogram(
+    'foodgram_serialize_duration_seconds',
+    'Время построения данных ответа сериализаторами, включая ленивые '
+    'SQL-запросы', DURATION_BUCKETS
+)
+RENDER_DURATION = Histogram(
+    'foodgram_render_duration_seconds',
+    'Время рендеринга ответа в байты (JSON, PDF)', DURATION_BUCKETS
+)
+QUERY_COUNT = Histogram(
+    'foodgram_db_queries',
+    'Число SQL-запросов за запрос', QUERY_BUCKETS
+)
+RESPONSE_SIZE = Histogram(
+    'foodgram_response_size_bytes',
+    'Размер тела ответа', SIZE_BUCKETS
+)
+
+HISTOGRAMS = (
+    REQUEST_DURATION, DB_DURATION, SERIALIZE_DURATION, RENDER_DURATION,
+    QUERY_COUNT, RESPONSE_SIZE
+)
+
+
+@contextmanager
+def timed_serialization(request):
+    """Прибавляет время блока к serialize_duration запроса Django."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if request is not None:
+            request = getattr(request, '_request', request)
+            request.serialize_duration = (
+                getattr(request, 'serialize_duration', 0.0)
+                + time.perf_counter() - start
+            )
+
+
+class TimedListSerializer(ListSerializer):
+
+    @property
+    def data(self):
+        with timed_serialization(self.context.get('request')):
+            return super().data
+
+
+class TimedDataMixin:
+    """Замеряет .data для PerformanceMiddleware.
+
+    Вложенные сериализаторы .data не вызывают и не учитываются дважды.
+    Для many=True в Meta нужен list_serializer_class = TimedListSerializer.
+    """
+
+    @property
+    def data(self):
+        with timed_serialization(self.context.get('request')):
+            return super().data
+
+
+def metrics(request):
+    """Гистограммы для staff и адресов из METRICS_ALLOWED_IPS."""
+    if not (request.user.is_staff
+            or request.META.get('REMOTE_ADDR')
+            in settings.METRICS_ALLOWED_IPS):
+        raise Http404
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.expose())
+    return HttpResponse(
+        '\n'.join(lines) + '\n',
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,214 @@
+import json
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .compression import choose_encoding, compress
+from .metrics import (DB_DURATION, QUERY_COUNT, RENDER_DURATION,
+                      REQUEST_DURATION, RESPONSE_SIZE, SERIALIZE_DURATION)
+from .profiling import Sampler, session_state
+from .querylog import QuerySampler, get_logger
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class PerformanceMiddleware:
+    """Замеряет время обработки, SQL, сериализации и рендеринга запроса.
+
+    serialize - построение данных ответа сериализаторами (TimedDataMixin),
+    render - только перевод готовых данных в байты рендерером.
+
+    Значения попадают в заголовок Server-Timing и в гистограммы,
+    доступные по адресу /metrics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        request.serialize_duration = 0.0
+        request.render_duration = 0.0
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        REQUEST_DURATION.observe(view, duration)
+        DB_DURATION.observe(view, timer.duration)
+        SERIALIZE_DURATION.observe(view, request.serialize_duration)
+        RENDER_DURATION.observe(view, request.render_duration)
+        QUERY_COUNT.observe(view, timer.count)
+        if not response.streaming:
+            RESPONSE_SIZE.observe(view, len(response.content))
+
+        response['Server-Timing'] = ', '.join((
+            f'total;dur={duration * 1000:.1f}',
+            f'db;dur={timer.duration * 1000:.1f};desc="{timer.count} queries"',
+            f'serialize;dur={request.serialize_duration * 1000:.1f}',
+            f'render;dur={request.render_duration * 1000:.1f}',
+        ))
+        return response
+
+    def process_template_response(self, request, response):
+        # Ответы DRF рендерятся лениво, поэтому рендерим здесь,
+        # чтобы замерить рендеринг отдельно от view.
+        start = time.perf_counter()
+        response.render()
+        request.render_duration = time.perf_counter() - start
+        return response
+
+
+class QuerySamplerMiddleware:
+    """Пишет SQL выборки запросов с местом вызова в ротируемый NDJSON лог.
+
+    Включается через QUERY_SAMPLER['ENABLED'], отчет строит команда
+    query_report.
+    """
+
+    def __init__(self, get_response):
+        config = settings.QUERY_SAMPLER
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = config['SAMPLE_RATE']
+        self.slow_ms = config['SLOW_MS']
+        self.logger = get_logger(
+            config['LOG_FILE'], config['MAX_BYTES'], config['BACKUP_COUNT']
+        )
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        sampler = QuerySampler()
+        with connection.execute_wrapper(sampler):
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        context = {
+            'time': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else 'unresolved',
+        }
+        for record in sampler.records(self.slow_ms):
+            self.logger.info(json.dumps(
+                {**context, **record}, ensure_ascii=False
+            ))
+        return response
+
+
+class CompressionMiddleware:
+    """Сжатие gzip или brotli для ответов от RESPONSE_COMPRESSION['MIN_SIZE'].
+
+    Уже сжатые ответы (например, заранее сжатый каталог) не трогает.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.streaming or response.has_header('Content-Encoding')
+                or len(response.content)
+                < settings.RESPONSE_COMPRESSION['MIN_SIZE']):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if encoding is None:
+            return response
+        content = compress(response.content, encoding)
+        if len(content) >= len(response.content):
+            return response
+
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = f'W/{etag}'
+        return response
+
+
+class ProfilerMiddleware:
+    """Профилирование запросов для staff, включается PROFILER['ENABLED'].
+
+    Запрос с заголовком PROFILER['HEADER'] от staff профилируется
+    отдельно, id профиля возвращается в X-Profile-Id. Кроме того, после
+    POST /api/profiler/ все процессы профилируют свои запросы заданное
+    время. Профили отдает /api/profiler/<id>/. Выключенный профилировщик
+    не стоит ничего: Django не загружает middleware.
+    """
+
+    def __init__(self, get_response):
+        config = settings.PROFILER
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = 'HTTP_' + config['HEADER'].upper().replace('-', '_')
+
+    def is_staff(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+        authenticators = [
+            authentication()
+            for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ]
+        try:
+            user = Request(request, authenticators=authenticators).user
+        except APIException:
+            return False
+        return user.is_staff
+
+    def __call__(self, request):
+        if self.header in request.META and self.is_staff(request):
+            return self.profile_request(request)
+        sampler = session_state.get_sampler()
+        if sampler is None:
+            return self.get_response(request)
+        ident = threading.get_ident()
+        sampler.targets.add(ident)
+        try:
+            return self.get_response(request)
+        finally:
+            sampler.targets.discard(ident)
+
+    def profile_request(self, request):
+        profile_id = str(uuid.uuid4())
+        sampler = Sampler(profile_id, targets=(threading.get_ident(),))
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        response['X-Profile-Id'] = profile_id
+        return response
@@ -1,6 +1,42 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from rest_framework import pagination
 
 
 class CustomPagination(pagination.PageNumberPagination):
     page_size = 6
     page_size_query_param = 'page_size'
+
+
+class UserCursorPagination(pagination.CursorPagination):
+    page_size = 6
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = 'id'
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для админки без точного COUNT по большим таблицам.
+
+    Для запроса без фильтров на PostgreSQL число строк берется из статистики
+    планировщика, в остальных случаях подсчет останавливается на
+    ADMIN_COUNT_LIMIT строках.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = settings.ADMIN_COUNT_LIMIT
+        connection = connections[queryset.db]
+        if not queryset.query.where and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                    (queryset.model._meta.db_table,)
+                )
+                row = cursor.fetchone()
+            if row and row[0] > limit:
+                return int(row[0])
+        return queryset.order_by()[:limit].count()
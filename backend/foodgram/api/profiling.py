@@ -0,0 +1,171 @@
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+
+SESSION_KEY = 'profiler:session'
+
+
+@lru_cache(maxsize=8192)
+def frame_label(code, module):
+    return f'{module}.{code.co_qualname}'
+
+
+def collapse(frame):
+    """Стек кадра в формате collapsed: от внешнего вызова к внутреннему.
+
+    Метки вида api.views.RecipeList.list или
+    django.db.models.sql.compiler.SQLCompiler.execute_sql, поэтому время
+    видно по представлениям, сериализаторам и ORM.
+    """
+    labels = []
+    while frame is not None:
+        labels.append(
+            frame_label(frame.f_code, frame.f_globals.get('__name__', '?'))
+        )
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class Sampler(threading.Thread):
+    """Статистический профилировщик потоков из targets.
+
+    Раз в PROFILER['INTERVAL'] секунд снимает стеки через
+    sys._current_frames() и считает одинаковые. Профилируемый код не
+    инструментируется, поэтому накладные расходы не зависят от числа
+    вызовов. По окончании пишет результат в PROFILER['DIR'].
+    """
+
+    def __init__(self, profile_id, targets=(), until=None):
+        super().__init__(name=f'profiler-{profile_id}', daemon=True)
+        self.profile_id = profile_id
+        self.targets = set(targets)
+        self.until = until
+        self.interval = settings.PROFILER['INTERVAL']
+        self.counts = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            if self.until is not None and time.time() >= self.until:
+                break
+            frames = sys._current_frames()
+            for ident in tuple(self.targets):
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.counts[collapse(frame)] += 1
+        write_profile(self.profile_id, self.counts)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def write_profile(profile_id, counts):
+    directory = Path(settings.PROFILER['DIR'])
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{profile_id}-{os.getpid()}.folded'
+    with open(path, 'a', encoding='utf-8') as file:
+        for stack, count in counts.items():
+            file.write(f'{stack} {count}\n')
+
+
+def read_profile(profile_id):
+    """Сумма стеков всех процессов или None, если профиля нет."""
+    files = list(Path(settings.PROFILER['DIR']).glob(f'{profile_id}-*.folded'))
+    if not files:
+        return None
+    counts = Counter()
+    for path in files:
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                counts[stack] += int(count)
+    return counts
+
+
+def to_collapsed(counts):
+    return ''.join(
+        f'{stack} {count}\n' for stack, count in sorted(counts.items())
+    )
+
+
+def to_speedscope(counts, name):
+    """Профиль в формате https://www.speedscope.app (тип sampled)."""
+    interval = settings.PROFILER['INTERVAL'] * 1000
+    frames = {}
+    samples = []
+    weights = []
+    for stack, count in sorted(counts.items()):
+        samples.append([
+            frames.setdefault(label, len(frames))
+            for label in stack.split(';')
+        ])
+        weights.append(count * interval)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'foodgram',
+        'shared': {'frames': [{'name': label} for label in frames]},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        }],
+    }
+
+
+def start_session(seconds):
+    """Просит все процессы собирать профиль ближайшие seconds секунд."""
+    session = {'id': str(uuid.uuid4()), 'until': time.time() + seconds}
+    cache.set(SESSION_KEY, session, seconds + 60)
+    return session
+
+
+class SessionState:
+    """Сессия выборки в этом процессе.
+
+    Общий кеш опрашивается не чаще PROFILER['POLL_INTERVAL'], поэтому
+    обычный запрос платит только за сравнение времени. Процесс без
+    запросов в сессию не включается: профилировать в нем нечего.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked = float('-inf')
+        self.sampler = None
+
+    def get_sampler(self):
+        now = time.monotonic()
+        if now - self.checked >= settings.PROFILER['POLL_INTERVAL']:
+            with self.lock:
+                if now - self.checked >= settings.PROFILER['POLL_INTERVAL']:
+                    self.checked = now
+                    self.join_session(cache.get(SESSION_KEY))
+        sampler = self.sampler
+        if sampler is not None and sampler.is_alive():
+            return sampler
+        return None
+
+    def join_session(self, session):
+        if session is None or session['until'] <= time.time():
+            return
+        if self.sampler is not None and (
+                self.sampler.profile_id == session['id']):
+            return
+        self.sampler = Sampler(session['id'], until=session['until'])
+        self.sampler.start()
+
+
+session_state = SessionState()
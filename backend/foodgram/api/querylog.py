@@ -0,0 +1,98 @@
+import hashlib
+import logging
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from logging.handlers import RotatingFileHandler
+
+import django
+from django.conf import settings
+
+PROJECT_DIR = str(settings.BASE_DIR)
+DJANGO_DIR = os.path.dirname(django.__file__)
+IGNORED_FILES = ('manage.py', 'tests.py', 'middleware.py', 'querylog.py')
+
+STRINGS = re.compile(r"'(?:[^']|'')*'")
+NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+PARAMS = re.compile(r'%s|\?')
+LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+SPACES = re.compile(r'\s+')
+
+
+def normalize(sql):
+    sql = STRINGS.sub('?', sql)
+    sql = NUMBERS.sub('?', sql)
+    sql = PARAMS.sub('?', sql)
+    sql = LISTS.sub('(...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:16]
+
+
+def call_site():
+    """Ближайший к SQL вызов из кода проекта, например views.py:42."""
+    frame = sys._getframe(1)
+    fallback = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_DIR):
+            if os.path.basename(filename) not in IGNORED_FILES:
+                path = os.path.relpath(filename, PROJECT_DIR)
+                return f'{path}:{frame.f_lineno} in {frame.f_code.co_name}'
+        elif fallback is None and not filename.startswith(DJANGO_DIR):
+            fallback = (f'{filename}:{frame.f_lineno} '
+                        f'in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return fallback or '<unknown>'
+
+
+def get_logger(path, max_bytes, backup_count):
+    logger = logging.getLogger('foodgram.queries')
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    path = os.path.abspath(path)
+    for handler in logger.handlers:
+        if getattr(handler, 'baseFilename', None) == path:
+            return logger
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handler = RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+    )
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    return logger
+
+
+class QuerySampler:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                (sql, time.perf_counter() - start, call_site())
+            )
+
+    def records(self, slow_ms):
+        groups = defaultdict(list)
+        for sql, duration, site in self.queries:
+            groups[fingerprint(sql)].append((sql, duration * 1000, site))
+        for key, queries in groups.items():
+            durations = [duration for _, duration, _ in queries]
+            yield {
+                'fingerprint': key,
+                'sql': normalize(queries[0][0]),
+                'count': len(queries),
+                'total_ms': round(sum(durations), 3),
+                'max_ms': round(max(durations), 3),
+                'call_sites': sorted({site for _, _, site in queries}),
+                'duplicate': len(queries) > 1,
+                'slow': max(durations) >= slow_ms,
+            }
@@ -1,14 +1,20 @@
+from collections import defaultdict
+from decimal import Decimal
+
 import django.contrib.auth.password_validation as validate
+from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.hashers import make_password
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 
+from jobs.models import Job
 from users.models import Subscription
 from recipe.models import Ingredient, IngredientAmount, Recipe, Tag
+from .metrics import TimedDataMixin, TimedListSerializer
 
-User = get_user_model
+User = get_user_model()
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -39,43 +45,55 @@ class UserPasswordSerializer(serializers.Serializer):
         validate.validate_password(new_password)
         return new_password
 
-    def create_password(self, validated_data):
+    def create(self, validated_data):
         user = self.context['request'].user
         password = make_password(validated_data.get('new_password'))
         user.password = password
-        user.save()
+        user.save(update_fields=('password',))
         return validated_data
 
 
-class UserListSerializer(serializers.ModelSerializer):
+class UserListSerializer(TimedDataMixin, serializers.ModelSerializer):
     is_subscribed = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = User
+        list_serializer_class = TimedListSerializer
         fields = (
             'id', 'username', 'first_name',
             'last_name', 'email', 'is_subscribed'
         )
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class UserSearchSerializer(UserListSerializer):
+    subscribers_count = serializers.IntegerField(read_only=True)
+
+    class Meta(UserListSerializer.Meta):
+        fields = UserListSerializer.Meta.fields + ('subscribers_count',)
+
+
+class IngredientSerializer(TimedDataMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
-        fields = '__all__'
+        list_serializer_class = TimedListSerializer
+        fields = ('id', 'name', 'measurement_unit')
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedDataMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Tag
+        list_serializer_class = TimedListSerializer
         fields = ('id', 'name', 'color', 'slug')
 
 
-class RecipeSubscriptionSerializer(serializers.ModelSerializer):
+class RecipeSubscriptionSerializer(TimedDataMixin,
+                                   serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
+        list_serializer_class = TimedListSerializer
         fields = ('id', 'name', 'cooking_time', 'image')
 
 
@@ -91,25 +109,42 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeUserSerializer(serializers.ModelSerializer):
-    is_subscribed = serializers.SerializerMethodField(read_only=True)
+    is_subscribed = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name',
                   'last_name', 'is_subscribed')
 
-    def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if not user.is_authenticated:
-            return False
-        return user.follower.filter(following=obj).exists()
 
+class SparseFieldsMixin:
+    """Оставляет поля из context['fields'] и разворачивает только связи из
+    context['expand'], остальные связи отдаются как id.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        expand = self.context.get('expand')
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+        if expand is not None:
+            for name, field in self.get_collapsed_fields().items():
+                if name in self.fields and name not in expand:
+                    self.fields[name] = field
+
+    def get_collapsed_fields(self):
+        return {}
 
-class RecipeSerializer(serializers.ModelSerializer):
+
+class RecipeSerializer(TimedDataMixin, SparseFieldsMixin,
+                       serializers.ModelSerializer):
     author = RecipeUserSerializer(read_only=True,
                                   default=serializers.CurrentUserDefault())
     ingredients = RecipeIngredientSerializer(required=True,
-                                             many=True, source='recipe')
+                                             many=True,
+                                             source='recipe_ingredients')
     tags = TagSerializer(many=True, read_only=True)
     image = Base64ImageField()
     is_in_shopping_cart = serializers.BooleanField(read_only=True)
@@ -117,18 +152,34 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = '__all__'
+        list_serializer_class = TimedListSerializer
+        fields = ('id', 'author', 'ingredients', 'tags', 'image',
+                  'is_in_shopping_cart', 'is_favorited', 'name', 'text',
+                  'cooking_time', 'pub_date')
+
+    def get_collapsed_fields(self):
+        return {
+            'author': serializers.PrimaryKeyRelatedField(read_only=True),
+            'tags': serializers.PrimaryKeyRelatedField(
+                many=True, read_only=True
+            ),
+            'ingredients': serializers.SlugRelatedField(
+                many=True, read_only=True, slug_field='ingredient_id',
+                source='recipe_ingredients'
+            ),
+        }
 
     def create_ingredients(self, recipe, ingredients):
-        for ingredient in ingredients:
-            IngredientAmount.objects.bulk_create(
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
                 recipe=recipe,
                 amount=ingredient.get('amount'),
                 ingredient_id=ingredient.get('id')
-            )
+            ) for ingredient in ingredients
+        )
 
     def create(self, validated_data):
-        validated_data.pop('recipe')
+        validated_data.pop('recipe_ingredients')
         ingredients = self.initial_data.pop('ingredients')
         tags = self.initial_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
@@ -137,12 +188,12 @@ class RecipeSerializer(serializers.ModelSerializer):
         return recipe
 
     def update(self, instance, validated_data):
-        validated_data.pop('recipe')
-        ingredients = self.initial_data.pop('ingredients')
-        tags = self.initial_data.pop('tags')
+        validated_data.pop('recipe_ingredients', None)
+        ingredients = self.initial_data.pop('ingredients', None)
+        tags = self.initial_data.pop('tags', None)
         if ingredients:
             instance.ingredients.clear()
-            self.create_ingredients(ingredients, instance)
+            self.create_ingredients(instance, ingredients)
 
         if tags:
             instance.tags.set(tags)
@@ -154,17 +205,16 @@ class RecipeSerializer(serializers.ModelSerializer):
         return instance
 
     def validate(self, data):
-        ingredients = self.initial_data.get('ingredients')
+        ingredients = self.initial_data.get('ingredients', ())
         tags = self.initial_data.get('tags')
-        ingredient_list = []
+        ids = {item['id'] for item in ingredients}
 
-        for item in ingredients:
-            ingredient = get_object_or_404(Ingredient, id=item['id'])
-            if ingredient in ingredient_list:
-                raise serializers.ValidationError('Ингредиент уже существует')
-            ingredient_list.append(ingredient)
+        if Ingredient.objects.filter(id__in=ids).count() < len(ids):
+            raise Http404
+        if len(ids) < len(ingredients):
+            raise serializers.ValidationError('Ингредиент уже существует')
 
-        if not tags:
+        if not tags and not (self.partial and 'tags' not in self.initial_data):
             raise serializers.ValidationError('Укажите тег')
 
         return data
@@ -180,22 +230,75 @@ class RecipeSerializer(serializers.ModelSerializer):
         return cooking_time
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
-    id = serializers.IntegerField(source='following.id')
-    username = serializers.CharField(source='following.username')
-    email = serializers.EmailField(source='following.email')
-    first_name = serializers.CharField(source='following.first_name')
-    last_name = serializers.CharField(source='following.last_name')
-    recipes = RecipeSubscriptionSerializer(many=True)
+class SubscriptionSerializer(TimedDataMixin, serializers.ModelSerializer):
+    id = serializers.IntegerField(source='author.id')
+    username = serializers.CharField(source='author.username')
+    email = serializers.EmailField(source='author.email')
+    first_name = serializers.CharField(source='author.first_name')
+    last_name = serializers.CharField(source='author.last_name')
+    recipes = RecipeSubscriptionSerializer(many=True, source='author.recipe')
     is_subscribed = serializers.BooleanField(read_only=True)
     recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Subscription
+        list_serializer_class = TimedListSerializer
         fields = ('id', 'username', 'email', 'first_name', 'last_name',
                   'recipes', 'is_subscribed', 'recipes_count', 'recipes')
 
 
+class RecipeBatchSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
+class MealPlanItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField(min_value=1)
+    servings = serializers.DecimalField(
+        max_digits=6, decimal_places=2, min_value=Decimal('0.01')
+    )
+
+
+class MealPlanSerializer(serializers.Serializer):
+    recipes = MealPlanItemSerializer(
+        many=True, allow_empty=False, max_length=1000
+    )
+
+    def validate_recipes(self, value):
+        servings = defaultdict(Decimal)
+        for item in value:
+            servings[item['id']] += item['servings']
+        return servings
+
+
+class JobSerializer(TimedDataMixin, serializers.ModelSerializer):
+    result = serializers.HyperlinkedIdentityField(view_name='job_result')
+
+    class Meta:
+        model = Job
+        list_serializer_class = TimedListSerializer
+        fields = ('id', 'kind', 'status', 'error', 'created_at',
+                  'finished_at', 'result')
+
+
+class ProfilerSessionSerializer(serializers.Serializer):
+    seconds = serializers.FloatField(min_value=0.1)
+
+    def validate_seconds(self, value):
+        limit = settings.PROFILER['MAX_SECONDS']
+        if value > limit:
+            raise serializers.ValidationError(
+                f'Не больше {limit} секунд'
+            )
+        return value
+
+
 class TokenSerializer(serializers.Serializer):
     token = serializers.CharField(label='Токен', read_only=True)
     email = serializers.CharField(label='Email', write_only=True)
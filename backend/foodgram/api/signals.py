@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from recipe.models import Ingredient, Recipe, Tag
+
+from .cache import catalog_cache, feed_cache
+
+User = get_user_model()
+
+# Поля автора, которые попадают в страницы ленты.
+AUTHOR_FIELDS = frozenset(('username', 'email', 'first_name', 'last_name'))
+
+
+def recipe_tags(recipe_id):
+    return list(
+        Tag.objects.filter(recipes=recipe_id).values_list('slug', flat=True)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    tags = () if created else recipe_tags(instance.id)
+    feed_cache.invalidate(instance.author_id, tags)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    feed_cache.invalidate(instance.author_id, recipe_tags(instance.id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse or action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if action == 'pre_clear':
+        tags = recipe_tags(instance.id)
+    else:
+        tags = Tag.objects.filter(id__in=pk_set).values_list('slug', flat=True)
+    feed_cache.invalidate(instance.author_id, tags)
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, created, update_fields, **kwargs):
+    if created or (update_fields is not None
+                   and not AUTHOR_FIELDS & set(update_fields)):
+        return
+    tags = set(Recipe.objects.filter(author=instance).values_list(
+        'tags__slug', flat=True
+    ))
+    if tags:
+        tags.discard(None)
+        feed_cache.invalidate(instance.id, tags)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    feed_cache.invalidate_all()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    catalog_cache.invalidate()
+    feed_cache.invalidate_all()
@@ -0,0 +1,17 @@
+from jobs.queue import task
+
+from .deletion import purge
+from .exports import render_shopping_cart
+
+
+@task('shopping_cart_pdf')
+def shopping_cart_pdf(job):
+    return (
+        render_shopping_cart(job.user), 'application/pdf', 'yourcart.pdf'
+    )
+
+
+@task('purge_deleted')
+def purge_deleted(job):
+    recipes, users, images = purge()
+    return {'recipes': recipes, 'users': users, 'images': images}
@@ -1,3 +1,2008 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from functools import partial
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from recipe import popularity, recommendations
+from recipe.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                           RecipePopularity, ShoppingCart, Tag)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from sync.models import Change
+from jobs.models import Job
+from jobs import queue
+from jobs.queue import TASKS, claim, enqueue
+from notifications.events import publish_follow, publish_recipe
+from notifications.hub import OVERFLOW, hub
+from notifications.stream import EventStream
+from users.models import Subscription
+
+from .cache import feed_cache
+from .deletion import purge, soft_delete_users
+from .fast_serializers import FastRecipeListSerializer
+from .meal_plan import cart_ingredients
+from .profiling import Sampler, session_state, write_profile
+from .querylog import call_site, fingerprint
+from .serializers import TagSerializer
+from .throttling import LocalBucketStore, local_store
+from .urls import urlpatterns
+from .warmup import warmup
+
+User = get_user_model()
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), 'query_budgets.json')
+PASSWORD = 'Gq7rLm2wZx'
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAAD'
+    'ElEQVR4nGNgYGAAAAAEAAH2FzhVAAAAAElFTkSuQmCC'
+)
+
+
+def recipe_payload(tags, ingredients, name='Рецепт'):
+    return {
+        'name': name, 'text': 'Текст', 'cooking_time': 5, 'image': IMAGE,
+        'tags': [tag.id for tag in tags],
+        'ingredients': [
+            {'id': ingredient.id, 'amount': 2} for ingredient in ingredients
+        ],
+    }
+
+
+class BenchmarkCommandTest(TestCase):
+    def test_seed_and_benchmark(self):
+        call_command('load_ingredients', stdout=StringIO())
+        call_command('load_tags', stdout=StringIO())
+        call_command('seed_benchmark', users=5, recipes=20, seed=1,
+                     stdout=StringIO())
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'benchmark.json')
+            # Больше лимита shopping_cart_pdf, чтобы поймать 429.
+            call_command('benchmark_api', iterations=30, warmup=1,
+                         host='testserver', output=output, stdout=StringIO())
+            with open(output, encoding='utf-8') as file:
+                results = json.load(file)
+
+        self.assertEqual(set(results), {
+            'recipe_list', 'recipe_detail', 'subscription_list',
+            'ingredient_list', 'download_shopping_cart',
+        })
+        for result in results.values():
+            self.assertEqual(result['status'], 200)
+            self.assertGreater(result['queries'], 0)
+
+
+class RecipeWriteTest(TestCase):
+    def test_rejects_missing_and_repeated_ingredients(self):
+        author = User.objects.create(username='author',
+                                     email='author@example.com')
+        tag = Tag.objects.create(name='Ужин', color='#000000', slug='dinner')
+        ingredient = Ingredient.objects.create(name='Соль',
+                                               measurement_unit='г')
+        client = APIClient()
+        client.force_authenticate(author)
+        url = reverse('recipe_list')
+
+        payload = recipe_payload((tag,), (ingredient,))
+        payload['ingredients'].append({'id': ingredient.id + 1, 'amount': 1})
+        response = client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, 404)
+
+        payload = recipe_payload((tag,), (ingredient, ingredient))
+        response = client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class ImportRecipesTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        media = override_settings(
+            MEDIA_ROOT=os.path.join(self.directory, 'media')
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+        User.objects.create(username='author', email='author@example.com')
+        Tag.objects.create(name='Ужин', color='#000000', slug='dinner')
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        os.mkdir(os.path.join(self.directory, 'recipes_images'))
+        with open(os.path.join(self.directory, 'recipes_images', 'a.png'),
+                  'wb') as file:
+            file.write(b'png')
+        self.source = os.path.join(self.directory, 'recipes.ndjson')
+        record = {
+            'name': 'Суп', 'text': 'Текст', 'cooking_time': 10,
+            'author': 'author@example.com', 'image': 'a.png',
+            'tags': ['dinner'], 'pub_date': '2022-05-01T10:00:00+00:00',
+            'ingredients': [
+                {'name': 'Соль', 'measurement_unit': 'г', 'amount': 2},
+                {'name': 'Соль', 'measurement_unit': 'г', 'amount': 3},
+            ],
+        }
+        with open(self.source, 'w', encoding='utf-8') as file:
+            for _ in range(2):
+                file.write(json.dumps(record) + '\n')
+
+    def run_import(self):
+        stderr = StringIO()
+        call_command('import_recipes', self.source, workers=1,
+                     stdout=StringIO(), stderr=stderr)
+        return stderr.getvalue()
+
+    def stored_images(self):
+        return os.listdir(
+            os.path.join(settings.MEDIA_ROOT, 'static', 'recipe')
+        )
+
+    def test_duplicates_are_skipped(self):
+        self.assertIn('уже загружен', self.run_import())
+        self.assertIn('уже загружен', self.run_import())
+        recipe = Recipe.objects.get()
+        self.assertEqual(recipe.pub_date.year, 2022)
+        self.assertEqual(
+            list(recipe.recipe_ingredients.values_list('amount', flat=True)),
+            [5]
+        )
+        self.assertEqual(len(self.stored_images()), 1)
+
+    @override_settings(SYNC={**settings.SYNC, 'LAG': 0})
+    def test_import_reaches_feed_and_sync(self):
+        token = self.client.get(reverse('sync')).json()['token']
+        with mock.patch.object(feed_cache, 'invalidate') as invalidate, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.run_import()
+        recipe = Recipe.objects.get()
+        invalidate.assert_called_once_with(recipe.author_id, {'dinner'})
+        data = self.client.get(reverse('sync'), {'since': token}).json()
+        self.assertEqual(
+            [item['id'] for item in data['recipes']['updated']], [recipe.id]
+        )
+
+    def test_failed_chunk_removes_images(self):
+        with mock.patch.object(IngredientAmount.objects, 'bulk_create',
+                               side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                self.run_import()
+        self.assertFalse(Recipe.all_objects.exists())
+        self.assertEqual(self.stored_images(), [])
+
+
+class StartupTest(TestCase):
+    def test_pdf_libraries_are_not_imported_at_startup(self):
+        script = (
+            'import sys, django; django.setup(); '
+            'from django.urls import get_resolver; '
+            'get_resolver().url_patterns; import api.tasks; '
+            'print(sorted({name.split(".")[0] for name in sys.modules} '
+            '& {"reportlab", "PIL"}))'
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'foodgram.settings'},
+            capture_output=True, check=True, text=True
+        ).stdout
+        self.assertEqual(output.strip(), '[]')
+
+    def test_warmup_fills_catalog_cache(self):
+        cache.clear()
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        with mock.patch('api.warmup.connections.close_all'):
+            timings = warmup()
+        self.assertEqual(set(timings), {
+            'urls', 'model_meta', 'serializers', 'reportlab', 'catalog'
+        })
+        with mock.patch('api.cache.precompress') as precompress:
+            response = APIClient().get(reverse('ingredient_list'))
+        precompress.assert_not_called()
+        self.assertEqual(len(response.json()), 1)
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((call_site(), sql))
+        return execute(sql, params, many, context)
+
+    def report(self):
+        sites = defaultdict(list)
+        for site, sql in self.queries:
+            sites[site].append(sql)
+        lines = []
+        for site, queries in sorted(
+            sites.items(), key=lambda item: -len(item[1])
+        ):
+            lines.append(f'  {len(queries)} x {site}')
+            lines.extend(f'      {sql}' for sql in sorted(set(queries)))
+        return '\n'.join(lines)
+
+
+@override_settings(PASSWORD_HASHERS=[
+    'django.contrib.auth.hashers.MD5PasswordHasher'
+])
+class QueryBudgetTest(TestCase):
+    """Число SQL-запросов каждого маршрута не должно расти с объемом данных.
+
+    Бюджеты хранятся в query_budgets.json. Чтобы перезаписать их текущими
+    значениями, запустите тесты с QUERY_BUDGETS_UPDATE=1.
+    """
+
+    scales = (1, 10, 100)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(
+            MEDIA_ROOT=directory.name,
+            PROFILER={**settings.PROFILER, 'ENABLED': True,
+                      'DIR': directory.name},
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def build(self, scale):
+        user = User.objects.create(
+            username='client', email='client@example.com',
+            first_name='Клиент', last_name='Тестовый'
+        )
+        user.set_password(PASSWORD)
+        user.save()
+        Token.objects.create(user=user)
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {i}', color=f'#{i:06X}', slug=f't{i}')
+            for i in range(scale)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(scale)
+        )
+        authors = User.objects.bulk_create(
+            User(username=f'author{i}', email=f'author{i}@example.com',
+                 first_name='Автор', last_name=str(i))
+            for i in range(scale + 1)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'Рецепт {i}', text='Текст',
+                   cooking_time=10)
+            for i, author in enumerate(authors)
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in recipes for tag in tags[:2]
+        )
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(recipe=recipe, ingredient=ingredient, amount=5)
+            for recipe in recipes for ingredient in ingredients[:3]
+        )
+        *authors, target_author = authors
+        *recipes, target_recipe = recipes
+        own_recipe = Recipe.objects.create(
+            author=user, name='Свой рецепт', text='Текст', cooking_time=10
+        )
+        admin = User.objects.create(
+            username='admin', email='admin@example.com', is_staff=True
+        )
+        profile_id = uuid.uuid4()
+        write_profile(profile_id, {'api.views.TagList.get': 1})
+        job = Job.objects.create(
+            kind='shopping_cart_pdf', user=user, status=Job.DONE,
+            result=b'%PDF', content_type='application/pdf'
+        )
+        Subscription.objects.bulk_create(
+            Subscription(user=user, author=author) for author in authors
+        )
+        Favorite.objects.bulk_create(
+            Favorite(user=user, recipe=recipe) for recipe in recipes
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe) for recipe in recipes
+        )
+        return {
+            'user': user, 'tags': tags, 'ingredients': ingredients,
+            'tag': tags[0], 'ingredient': ingredients[0],
+            'author': authors[0], 'target_author': target_author,
+            'recipe': recipes[0], 'target_recipe': target_recipe,
+            'recipes': recipes, 'own_recipe': own_recipe, 'admin': admin,
+            'profile_id': profile_id, 'job': job,
+        }
+
+    def routes(self, data):
+        """(бюджет, имя маршрута, метод, адрес, тело, пользователь)."""
+        user = data['user']
+        recipe = data['recipe'].id
+        target_recipe = data['target_recipe'].id
+        own_recipe = data['own_recipe'].id
+        batch = {'recipes': [
+            *(recipe.id for recipe in data['recipes'][:50]), target_recipe
+        ]}
+        # Тело растет вместе с данными, чтобы N+1 по тегам и ингредиентам
+        # было видно и на записи.
+        payload = recipe_payload(data['tags'], data['ingredients'])
+        return (
+            ('login', 'login', 'post', reverse('login'),
+             {'email': user.email, 'password': PASSWORD}, None),
+            ('logout', 'logout', 'post', reverse('logout'), None, user),
+            ('user_create', 'user_list', 'post', reverse('user_list'),
+             {'username': 'new', 'email': 'new@example.com',
+              'first_name': 'Новый', 'last_name': 'Пользователь',
+              'password': 'Nt6vPq2mX9'}, None),
+            ('user_search', 'user_list', 'get',
+             f'{reverse("user_list")}?cursor=&search=auth', None, user),
+            ('user_list', 'user_list', 'get', reverse('user_list'),
+             None, user),
+            ('user_detail', 'user_detail', 'get',
+             reverse('user_detail', args=(data['target_author'].id,)),
+             None, user),
+            ('subscription_list', 'subscription_list', 'get',
+             reverse('subscription_list'), None, user),
+            ('subscribe', 'subscribe', 'get',
+             reverse('subscribe', args=(data['target_author'].id,)),
+             None, user),
+            ('unsubscribe', 'subscribe', 'delete',
+             reverse('subscribe', args=(data['author'].id,)), None, user),
+            ('set_password', 'set_password', 'post', reverse('set_password'),
+             {'current_password': PASSWORD,
+              'new_password': 'Nt6vPq2mX9'}, user),
+            ('ingredient_list', 'ingredient_list', 'get',
+             reverse('ingredient_list'), None, None),
+            ('ingredient_detail', 'ingredient_detail', 'get',
+             reverse('ingredient_detail', args=(data['ingredient'].id,)),
+             None, None),
+            ('job_detail', 'job_detail', 'get',
+             reverse('job_detail', args=(data['job'].id,)), None, user),
+            ('job_result', 'job_result', 'get',
+             reverse('job_result', args=(data['job'].id,)), None, user),
+            ('notification_ticket', 'notification_ticket', 'post',
+             reverse('notification_ticket'), None, user),
+            ('sync', 'sync', 'get',
+             f'{reverse("sync")}?since=0.{int(time.time())}', None, user),
+            ('profiler', 'profiler', 'post', reverse('profiler'),
+             {'seconds': 1}, data['admin']),
+            ('profile', 'profile', 'get',
+             reverse('profile', args=(data['profile_id'],)), None,
+             data['admin']),
+            ('tag_list', 'tag_list', 'get', reverse('tag_list'), None, None),
+            ('tag_detail', 'tag_detail', 'get',
+             reverse('tag_detail', args=(data['tag'].id,)), None, None),
+            ('recipe_list_anonymous', 'recipe_list', 'get',
+             reverse('recipe_list'), None, None),
+            ('recipe_list', 'recipe_list', 'get', reverse('recipe_list'),
+             None, user),
+            ('recipe_list_popular', 'recipe_list', 'get',
+             f'{reverse("recipe_list")}?ordering=popular', None, user),
+            ('recipe_list_ids', 'recipe_list', 'get',
+             f'{reverse("recipe_list")}?ids='
+             + ','.join(str(pk) for pk in reversed(batch['recipes'])),
+             None, user),
+            ('recipe_list_sparse', 'recipe_list', 'get',
+             f'{reverse("recipe_list")}?fields=id,name,image,cooking_time',
+             None, user),
+            ('recipe_create', 'recipe_list', 'post', reverse('recipe_list'),
+             payload, user),
+            ('recipe_detail', 'recipe_detail', 'get',
+             reverse('recipe_detail', args=(recipe,)), None, user),
+            ('recipe_update', 'recipe_detail', 'put',
+             reverse('recipe_detail', args=(own_recipe,)), payload, user),
+            ('recipe_partial_update', 'recipe_detail', 'patch',
+             reverse('recipe_detail', args=(own_recipe,)),
+             {'name': 'Новое имя', 'ingredients': payload['ingredients']},
+             user),
+            ('recipe_delete', 'recipe_detail', 'delete',
+             reverse('recipe_detail', args=(own_recipe,)), None, user),
+            ('recipe_similar', 'recipe_similar', 'get',
+             reverse('recipe_similar', args=(recipe,)), None, None),
+            ('favorite_add', 'recipe_favorite', 'get',
+             reverse('recipe_favorite', args=(target_recipe,)), None, user),
+            ('favorite_remove', 'recipe_favorite', 'delete',
+             reverse('recipe_favorite', args=(recipe,)), None, user),
+            ('shopping_cart_add', 'shopping_cart', 'get',
+             reverse('shopping_cart', args=(target_recipe,)), None, user),
+            ('shopping_cart_remove', 'shopping_cart', 'delete',
+             reverse('shopping_cart', args=(recipe,)), None, user),
+            ('favorite_batch_add', 'favorite_batch', 'post',
+             reverse('favorite_batch'), batch, user),
+            ('favorite_batch_remove', 'favorite_batch', 'delete',
+             reverse('favorite_batch'), batch, user),
+            ('shopping_cart_batch_add', 'shopping_cart_batch', 'post',
+             reverse('shopping_cart_batch'), batch, user),
+            ('shopping_cart_batch_remove', 'shopping_cart_batch', 'delete',
+             reverse('shopping_cart_batch'), batch, user),
+            ('meal_plan', 'meal_plan', 'post', reverse('meal_plan'),
+             {'recipes': [{'id': pk, 'servings': '1.5'}
+                          for pk in batch['recipes']]}, None),
+            ('download_shopping_cart', 'download_shopping_cart', 'post',
+             reverse('download_shopping_cart'), None, user),
+        )
+
+    def api_routes(self):
+        """Пары (имя маршрута, метод) из api.urls."""
+        routes = set()
+        for pattern in urlpatterns:
+            view = pattern.callback.cls
+            routes.update(
+                (pattern.name, method) for method in view.http_method_names
+                if method not in ('head', 'options') and hasattr(view, method)
+            )
+        return routes
+
+    def replay(self, scale):
+        cache.clear()
+        results = {}
+        with transaction.atomic():
+            data = self.build(scale)
+            for name, _, method, url, payload, user in self.routes(data):
+                client = APIClient()
+                if user is not None:
+                    client.force_authenticate(user)
+                recorder = QueryRecorder()
+                with transaction.atomic():
+                    with connection.execute_wrapper(recorder):
+                        response = getattr(client, method)(
+                            url, payload, format='json'
+                        )
+                    transaction.set_rollback(True)
+                results[name] = (response.status_code, recorder)
+            transaction.set_rollback(True)
+        return results
+
+    def test_every_route_is_replayed(self):
+        replayed = {
+            (route, method)
+            for _, route, method, *_ in self.routes(self.build(1))
+        }
+        self.assertEqual(self.api_routes() - replayed, set())
+
+    def test_query_budgets(self):
+        runs = {scale: self.replay(scale) for scale in self.scales}
+        # Маршрут profiler запустил сессию выборки в этом процессе.
+        if session_state.sampler is not None:
+            session_state.sampler.stop()
+        largest = runs[self.scales[-1]]
+        observed = {
+            name: len(recorder.queries)
+            for name, (_, recorder) in largest.items()
+        }
+        if os.environ.get('QUERY_BUDGETS_UPDATE'):
+            with open(BUDGETS_PATH, 'w', encoding='utf-8') as file:
+                json.dump(observed, file, indent=2, sort_keys=True)
+                file.write('\n')
+
+        with open(BUDGETS_PATH, encoding='utf-8') as file:
+            budgets = json.load(file)
+        self.assertEqual(
+            set(observed) ^ set(budgets), set(),
+            'Маршруты без бюджета или бюджеты без маршрута'
+        )
+
+        for name, (status_code, recorder) in largest.items():
+            with self.subTest(route=name):
+                self.assertLess(status_code, 400)
+                counts = {
+                    scale: len(runs[scale][name][1].queries)
+                    for scale in self.scales
+                }
+                if (len(set(counts.values())) > 1
+                        or observed[name] > budgets[name]):
+                    self.fail(
+                        f'{name}: запросов {counts}, бюджет '
+                        f'{budgets[name]}\n{recorder.report()}'
+                    )
+
+
+class RecipeBatchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username='client', email='client@example.com'
+        )
+        self.recipes = Recipe.objects.bulk_create(
+            Recipe(author=self.user, name=f'Рецепт {i}', text='Текст',
+                   cooking_time=10)
+            for i in range(3)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_batch_statuses(self):
+        first, second, third = (recipe.id for recipe in self.recipes)
+        missing = third + 100
+        ShoppingCart.objects.create(user=self.user, recipe_id=first)
+        url = reverse('shopping_cart_batch')
+
+        response = self.client.post(
+            url, {'recipes': [first, second, missing, second]},
+            format='json'
+        )
+        self.assertEqual(response.json()['results'], [
+            {'id': first, 'status': 'exists'},
+            {'id': second, 'status': 'created'},
+            {'id': missing, 'status': 'not_found'},
+        ])
+        self.assertEqual(
+            set(self.user.shopping_cart.values_list('recipe_id', flat=True)),
+            {first, second}
+        )
+
+        response = self.client.delete(
+            url, {'recipes': [second, third, missing]}, format='json'
+        )
+        self.assertEqual(response.json()['results'], [
+            {'id': second, 'status': 'deleted'},
+            {'id': third, 'status': 'absent'},
+            {'id': missing, 'status': 'not_found'},
+        ])
+        self.assertEqual(
+            list(self.user.shopping_cart.values_list('recipe_id', flat=True)),
+            [first]
+        )
+
+    def test_concurrent_insert_is_not_reported_as_created(self):
+        first, second, _ = (recipe.id for recipe in self.recipes)
+        bulk_create = ShoppingCart.objects.bulk_create
+
+        def racing_bulk_create(objs, **kwargs):
+            ShoppingCart.objects.create(
+                user=self.user, recipe_id=second,
+                created_at=timezone.now() - timedelta(seconds=1)
+            )
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(ShoppingCart.objects, 'bulk_create',
+                               racing_bulk_create), \
+                mock.patch('api.views.popularity.add') as add:
+            response = self.client.post(
+                reverse('shopping_cart_batch'), {'recipes': [first, second]},
+                format='json'
+            )
+        self.assertEqual(response.json()['results'], [
+            {'id': first, 'status': 'created'},
+            {'id': second, 'status': 'exists'},
+        ])
+        self.assertEqual(add.call_args.args[0], [first])
+
+    def test_rejects_invalid_payload(self):
+        url = reverse('favorite_batch')
+        for payload in ({}, {'recipes': []}, {'recipes': ['x']}):
+            response = self.client.post(url, payload, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            APIClient().post(url, {'recipes': [1]}, format='json')
+            .status_code, 403
+        )
+
+
+class RelationWriteTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username='client', email='client@example.com'
+        )
+        self.author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст', cooking_time=10
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_add_is_rejected(self):
+        for name in ('recipe_favorite', 'shopping_cart'):
+            url = reverse(name, args=(self.recipe.id,))
+            self.assertEqual(self.client.get(url).status_code, 201)
+            self.assertEqual(self.client.get(url).status_code, 400)
+            self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(
+            self.client.get(
+                reverse('recipe_favorite', args=(self.recipe.id + 1,))
+            ).status_code, 404
+        )
+
+    def test_subscribe_once(self):
+        url = reverse('subscribe', args=(self.author.id,))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['id'], self.author.id)
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(
+            self.client.get(
+                reverse('subscribe', args=(self.user.id,))
+            ).status_code, 400
+        )
+        self.assertEqual(self.user.follower.count(), 1)
+
+    def test_self_subscription_constraint(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Subscription.objects.create(user=self.user, author=self.user)
+
+
+class DeletionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(
+            username='client', email='client@example.com'
+        )
+        self.author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+        self.recipes = Recipe.objects.bulk_create(
+            Recipe(author=self.author, name=f'Рецепт {i}', text='Текст',
+                   cooking_time=10)
+            for i in range(3)
+        )
+        ingredient = Ingredient.objects.create(name='Соль',
+                                               measurement_unit='г')
+        for recipe in self.recipes:
+            IngredientAmount.objects.create(recipe=recipe,
+                                            ingredient=ingredient, amount=1)
+            Favorite.objects.create(user=self.user, recipe=recipe)
+        Subscription.objects.create(user=self.user, author=self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_deleted_recipe_is_hidden_until_purge(self):
+        recipe = self.recipes[0]
+        client = APIClient()
+        client.force_authenticate(self.author)
+        url = reverse('recipe_detail', args=(recipe.id,))
+        self.assertEqual(client.delete(url).status_code, 204)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(reverse('recipe_list')).json()[
+            'count'
+        ], 2)
+        self.assertEqual(
+            self.client.get(reverse('subscription_list')).json()[
+                'results'
+            ][0]['recipes_count'], 2
+        )
+        self.assertTrue(Favorite.objects.filter(recipe=recipe).exists())
+
+        call_command('purge_deleted', stdout=StringIO())
+        self.assertFalse(Recipe.all_objects.filter(id=recipe.id).exists())
+        self.assertFalse(Favorite.objects.filter(recipe=recipe).exists())
+        self.assertFalse(
+            IngredientAmount.objects.filter(recipe=recipe).exists()
+        )
+        self.assertEqual(Favorite.objects.count(), 2)
+
+    def test_deleted_user_is_purged_in_batches(self):
+        soft_delete_users(User.objects.filter(id=self.author.id))
+        self.assertEqual(
+            self.client.get(
+                reverse('user_detail', args=(self.author.id,))
+            ).status_code, 404
+        )
+        self.assertEqual(
+            self.client.get(reverse('recipe_list')).json()['count'], 0
+        )
+        self.assertEqual(
+            self.client.get(reverse('subscription_list')).json()['count'], 0
+        )
+
+        recipes, users, _ = purge(batch_size=2)
+        self.assertEqual((recipes, users), (3, 1))
+        self.assertFalse(User.objects.filter(id=self.author.id).exists())
+        self.assertFalse(Subscription.objects.exists())
+        self.assertFalse(Favorite.objects.exists())
+        self.assertTrue(User.objects.filter(id=self.user.id).exists())
+
+    def test_orphan_images_are_removed(self):
+        with tempfile.TemporaryDirectory() as media, \
+                override_settings(MEDIA_ROOT=media):
+            directory = os.path.join(media, 'static', 'recipe')
+            os.makedirs(directory)
+            for name in ('used.png', 'orphan.png', 'fresh.png'):
+                with open(os.path.join(directory, name), 'wb') as file:
+                    file.write(b'png')
+            old = time.time() - 2 * 24 * 60 * 60
+            for name in ('used.png', 'orphan.png'):
+                os.utime(os.path.join(directory, name), (old, old))
+            Recipe.objects.filter(id=self.recipes[0].id).update(
+                image='static/recipe/used.png'
+            )
+            purge()
+            self.assertEqual(sorted(os.listdir(directory)),
+                             ['fresh.png', 'used.png'])
+
+
+class MealPlanTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username='client', email='client@example.com'
+        )
+        flour, sugar, salt = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('Мука', 'Сахар', 'Соль')
+        )
+        self.cake, self.bread = Recipe.objects.bulk_create(
+            Recipe(author=self.user, name=name, text='Текст',
+                   cooking_time=10)
+            for name in ('Торт', 'Хлеб')
+        )
+        IngredientAmount.objects.bulk_create((
+            IngredientAmount(recipe=self.cake, ingredient=flour, amount=200),
+            IngredientAmount(recipe=self.cake, ingredient=sugar, amount=150),
+            IngredientAmount(recipe=self.bread, ingredient=flour, amount=500),
+            IngredientAmount(recipe=self.bread, ingredient=salt, amount=5),
+        ))
+
+    def test_scales_and_merges_totals(self):
+        response = self.client.post(reverse('meal_plan'), {'recipes': [
+            {'id': self.cake.id, 'servings': '0.5'},
+            {'id': self.bread.id, 'servings': 2},
+            {'id': self.cake.id, 'servings': 1},
+            {'id': self.bread.id + 100, 'servings': 1},
+        ]}, content_type='application/json')
+        self.assertEqual(
+            [(item['name'], item['amount'])
+             for item in response.json()['ingredients']],
+            [('Мука', 1300), ('Сахар', 225), ('Соль', 10)]
+        )
+
+        response = self.client.post(reverse('meal_plan'), {'recipes': [
+            {'id': self.cake.id, 'servings': 0},
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cart_uses_single_query(self):
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=self.user, recipe=recipe)
+            for recipe in (self.cake, self.bread)
+        )
+        with self.assertNumQueries(1):
+            totals = cart_ingredients(self.user)
+        self.assertEqual(totals[0]['amount'], 700)
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username='client', email='client@example.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_async_shopping_cart_export(self):
+        response = self.client.post(
+            f'{reverse("download_shopping_cart")}?async=1'
+        )
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+        self.assertEqual(job['status'], Job.PENDING)
+        self.assertTrue(response['Location'].endswith(
+            reverse('job_detail', args=(job['id'],))
+        ))
+        self.assertEqual(self.client.get(job['result']).status_code, 202)
+
+        call_command('run_jobs', '--once', stdout=StringIO())
+        detail = self.client.get(reverse('job_detail', args=(job['id'],)))
+        self.assertEqual(detail.json()['status'], Job.DONE)
+        result = self.client.get(job['result'])
+        self.assertEqual(result['Content-Type'], 'application/pdf')
+        self.assertTrue(result.content.startswith(b'%PDF'))
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create(
+            username='other', email='other@example.com'
+        ))
+        self.assertEqual(other.get(job['result']).status_code, 404)
+
+    def test_failed_job_and_single_claim(self):
+        def fail(job):
+            raise RuntimeError('сбой')
+
+        with mock.patch.dict(TASKS, {'fail': fail}):
+            job = enqueue('fail', user=self.user)
+            self.assertEqual(claim().id, job.id)
+            self.assertIsNone(claim())
+            Job.objects.filter(pk=job.pk).update(status=Job.PENDING)
+            call_command('run_jobs', '--once', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('сбой', job.error)
+        response = self.client.get(reverse('job_result', args=(job.id,)))
+        self.assertEqual(response.status_code, 409)
+        with self.assertRaises(ValueError):
+            enqueue('unknown')
+
+    def test_worker_reclaims_stale_jobs(self):
+        started = timezone.now() - timedelta(
+            seconds=settings.JOBS['TIMEOUT'] + 1
+        )
+        with mock.patch.dict(TASKS, {'ok': lambda job: {'ok': True}}):
+            stale = enqueue('ok', user=self.user)
+            crashing = enqueue('ok', user=self.user)
+            Job.objects.filter(pk=stale.pk).update(
+                status=Job.RUNNING, started_at=started, attempts=1
+            )
+            Job.objects.filter(pk=crashing.pk).update(
+                status=Job.RUNNING, started_at=started,
+                attempts=settings.JOBS['MAX_ATTEMPTS']
+            )
+            idle = mock.patch('jobs.queue.time.sleep', side_effect=[
+                None, KeyboardInterrupt
+            ])
+            with idle, self.assertRaises(KeyboardInterrupt), \
+                    override_settings(JOBS={
+                        **settings.JOBS, 'MAINTENANCE_INTERVAL': 0
+                    }), mock.patch('jobs.queue.maintain',
+                                   wraps=queue.maintain) as maintain:
+                queue.work()
+        self.assertEqual(maintain.call_count, 3)
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.attempts), (Job.DONE, 2))
+        crashing.refresh_from_db()
+        self.assertEqual(crashing.status, Job.FAILED)
+
+
+class PopularityTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username='client', email='client@example.com'
+        )
+        self.first, self.second, self.third = Recipe.objects.bulk_create(
+            Recipe(author=self.user, name=f'Рецепт {i}', text='Текст',
+                   cooking_time=10)
+            for i in range(3)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def popular(self):
+        response = self.client.get(
+            reverse('recipe_list'), {'ordering': 'popular'}
+        )
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_events_update_ranking(self):
+        self.client.get(reverse('recipe_favorite', args=(self.second.id,)))
+        self.client.get(reverse('shopping_cart', args=(self.second.id,)))
+        self.client.post(
+            reverse('shopping_cart_batch'),
+            {'recipes': [self.first.id, self.second.id]}, format='json'
+        )
+        self.assertEqual(
+            self.popular(), [self.second.id, self.first.id, self.third.id]
+        )
+
+        self.client.delete(reverse('recipe_favorite', args=(self.second.id,)))
+        self.client.delete(
+            reverse('shopping_cart_batch'),
+            {'recipes': [self.first.id]}, format='json'
+        )
+        self.assertFalse(
+            RecipePopularity.objects.filter(recipe=self.first).exists()
+        )
+        self.assertEqual(
+            self.popular(), [self.second.id, self.third.id, self.first.id]
+        )
+
+        popularity.rebuild()
+        self.assertEqual(
+            list(RecipePopularity.objects.values_list('recipe_id', flat=True)),
+            [self.second.id]
+        )
+
+    def test_removal_subtracts_original_weight(self):
+        other = User.objects.create(
+            username='other', email='other@example.com'
+        )
+        client = APIClient()
+        client.force_authenticate(other)
+        url = reverse('recipe_favorite', args=(self.first.id,))
+        start = timezone.now()
+        with mock.patch('django.utils.timezone.now', return_value=start):
+            self.client.get(url)
+        later = start + timedelta(days=14)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            client.get(url)
+            self.client.delete(url)
+        score = RecipePopularity.objects.get(recipe=self.first).score
+        self.assertAlmostEqual(
+            score, popularity.event_weight('favorite', later)
+        )
+
+        popularity.rebuild()
+        self.assertAlmostEqual(
+            RecipePopularity.objects.get(recipe=self.first).score, score
+        )
+
+    def test_scores_decay(self):
+        start = timezone.now()
+        with mock.patch('django.utils.timezone.now', return_value=start):
+            popularity.add((self.first.id,), 'favorite')
+        later = start + timedelta(days=14)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            popularity.add((self.second.id,), 'shopping_cart')
+            self.assertEqual(self.popular()[:2],
+                             [self.second.id, self.first.id])
+
+        with mock.patch('django.utils.timezone.now',
+                        return_value=later + timedelta(days=35)):
+            call_command('compact_popularity', stdout=StringIO())
+            self.assertEqual(
+                list(RecipePopularity.objects.values_list(
+                    'recipe_id', flat=True
+                )),
+                [self.second.id]
+            )
+
+
+class RecommendationTest(TestCase):
+    def setUp(self):
+        self.users = User.objects.bulk_create(
+            User(username=f'user{i}', email=f'user{i}@example.com')
+            for i in range(4)
+        )
+        self.recipes = Recipe.objects.bulk_create(
+            Recipe(author=self.users[0], name=f'Рецепт {i}', text='Текст',
+                   cooking_time=10)
+            for i in range(4)
+        )
+
+    def favorite(self, user, *recipes):
+        Favorite.objects.bulk_create(
+            Favorite(user=self.users[user], recipe=self.recipes[recipe])
+            for recipe in recipes
+        )
+
+    def similar(self, recipe):
+        response = self.client.get(
+            reverse('recipe_similar', args=(self.recipes[recipe].id,))
+        )
+        return [item['id'] for item in response.json()]
+
+    def test_builds_and_refreshes_incrementally(self):
+        first, second, third, fourth = (recipe.id for recipe in self.recipes)
+        self.favorite(0, 0, 1)
+        self.favorite(1, 0, 1, 2)
+        ShoppingCart.objects.create(user=self.users[2], recipe_id=fourth)
+        call_command('build_recommendations', stdout=StringIO())
+        self.assertEqual(self.similar(0), [second, third])
+        self.assertEqual(self.similar(3), [])
+
+        self.favorite(2, 0)
+        self.assertEqual(
+            recommendations.build(), len({first, second, third, fourth})
+        )
+        self.assertEqual(self.similar(3), [first])
+        self.assertEqual(self.similar(0), [second, third, fourth])
+        self.assertEqual(recommendations.build(), 0)
+
+        Favorite.objects.filter(user=self.users[1]).delete()
+        recommendations.build()
+        self.assertEqual(self.similar(2), [])
+        self.assertEqual(self.similar(0), [second, fourth])
+        with self.assertNumQueries(1):
+            self.similar(0)
+
+
+class UserListTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = User.objects.bulk_create(
+            User(username=username, email=f'{username}@example.com',
+                 first_name=first_name, last_name='Smith')
+            for username, first_name in (
+                ('anna', 'Anna'), ('annet', 'Bella'), ('boris', 'Annabel'),
+                ('carl', 'Carl'), ('dan', 'Dan'),
+            )
+        )
+        self.client = APIClient()
+
+    def test_search_by_prefix(self):
+        url = reverse('user_list')
+        response = self.client.get(url, {'search': 'ann'})
+        self.assertEqual(
+            [user['username'] for user in response.json()['results']],
+            ['anna', 'annet', 'boris']
+        )
+        response = self.client.get(url, {'search': 'SMI'})
+        self.assertEqual(response.json()['count'], 5)
+        response = self.client.get(url, {'search': 'nna'})
+        self.assertEqual(response.json()['count'], 0)
+        for search in ('\U0010ffff', 'a\U0010ffff', '\ud7ff'):
+            response = self.client.get(url, {'search': search})
+            self.assertEqual(response.json()['count'], 0)
+
+    @override_settings(SUBSCRIBER_COUNT_CACHE=True)
+    def test_cursor_pagination_and_subscriber_count(self):
+        anna, *others = self.users
+        Subscription.objects.bulk_create(
+            Subscription(user=user, author=anna) for user in others[:3]
+        )
+        url = reverse('user_list')
+        page = self.client.get(url, {'cursor': '', 'page_size': 2}).json()
+        self.assertNotIn('count', page)
+        self.assertEqual(page['results'][0]['subscribers_count'], 3)
+        usernames = [user['username'] for user in page['results']]
+        while page['next']:
+            page = self.client.get(page['next']).json()
+            usernames += [user['username'] for user in page['results']]
+        self.assertEqual(usernames, [user.username for user in self.users])
+
+        client = APIClient()
+        client.force_authenticate(others[-1])
+        client.get(reverse('subscribe', args=(anna.id,)))
+        page = self.client.get(url, {'cursor': ''}).json()
+        self.assertEqual(page['results'][0]['subscribers_count'], 4)
+
+        soft_delete_users(User.objects.filter(pk=others[0].pk))
+        page = self.client.get(url, {'cursor': ''}).json()
+        self.assertEqual(page['results'][0]['subscribers_count'], 3)
+
+
+class AdminChangelistTest(TestCase):
+    changelists = (
+        'admin:recipe_recipe_changelist', 'admin:recipe_favorite_changelist',
+        'admin:recipe_shoppingcart_changelist',
+        'admin:recipe_ingredient_changelist',
+        'admin:users_user_changelist', 'admin:users_subscription_changelist',
+    )
+
+    def setUp(self):
+        self.admin = User.objects.create(
+            username='admin', email='admin@example.com',
+            is_staff=True, is_superuser=True
+        )
+        self.client.force_login(self.admin)
+
+    def populate(self, count):
+        start = User.objects.count()
+        users = User.objects.bulk_create(
+            User(username=f'user{i}', email=f'user{i}@example.com')
+            for i in range(start, start + count)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=user, name=f'Рецепт {user.id}', text='Текст',
+                   cooking_time=10)
+            for user in users
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {user.id}', measurement_unit='г')
+            for user in users
+        )
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                model(user=user, recipe=recipe)
+                for user, recipe in zip(users, recipes)
+            )
+        Subscription.objects.bulk_create(
+            Subscription(user=user, author=self.admin) for user in users
+        )
+
+    def count_queries(self):
+        counts = {}
+        for name in self.changelists:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            counts[name] = len(queries)
+        return counts
+
+    def test_query_count_does_not_grow(self):
+        self.populate(2)
+        small = self.count_queries()
+        self.populate(30)
+        self.assertEqual(self.count_queries(), small)
+
+    @override_settings(ADMIN_COUNT_LIMIT=5)
+    def test_count_is_capped(self):
+        self.populate(20)
+        response = self.client.get(reverse('admin:recipe_recipe_changelist'))
+        self.assertEqual(response.context['cl'].result_count, 5)
+
+
+class SparseFieldsetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(
+            username='client', email='client@example.com'
+        )
+        tag = Tag.objects.create(name='Завтрак', color='#FFFFFF', slug='b')
+        ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Блины', text='Текст', cooking_time=10,
+            image=None
+        )
+        self.recipe.tags.add(tag)
+        IngredientAmount.objects.create(
+            recipe=self.recipe, ingredient=ingredient, amount=200
+        )
+        self.ids = {'tag': tag.id, 'ingredient': ingredient.id}
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_prunes_fields_and_queries(self):
+        url = reverse('recipe_list')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                url, {'fields': 'id,name,image,cooking_time'}
+            )
+        self.assertEqual(
+            set(response.json()['results'][0]),
+            {'id', 'name', 'image', 'cooking_time'}
+        )
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('"text"', queries[-1]['sql'])
+        self.assertNotIn('EXISTS', queries[-1]['sql'])
+
+        recipe = self.client.get(
+            url, {'fields': 'id,author,tags,ingredients'}
+        ).json()['results'][0]
+        self.assertEqual(recipe['author'], self.user.id)
+        self.assertEqual(recipe['tags'], [self.ids['tag']])
+        self.assertEqual(recipe['ingredients'], [self.ids['ingredient']])
+
+        recipe = self.client.get(url, {'expand': 'author'}).json()
+        recipe = recipe['results'][0]
+        self.assertEqual(recipe['author']['username'], 'client')
+        self.assertEqual(recipe['tags'], [self.ids['tag']])
+        self.assertIn('text', recipe)
+
+    def test_detail_and_validation(self):
+        url = reverse('recipe_detail', args=(self.recipe.id,))
+        recipe = self.client.get(
+            url, {'fields': 'name,ingredients', 'expand': 'ingredients'}
+        ).json()
+        self.assertEqual(recipe, {
+            'name': 'Блины',
+            'ingredients': [{
+                'id': self.ids['ingredient'], 'name': 'Мука', 'amount': 200,
+                'measurement_unit': 'г',
+            }],
+        })
+        response = self.client.get(
+            url, {'fields': 'name,secret', 'expand': 'text'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'fields', 'expand'})
+
+
+@override_settings(SYNC={**settings.SYNC, 'LAG': 0})
+class SyncTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username='client', email='client@example.com'
+        )
+        self.other = User.objects.create(
+            username='other', email='other@example.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('sync')
+
+    def sync(self, token, client=None):
+        return (client or self.client).get(self.url, {'since': token}).json()
+
+    def test_changes_since_token(self):
+        token = self.client.get(self.url).json()['token']
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tag.objects.create(name='Завтрак', color='#FF0000',
+                                     slug='breakfast')
+            recipe = Recipe.objects.create(
+                author=self.user, name='Рецепт', text='Текст',
+                cooking_time=10
+            )
+            recipe.tags.add(tag)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('favorite_batch'),
+                             {'recipes': [recipe.id]}, format='json')
+
+        data = self.sync(token)
+        self.assertFalse(data['has_more'])
+        self.assertEqual([item['id'] for item in data['recipes']['updated']],
+                         [recipe.id])
+        self.assertEqual(data['tags']['updated'][0]['slug'], 'breakfast')
+        self.assertEqual(data['favorites'], {
+            'updated': [recipe.id], 'deleted': []
+        })
+        self.assertEqual(
+            self.sync(token, APIClient())['favorites']['updated'], []
+        )
+
+        token = data['token']
+        self.assertEqual(self.sync(token)['recipes']['updated'], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('favorite_batch'),
+                               {'recipes': [recipe.id]}, format='json')
+            recipe_id = recipe.id
+            recipe.delete()
+        data = self.sync(token)
+        self.assertEqual(data['recipes'], {
+            'updated': [], 'deleted': [recipe_id]
+        })
+        self.assertEqual(data['favorites']['deleted'], [recipe_id])
+
+    @override_settings(SYNC={'PAGE_SIZE': 2, 'RETENTION': 60, 'LAG': 0})
+    def test_paging_and_expired_token(self):
+        token = self.client.get(self.url).json()['token']
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(3):
+                Ingredient.objects.create(name=f'Ингредиент {i}',
+                                          measurement_unit='г')
+        data = self.sync(token)
+        self.assertTrue(data['has_more'])
+        self.assertEqual(len(data['ingredients']['updated']), 2)
+        data = self.sync(data['token'])
+        self.assertFalse(data['has_more'])
+        self.assertEqual(len(data['ingredients']['updated']), 1)
+
+        cursor = token.split('.')[0]
+        response = self.client.get(self.url, {'since': f'{cursor}.0'})
+        self.assertEqual(response.status_code, 410)
+        response = self.client.get(self.url, {'since': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_fresh_change_holds_back_later_ones(self):
+        fresh = Change.objects.create(kind=Change.TAG, object_id=1)
+        Change.objects.create(kind=Change.TAG, object_id=2)
+        Change.objects.filter(id__gt=fresh.id).update(
+            created_at=timezone.now() - timedelta(minutes=1)
+        )
+        with override_settings(SYNC={**settings.SYNC, 'LAG': 60}):
+            token = self.client.get(self.url).json()['token']
+            self.assertEqual(int(token.split('.')[0]), fresh.id - 1)
+            data = self.sync(token)
+            self.assertFalse(data['has_more'])
+            self.assertEqual(data['tags'], {'updated': [], 'deleted': []})
+            self.assertEqual(data['token'].split('.')[0], str(fresh.id - 1))
+
+        data = self.sync(token)
+        self.assertEqual(data['tags']['deleted'], [1, 2])
+
+    def test_compact_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient = Ingredient.objects.create(name='Соль',
+                                                   measurement_unit='г')
+        for _ in range(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                ingredient.save()
+        call_command('compact_changes', stdout=StringIO())
+        self.assertEqual(Change.objects.filter(
+            object_id=ingredient.id, kind=Change.INGREDIENT
+        ).count(), 1)
+
+
+class NotificationTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username='client', email='client@example.com'
+        )
+        self.author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+        self.other = User.objects.create(
+            username='other', email='other@example.com'
+        )
+        Subscription.objects.create(user=self.user, author=self.author)
+        self.token = Token.objects.create(user=self.user)
+
+    def scope(self, query_string=b'', headers=()):
+        return {
+            'type': 'http', 'method': 'GET', 'path': '/api/notifications/',
+            'headers': list(headers), 'query_string': query_string,
+        }
+
+    async def open_status(self, scope):
+        incoming, sent = asyncio.Queue(), asyncio.Queue()
+        stream = asyncio.ensure_future(
+            EventStream(None)(scope, incoming.get, sent.put)
+        )
+        status = await self.next_chunk(sent)
+        await incoming.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(stream, 1)
+        return status
+
+    async def next_chunk(self, sent):
+        message = await asyncio.wait_for(sent.get(), 1)
+        return message.get('body', message.get('status'))
+
+    async def test_stream_follows_subscriptions(self):
+        incoming, sent = asyncio.Queue(), asyncio.Queue()
+        stream = asyncio.ensure_future(EventStream(None)(
+            self.scope(headers=[
+                (b'authorization', f'Token {self.token.key}'.encode())
+            ]), incoming.get, sent.put
+        ))
+        self.assertEqual(await self.next_chunk(sent), 200)
+        self.assertEqual(await self.next_chunk(sent), b': connected\n\n')
+
+        create = sync_to_async(Recipe.objects.create)
+        recipe = await create(author=self.other, name='Чужой', text='Т',
+                              cooking_time=1)
+        await sync_to_async(publish_recipe)(recipe)
+        recipe = await create(author=self.author, name='Новый', text='Т',
+                              cooking_time=1)
+        await sync_to_async(publish_recipe)(recipe)
+        chunk = await self.next_chunk(sent)
+        self.assertTrue(chunk.startswith(b'event: recipe\n'))
+        self.assertIn(b'"name":"\xd0\x9d', chunk)
+
+        await sync_to_async(publish_follow)(self.user.id, self.other.id, True)
+        recipe = await create(author=self.other, name='Второй', text='Т',
+                              cooking_time=1)
+        await sync_to_async(publish_recipe)(recipe)
+        chunk = await self.next_chunk(sent)
+        self.assertIn(f'"id":{recipe.id},'.encode(), chunk)
+
+        await incoming.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(stream, 1)
+        self.assertEqual(hub.listeners(), ())
+
+    async def test_created_recipe_reaches_subscriber(self):
+        tag = await sync_to_async(Tag.objects.create)(
+            name='Ужин', color='#000000', slug='dinner'
+        )
+        ingredient = await sync_to_async(Ingredient.objects.create)(
+            name='Соль', measurement_unit='г'
+        )
+        listener = hub.subscribe([f'author:{self.author.id}'])
+        client = APIClient()
+        client.force_authenticate(self.author)
+        try:
+            with tempfile.TemporaryDirectory() as media, \
+                    override_settings(MEDIA_ROOT=media):
+                response = await sync_to_async(client.post)(
+                    reverse('recipe_list'),
+                    recipe_payload((tag,), (ingredient,)), format='json'
+                )
+            self.assertEqual(response.status_code, 201)
+            event = await asyncio.wait_for(listener.get(), 1)
+        finally:
+            hub.unsubscribe(listener)
+        self.assertEqual(event['id'], response.data['id'])
+        self.assertEqual(response.data['ingredients'][0]['amount'], 2)
+
+    async def test_rejects_anonymous(self):
+        sent = asyncio.Queue()
+        await EventStream(None)(
+            self.scope(f'token={self.token.key}'.encode()), None, sent.put
+        )
+        self.assertEqual(await self.next_chunk(sent), 401)
+
+    async def test_ticket(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = await sync_to_async(client.post)(
+            reverse('notification_ticket')
+        )
+        query = f'ticket={response.data["ticket"]}'.encode()
+        self.assertEqual(await self.open_status(self.scope(query)), 200)
+
+        with override_settings(NOTIFICATIONS={
+            **settings.NOTIFICATIONS, 'TICKET_MAX_AGE': -1
+        }):
+            self.assertEqual(await self.open_status(self.scope(query)), 401)
+        self.assertEqual(
+            await self.open_status(self.scope(query + b'x')), 401
+        )
+
+    async def test_rejects_inactive_and_deleted_users(self):
+        header = [(b'authorization', f'Token {self.token.key}'.encode())]
+        update = sync_to_async(
+            lambda **fields: User.objects.filter(pk=self.user.pk).update(
+                **fields
+            )
+        )
+        await update(is_active=False)
+        self.assertEqual(await self.open_status(self.scope(headers=header)),
+                         401)
+        await update(is_active=True, deleted_at=timezone.now())
+        self.assertEqual(await self.open_status(self.scope(headers=header)),
+                         401)
+
+    @override_settings(NOTIFICATIONS={
+        **settings.NOTIFICATIONS, 'QUEUE_SIZE': 2
+    })
+    async def test_slow_listener_does_not_block_publisher(self):
+        slow = hub.subscribe(['author:1'])
+        other = hub.subscribe(['author:2'])
+        try:
+            for i in range(3):
+                await sync_to_async(hub.publish)('author:1', {'id': i})
+            hub.publish('author:2', {'id': 0})
+            await asyncio.sleep(0)
+            self.assertEqual(await slow.get(), OVERFLOW)
+            self.assertTrue(slow.queue.empty())
+            self.assertEqual(await other.get(), {'id': 0})
+        finally:
+            hub.unsubscribe(slow)
+            hub.unsubscribe(other)
+
+
+class ThrottleTest(TestCase):
+    rates = {
+        'anon': '100/min', 'user': '100/min', 'login': '2/min',
+        'shopping_cart_pdf': '1/min', 'recipe_create': '1/hour',
+    }
+
+    def setUp(self):
+        cache.clear()
+        local_store.clear()
+        self.user = User.objects.create(
+            username='client', email='client@example.com'
+        )
+        self.other = User.objects.create(
+            username='other', email='other@example.com'
+        )
+
+    def assert_throttled(self, response, retry_after):
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], str(retry_after))
+
+    def check_login_and_cart(self):
+        client = APIClient()
+        url = reverse('login')
+        payload = {'email': self.user.email, 'password': 'wrong'}
+        for _ in range(2):
+            self.assertEqual(client.post(url, payload).status_code, 400)
+        self.assert_throttled(client.post(url, payload), 30)
+
+        client.force_authenticate(self.user)
+        url = reverse('download_shopping_cart')
+        self.assertEqual(client.post(url).status_code, 200)
+        self.assert_throttled(client.post(url), 60)
+        self.assertEqual(client.get(reverse('recipe_list')).status_code, 200)
+        client.force_authenticate(self.other)
+        self.assertEqual(client.post(url).status_code, 200)
+
+    def test_local_store(self):
+        with override_settings(REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': self.rates
+        }):
+            self.check_login_and_cart()
+
+    def test_cache_store(self):
+        with override_settings(REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': self.rates
+        }, THROTTLE={**settings.THROTTLE, 'STORE': 'cache'}):
+            self.check_login_and_cart()
+        self.assertEqual(local_store.buckets, {})
+
+    def test_forwarded_for_is_not_trusted(self):
+        client = APIClient()
+        url = reverse('login')
+        payload = {'email': self.user.email, 'password': 'wrong'}
+        with override_settings(REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': self.rates
+        }):
+            responses = [
+                client.post(
+                    url, payload,
+                    HTTP_X_FORWARDED_FOR=f'10.0.0.{number}, 198.51.100.7'
+                )
+                for number in range(3)
+            ]
+            self.assert_throttled(responses[-1], 30)
+            self.assertEqual(client.post(
+                url, payload, HTTP_X_FORWARDED_FOR='198.51.100.8'
+            ).status_code, 400)
+
+    def test_bucket_refills(self):
+        store = LocalBucketStore()
+        with mock.patch('api.throttling.time.monotonic', return_value=100):
+            self.assertEqual(store.consume('key', 2, 5), 0)
+            self.assertEqual(store.consume('key', 2, 5), 0)
+            self.assertEqual(store.consume('key', 2, 5), 5)
+        with mock.patch('api.throttling.time.monotonic', return_value=105):
+            self.assertEqual(store.consume('key', 2, 5), 0)
+            self.assertEqual(store.consume('key', 2, 5), 5)
+
+
+class ProfilerTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.settings = override_settings(PROFILER={
+            **settings.PROFILER, 'ENABLED': True, 'POLL_INTERVAL': 0,
+            'DIR': self.directory.name,
+        })
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        session_state.sampler = None
+        session_state.checked = float('-inf')
+        self.staff = User.objects.create(
+            username='staff', email='staff@example.com', is_staff=True
+        )
+        self.client = APIClient()
+        self.client.force_login(self.staff)
+
+    def test_sampler_records_target_thread(self):
+        sampler = Sampler('manual', targets=(threading.get_ident(),))
+        sampler.start()
+        time.sleep(0.05)
+        sampler.stop()
+        self.assertTrue(any(
+            'api.tests.ProfilerTest.test_sampler_records_target_thread'
+            in stack for stack in sampler.counts
+        ))
+
+    def test_request_profile(self):
+        response = self.client.get(reverse('tag_list'), HTTP_X_PROFILE='1')
+        profile_id = response['X-Profile-Id']
+        response = self.client.get(reverse('profile', args=(profile_id,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['profiles'][0]['type'], 'sampled')
+        response = self.client.get(
+            reverse('profile', args=(profile_id,)), {'output': 'collapsed'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+
+        client = APIClient()
+        response = client.get(reverse('tag_list'), HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(
+            client.get(reverse('profile', args=(profile_id,))).status_code,
+            403
+        )
+
+    def test_session(self):
+        url = reverse('profiler')
+        self.assertEqual(self.client.post(url, {'seconds': 600}).status_code,
+                         400)
+        response = self.client.post(url, {'seconds': 0.2})
+        self.assertEqual(response.status_code, 202)
+        profile_url = response['Location']
+        self.assertEqual(self.client.get(profile_url).status_code, 404)
+
+        self.client.get(reverse('recipe_list'))
+        session_state.sampler.join()
+        self.assertEqual(self.client.get(profile_url).status_code, 200)
+
+    def test_disabled(self):
+        with override_settings(PROFILER={
+            **settings.PROFILER, 'ENABLED': False
+        }):
+            client = APIClient()
+            client.force_authenticate(self.staff)
+            response = client.get(reverse('tag_list'), HTTP_X_PROFILE='1')
+            self.assertNotIn('X-Profile-Id', response)
+            self.assertEqual(
+                client.post(reverse('profiler'), {'seconds': 1}).status_code,
+                404
+            )
+
+
+class PerformanceMiddlewareTest(TestCase):
+    def test_server_timing_and_metrics(self):
+        Tag.objects.create(name='Ужин', color='#000000', slug='dinner')
+        request = RequestFactory().get('/')
+        TagSerializer(
+            Tag.objects.all(), many=True, context={'request': request}
+        ).data
+        self.assertGreater(request.serialize_duration, 0)
+
+        response = self.client.get(reverse('tag_list'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+        self.assertIn('render;dur=', response['Server-Timing'])
+
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        with override_settings(METRICS_ALLOWED_IPS=('127.0.0.1',)):
+            metrics = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'foodgram_request_duration_seconds_count{view="tag_list"}',
+            metrics
+        )
+        self.assertIn('foodgram_db_queries_bucket{view="tag_list",le="1"}',
+                      metrics)
+        self.assertIn(
+            'foodgram_serialize_duration_seconds_count{view="tag_list"}',
+            metrics
+        )
+
+        self.client.force_login(User.objects.create(
+            username='staff', email='staff@example.com', is_staff=True
+        ))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+
+class QuerySamplerTest(TestCase):
+    def test_fingerprint_strips_literals(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3) AND n = 'a'"),
+            fingerprint('SELECT * FROM t WHERE id IN (%s) AND n = %s')
+        )
+
+    def test_sampled_requests_are_logged(self):
+        cache.clear()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'queries.ndjson')
+            config = {
+                'ENABLED': True, 'SAMPLE_RATE': 1, 'SLOW_MS': 0,
+                'LOG_FILE': path, 'MAX_BYTES': 1024 * 1024,
+                'BACKUP_COUNT': 1,
+            }
+            with override_settings(QUERY_SAMPLER=config):
+                self.client.get(reverse('recipe_list'))
+                output = StringIO()
+                call_command('query_report', log=path, stdout=output)
+
+            with open(path, encoding='utf-8') as file:
+                records = [json.loads(line) for line in file]
+
+        self.assertTrue(records)
+        self.assertTrue(all(
+            record['view'] == 'recipe_list' and record['slow']
+            for record in records
+        ))
+        self.assertIn('api/views.py', output.getvalue())
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(
+            username='author', email='author@example.com',
+            first_name='Автор', last_name='Тестовый'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст', cooking_time=10
+        )
+        self.url = reverse('recipe_detail', args=(self.recipe.id,))
+
+    def test_not_modified_without_serialization(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Authorization', response['Vary'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                self.url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_recipe_and_user_flags(self):
+        etag = self.client.get(self.url)['ETag']
+        self.recipe.name = 'Новое имя'
+        self.recipe.save()
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+
+        client = APIClient()
+        client.force_authenticate(self.author)
+        etag = client.get(self.url)['ETag']
+        Favorite.objects.create(user=self.author, recipe=self.recipe)
+        response = client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_versions_stay_out_of_payload(self):
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        recipe = self.client.get(self.url).json()
+        self.assertNotIn('updated_at', recipe)
+        self.assertNotIn('updated_at', recipe['author'])
+        self.assertNotIn(
+            'updated_at', self.client.get(reverse('recipe_list')).json()[
+                'results'
+            ][0]
+        )
+        self.assertEqual(
+            self.client.get(reverse('ingredient_list')).json(),
+            [{'id': Ingredient.objects.get().id, 'name': 'Соль',
+              'measurement_unit': 'г'}]
+        )
+
+    def test_validators_cover_embedded_rows(self):
+        tag = Tag.objects.create(name='Ужин', color='#000000', slug='dinner')
+        ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        self.recipe.tags.add(tag)
+        IngredientAmount.objects.create(
+            recipe=self.recipe, ingredient=ingredient, amount=1
+        )
+        past = timezone.now() - timedelta(days=1)
+        for model in (Recipe, User, Tag, Ingredient):
+            model.objects.update(updated_at=past)
+
+        def rename(obj, field, value):
+            setattr(obj, field, value)
+            obj.save()
+
+        changes = {
+            'author': partial(rename, self.author, 'first_name', 'Шеф'),
+            'tag': partial(rename, tag, 'name', 'Обед'),
+            'ingredient': partial(rename, ingredient, 'name', 'Перец'),
+        }
+        for name, change in changes.items():
+            with self.subTest(name):
+                response = self.client.get(self.url)
+                change()
+                self.assertEqual(self.client.get(
+                    self.url, HTTP_IF_NONE_MATCH=response['ETag']
+                ).status_code, 200)
+                self.assertNotEqual(
+                    self.client.get(self.url)['Last-Modified'],
+                    response['Last-Modified']
+                )
+                for model in (User, Tag, Ingredient):
+                    model.objects.update(updated_at=past)
+
+        etag = self.client.get(self.url)['ETag']
+        tag.delete()
+        self.assertEqual(self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=etag
+        ).status_code, 200)
+
+
+@override_settings(FEED_CACHE={**settings.FEED_CACHE, 'ENABLED': True})
+class FeedCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.authors = User.objects.bulk_create(
+            User(username=f'author{i}', email=f'author{i}@example.com',
+                 first_name='Автор', last_name=str(i))
+            for i in range(2)
+        )
+        self.tag = Tag.objects.create(name='Еда', color='#49B64E',
+                                      slug='food')
+
+    def create_recipe(self, author):
+        recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Текст', cooking_time=10
+        )
+        recipe.tags.add(self.tag)
+        return recipe
+
+    def test_anonymous_feed_is_cached(self):
+        self.create_recipe(self.authors[0])
+        url = reverse('recipe_list')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.json()['count'], 1)
+
+        client = APIClient()
+        client.force_authenticate(self.authors[0])
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        self.assertTrue(queries)
+
+    def test_invalidation_is_targeted(self):
+        first, second = self.authors
+        self.create_recipe(second)
+        feed = reverse('recipe_list')
+        by_first = f'{feed}?author={first.id}'
+        by_second = f'{feed}?author={second.id}'
+        for url in (feed, by_first, by_second):
+            self.client.get(url)
+
+        recipe = self.create_recipe(first)
+        with self.assertNumQueries(0):
+            self.client.get(by_second)
+        self.assertEqual(self.client.get(feed).json()['count'], 2)
+        self.assertEqual(self.client.get(by_first).json()['count'], 1)
+
+        recipe.delete()
+        self.assertEqual(self.client.get(feed).json()['count'], 1)
+
+    def test_embedded_rows_invalidate(self):
+        author = self.authors[0]
+        self.create_recipe(author)
+        by_author = f'{reverse("recipe_list")}?author={author.id}'
+        by_tag = f'{reverse("recipe_list")}?tag={self.tag.slug}'
+        self.client.get(by_author)
+        self.client.get(by_tag)
+
+        author.last_login = timezone.now()
+        author.save(update_fields=('last_login',))
+        with self.assertNumQueries(0):
+            self.client.get(by_tag)
+
+        author.first_name = 'Шеф'
+        author.save()
+        result = self.client.get(by_tag).json()['results'][0]
+        self.assertEqual(result['author']['first_name'], 'Шеф')
+
+        self.tag.name = 'Обед'
+        self.tag.save()
+        result = self.client.get(by_author).json()['results'][0]
+        self.assertEqual(result['tags'][0]['name'], 'Обед')
+
+    def test_disabled_for_process_local_cache(self):
+        self.create_recipe(self.authors[0])
+        url = reverse('recipe_list')
+        with override_settings(FEED_CACHE={
+            **settings.FEED_CACHE, 'ENABLED': None
+        }):
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+        self.assertTrue(queries)
+
+
+class FastRecipeListTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(
+            username='client', email='client@example.com',
+            first_name='Клиент', last_name='Тестовый'
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {i}', color=f'#{i:06X}', slug=f't{i}')
+            for i in range(3)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(4)
+        )
+        for i in range(8):
+            recipe = Recipe.objects.create(
+                author=self.user if i % 2 else User.objects.create(
+                    username=f'author{i}', email=f'author{i}@example.com',
+                    first_name='Автор', last_name=str(i)
+                ),
+                name=f'Рецепт {i}', text='Строка "кавычки"',
+                cooking_time=i + 1,
+                image='static/recipe/image.png' if i % 3 else None
+            )
+            recipe.tags.set(tags[:i % 3 + 1])
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(recipe=recipe, ingredient=ingredient,
+                                 amount=i * 10 + 1)
+                for ingredient in ingredients[i % 4:]
+            )
+        Favorite.objects.create(user=self.user, recipe=recipe)
+
+    def assert_same_output(self, client, url):
+        with override_settings(FAST_RECIPE_LIST=False):
+            expected = client.get(url).content
+        cache.clear()
+        with mock.patch('api.views.FastRecipeListSerializer',
+                        wraps=FastRecipeListSerializer) as fast:
+            content = client.get(url).content
+        self.assertTrue(fast.called)
+        self.assertEqual(content, expected)
+
+    def test_output_matches_model_serializer(self):
+        url = reverse('recipe_list')
+        self.assert_same_output(APIClient(), url)
+        self.assert_same_output(APIClient(), f'{url}?page=2')
+        self.assert_same_output(APIClient(), f'{url}?tag=t1&tag=t2')
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assert_same_output(client, url)
+        self.assert_same_output(client, f'{url}?is_favorited=1')
+
+
+class RecipeIdsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(
+            username='client', email='client@example.com'
+        )
+        self.recipes = Recipe.objects.bulk_create(
+            Recipe(author=self.user, name=f'Рецепт {i}', text='Текст',
+                   cooking_time=10)
+            for i in range(5)
+        )
+        Favorite.objects.create(user=self.user, recipe=self.recipes[2])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('recipe_list')
+
+    def test_returns_requested_order(self):
+        first, _, third, _, fifth = (recipe.id for recipe in self.recipes)
+        ids = f'{third},{first},{fifth + 100},{third},{fifth}'
+        response = self.client.get(self.url, {'ids': ids})
+        self.assertEqual([item['id'] for item in response.json()],
+                         [third, first, fifth])
+        self.assertTrue(response.json()[0]['is_favorited'])
+        with override_settings(FAST_RECIPE_LIST=False):
+            self.assertEqual(
+                self.client.get(self.url, {'ids': ids}).content,
+                response.content
+            )
+
+        response = self.client.get(
+            self.url, {'ids': ids, 'fields': 'name', 'is_favorited': 'true'}
+        )
+        self.assertEqual(response.json(), [{'name': 'Рецепт 2'}])
+
+    def test_rejects_invalid_ids(self):
+        for ids in ('', 'x', '0', ','.join(map(str, range(1, 102)))):
+            response = self.client.get(self.url, {'ids': ids})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('ids', response.json())
+
+
+class CompressionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(100)
+        )
+        self.client = APIClient()
+
+    def test_negotiates_encoding(self):
+        url = reverse('recipe_list')
+        user = User.objects.create(username='author', email='a@example.com')
+        for i in range(10):
+            Recipe.objects.create(
+                author=user, name=f'Рецепт {i}', text='Текст ' * 50,
+                cooking_time=1, image=None
+            )
+        plain = self.client.get(url)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        response = self.client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip;q=0, br;q=0'
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get(
+            reverse('tag_list'), HTTP_ACCEPT_ENCODING='gzip, br'
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_catalog_is_served_precompressed(self):
+        url = reverse('ingredient_list')
+        plain = self.client.get(url)
+        self.assertEqual(len(plain.json()), 100)
+
+        with mock.patch('api.cache.precompress') as precompress:
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        precompress.assert_not_called()
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=plain['ETag'])
+        self.assertEqual(response.status_code, 304)
+        gzipped = self.client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=plain['ETag']
+        )
+        self.assertEqual(gzipped.status_code, 200)
+        response = self.client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=gzipped['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+        cache.clear()
+        indented = self.client.get(
+            url, HTTP_ACCEPT='application/json; indent=4'
+        )
+        self.assertIn(b'\n    ', indented.content)
+        self.assertEqual(self.client.get(url).content, plain.content)
+
+        Ingredient.objects.create(name='Новый', measurement_unit='кг')
+        self.assertEqual(len(self.client.get(url).json()), 101)
+        filtered = self.client.get(url, {'name': 'Новый'})
+        self.assertEqual(len(filtered.json()), 1)
@@ -0,0 +1,156 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """'10/min' -> (емкость корзины, секунд на один токен)."""
+    count, period = rate.split('/')
+    count = int(count)
+    return count, PERIODS[period[0]] / count
+
+
+class LocalBucketStore:
+    """Корзины в памяти процесса, без блокировок.
+
+    Состояние корзины - одно число, время, когда она снова станет полной
+    (GCRA). Чтение и запись словаря атомарны под GIL, поэтому гонка двух
+    потоков за один ключ в худшем случае пропускает лишний запрос, но не
+    портит состояние.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+
+    def consume(self, key, capacity, interval):
+        now = time.monotonic()
+        full_at = max(self.buckets.get(key, now), now) + interval
+        wait = full_at - now - capacity * interval
+        if wait > 0:
+            return wait
+        if key not in self.buckets:
+            self.evict(now)
+        self.buckets[key] = full_at
+        return 0
+
+    def evict(self, now):
+        if len(self.buckets) < settings.THROTTLE['MAX_KEYS']:
+            return
+        # Полные корзины ничем не отличаются от отсутствующих.
+        for key, full_at in list(self.buckets.items()):
+            if full_at <= now:
+                self.buckets.pop(key, None)
+
+    def clear(self):
+        self.buckets.clear()
+
+
+class CacheBucketStore:
+    """Корзины в общем кеше Django для нескольких процессов.
+
+    Время заполнения хранится в миллисекундах и сдвигается атомарным
+    incr, поэтому кеш должен поддерживать атомарный incr (Redis,
+    Memcached).
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def consume(self, key, capacity, interval):
+        key = f'throttle:{key}'
+        now = int(time.time() * 1000)
+        step = int(interval * 1000)
+        timeout = int(capacity * interval) + 1
+        self.cache.add(key, now, timeout)
+        full_at = self.cache.incr(key, step)
+        if full_at < now + step:
+            # Корзина успела заполниться, отсчет начинается заново.
+            full_at = now + step
+            self.cache.set(key, full_at, timeout)
+        wait = full_at - now - capacity * step
+        if wait > 0:
+            self.cache.decr(key, step)
+            return wait / 1000
+        self.cache.touch(key, timeout)
+        return 0
+
+    def clear(self):
+        self.cache.clear()
+
+
+local_store = LocalBucketStore()
+
+
+def get_store():
+    config = settings.THROTTLE
+    if config['STORE'] == 'local':
+        return local_store
+    if config['STORE'] == 'cache':
+        return CacheBucketStore(config['CACHE_ALIAS'])
+    raise ImproperlyConfigured(
+        "THROTTLE['STORE'] должен быть 'local' или 'cache'"
+    )
+
+
+class BucketThrottle(BaseThrottle):
+    """Token bucket с лимитами из DEFAULT_THROTTLE_RATES.
+
+    Лимит '10/min' означает корзину на 10 запросов, которая пополняется
+    на один токен каждые 6 секунд. Время до следующего токена DRF
+    возвращает в заголовке Retry-After.
+    """
+
+    def get_scope(self, request, view):
+        raise NotImplementedError
+
+    def get_client(self, request):
+        if request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        self.wait_time = 0
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+        capacity, interval = parse_rate(rate)
+        self.wait_time = get_store().consume(
+            f'{scope}:{self.get_client(request)}', capacity, interval
+        )
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
+
+
+class UserBucketThrottle(BucketThrottle):
+    """Общий лимит клиента: user для пользователей, anon по IP."""
+
+    def get_scope(self, request, view):
+        return 'user' if request.user.is_authenticated else 'anon'
+
+
+class ScopedBucketThrottle(BucketThrottle):
+    """Отдельный лимит представления по его throttle_scope."""
+
+    def get_scope(self, request, view):
+        return getattr(view, 'throttle_scope', None)
+
+
+def throttle_scope(scope):
+    """throttle_scope для функций с @api_view, ставится над ним."""
+    def decorator(view):
+        view.cls.throttle_scope = scope
+        return view
+    return decorator
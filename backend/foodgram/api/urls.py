@@ -4,7 +4,10 @@ from .views import (IngredientList, IngredientDetail, TagList, TagDetail,
                     RecipeList, RecipeDetail, FavoriteDetail, UserList,
                     UserDetail, AuthToken, SubscriptionList,
                     SubscriptionDetail, ShoppingCartDetail, set_password,
-                    logout, download_shopping_cart)
+                    logout, download_shopping_cart, FavoriteBatch,
+                    ShoppingCartBatch, MealPlan, JobDetail, JobResult,
+                    RecipeSimilarList, Sync, ProfilerSession,
+                    ProfileDetail, NotificationTicket)
 
 urlpatterns = [
     path('auth/token/login/', AuthToken.as_view(), name='login'),
@@ -22,15 +25,34 @@ urlpatterns = [
     path('ingredients/<int:pk>/', IngredientDetail.as_view(),
          name='ingredient_detail'),
 
+    path('jobs/<int:pk>/', JobDetail.as_view(), name='job_detail'),
+    path('jobs/<int:pk>/result/', JobResult.as_view(), name='job_result'),
+
+    path('notifications/ticket/', NotificationTicket.as_view(),
+         name='notification_ticket'),
+
+    path('sync/', Sync.as_view(), name='sync'),
+
+    path('profiler/', ProfilerSession.as_view(), name='profiler'),
+    path('profiler/<uuid:profile_id>/', ProfileDetail.as_view(),
+         name='profile'),
+
     path('tags/', TagList.as_view(), name='tag_list'),
     path('tags/<int:pk>/', TagDetail.as_view(), name='tag_detail'),
 
     path('recipes/', RecipeList.as_view(), name='recipe_list'),
     path('recipes/<int:pk>/', RecipeDetail.as_view(), name='recipe_detail'),
+    path('recipes/<int:pk>/similar/', RecipeSimilarList.as_view(),
+         name='recipe_similar'),
     path('recipes/<int:recipe_id>/favorite/', FavoriteDetail.as_view(),
          name='recipe_favorite'),
-    path('recipe/<int:recipe_id/shopping_cart/', ShoppingCartDetail.as_view(),
-         name='shopping_cart'),
+    path('recipes/<int:recipe_id>/shopping_cart/',
+         ShoppingCartDetail.as_view(), name='shopping_cart'),
+    path('recipes/favorite/', FavoriteBatch.as_view(),
+         name='favorite_batch'),
+    path('recipes/shopping_cart/', ShoppingCartBatch.as_view(),
+         name='shopping_cart_batch'),
+    path('recipes/meal_plan/', MealPlan.as_view(), name='meal_plan'),
     path('recipes/download_shopping_cart/', download_shopping_cart,
          name='download_shopping_cart')
 ]
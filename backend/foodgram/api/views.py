@@ -1,31 +1,66 @@
-from django.http import HttpResponse
+import time
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
 from django.shortcuts import get_object_or_404
-from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly
+from django.urls import reverse
+from rest_framework.permissions import (AllowAny, IsAdminUser,
+                                        IsAuthenticated,
+                                        IsAuthenticatedOrReadOnly)
 from rest_framework import generics, status
 from rest_framework.decorators import api_view
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
+from django.db import transaction
+from django.db.models import Case, IntegerField, Prefetch, Q, When
 from django.db.models.expressions import OuterRef, Value, Exists
-from django.db.models.aggregates import Count, Sum
+from django.db.models.aggregates import Count, Max, Min
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase.ttfonts import TTFont
+from rest_framework.settings import api_settings
 
 
 from .serializers import (UserListSerializer, UserCreateSerializer,
                           UserPasswordSerializer, SubscriptionSerializer,
                           IngredientSerializer, TagSerializer,
                           RecipeSerializer, TokenSerializer,
-                          RecipeSubscriptionSerializer)
+                          RecipeSubscriptionSerializer,
+                          RecipeBatchSerializer, MealPlanSerializer,
+                          JobSerializer, UserSearchSerializer,
+                          ProfilerSessionSerializer)
+from .deletion import soft_delete_recipes
+from .cache import (ConditionalRetrieveMixin, catalog_cache, feed_cache,
+                    make_etag, subscriber_counts)
+from .compression import choose_encoding
+from .fast_serializers import FastRecipeListSerializer, RECIPE_FIELDS
+from .pagination import UserCursorPagination
 from .permissions import IsAuthorOrAdminOrReadOnly
-from .filters import RecipeFilter, IngrediendFilter
-from recipe.models import Ingredient, Recipe, Favorite, Tag, ShoppingCart
-
-
-User = get_user_model
+from .profiling import read_profile, start_session, to_collapsed, to_speedscope
+from .throttling import throttle_scope
+from .filters import RecipeFilter, IngrediendFilter, UserFilter
+from .exports import render_shopping_cart
+from .meal_plan import plan_ingredients
+from .writes import insert_ignoring_conflicts
+from jobs.models import Job
+from jobs.queue import enqueue
+from notifications.events import publish_follow, publish_recipe
+from notifications.stream import make_ticket
+from sync.log import record
+from sync.models import Change
+from sync.signals import USER_KINDS
+from recipe import popularity
+from recipe.models import (Ingredient, IngredientAmount, Recipe, Favorite,
+                           Tag, ShoppingCart, RecipeSimilarity)
+from users.models import Subscription
+
+
+User = get_user_model()
 
 
 class IngredientList(generics.ListAPIView):
@@ -35,6 +70,45 @@ class IngredientList(generics.ListAPIView):
     permission_classes = (AllowAny,)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        # В общий кеш попадает только компактный JSON: ответ с indent
+        # получил бы каждый клиент.
+        if (request.query_params
+                or request.accepted_renderer.format != 'json'
+                or 'indent' in request.accepted_media_type):
+            return super().list(request, *args, **kwargs)
+
+        version = Ingredient.objects.aggregate(
+            count=Count('id'), last=Max('id')
+        )
+        entry = catalog_cache.get_or_set(
+            f'{version["count"]}-{version["last"]}',
+            lambda: request.accepted_renderer.render(
+                super(IngredientList, self).list(request).data,
+                request.accepted_media_type, self.get_renderer_context()
+            )
+        )
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if encoding not in entry['variants']:
+            encoding = 'identity'
+        # Сжатые варианты - другие байты, поэтому у каждого свой ETag.
+        etag = entry['etag']
+        if encoding != 'identity':
+            etag = f'{etag[:-1]}-{encoding}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(
+                entry['variants'][encoding],
+                content_type=request.accepted_renderer.media_type
+            )
+            if encoding != 'identity':
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
 
 class IngredientDetail(generics.RetrieveAPIView):
     queryset = Ingredient.objects.all()
@@ -55,71 +129,259 @@ class TagDetail(generics.RetrieveAPIView):
     permission_classes = (AllowAny,)
 
 
-class RecipeList(generics.ListCreateAPIView):
+RECIPE_COLUMNS = frozenset((
+    'id', 'author', 'image', 'name', 'text', 'cooking_time', 'pub_date',
+))
+
+# Что подгружать для связей, свернутых до id: автору хватает author_id.
+COLLAPSED_PREFETCHES = {
+    'author': None,
+    'tags': Prefetch('tags', queryset=Tag.objects.only('id')),
+    'ingredients': Prefetch(
+        'recipe_ingredients',
+        queryset=IngredientAmount.objects.only(
+            'id', 'recipe_id', 'ingredient_id'
+        )
+    ),
+}
+
+
+class RecipeQuerySetMixin:
+    def get_recipe_flags(self):
+        user = self.request.user
+        if not user.is_authenticated:
+            return {
+                'is_favorited': Value(False),
+                'is_in_shopping_cart': Value(False),
+            }
+        return {
+            'is_favorited': Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('id')
+            )),
+            'is_in_shopping_cart': Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('id')
+            )),
+        }
+
+    def get_subscribed_flag(self, author='id'):
+        user = self.request.user
+        if not user.is_authenticated:
+            return Value(False)
+        return Exists(user.follower.filter(author=OuterRef(author)))
+
+    def get_sparse_fieldset(self):
+        """Пара (fields, expand) из ?fields= и ?expand= или None.
+
+        Без fields отдаются все поля, связи не из expand сворачиваются до id.
+        Запись всегда работает с полным набором.
+        """
+        if hasattr(self, '_sparse_fieldset'):
+            return self._sparse_fieldset
+        params = self.request.query_params
+        self._sparse_fieldset = None
+        if (self.request.method != 'GET'
+                or not {'fields', 'expand'} & set(params)):
+            return None
+
+        available = set(self.get_serializer_class()().fields)
+        fields = {
+            name for name in params.get('fields', '').split(',') if name
+        } or available
+        expand = {
+            name for name in params.get('expand', '').split(',') if name
+        }
+        errors = {
+            key: f'Неизвестные поля: {", ".join(sorted(unknown))}'
+            for key, unknown in (
+                ('fields', fields - available),
+                ('expand', expand - set(COLLAPSED_PREFETCHES)),
+            ) if unknown
+        }
+        if errors:
+            raise ValidationError(errors)
+        self._sparse_fieldset = fields, expand
+        return self._sparse_fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        sparse = self.get_sparse_fieldset()
+        if sparse is not None:
+            context['fields'], context['expand'] = sparse
+        return context
+
+    def get_relation_prefetches(self):
+        return {
+            'author': Prefetch('author', queryset=User.objects.annotate(
+                is_subscribed=self.get_subscribed_flag()
+            )),
+            'tags': 'tags',
+            'ingredients': 'recipe_ingredients__ingredient',
+        }
+
+    def get_queryset(self):
+        sparse = self.get_sparse_fieldset()
+        if sparse is None:
+            return Recipe.objects.annotate(
+                **self.get_recipe_flags()
+            ).prefetch_related(*self.get_relation_prefetches().values())
+
+        fields, expand = sparse
+        params = self.request.query_params
+        queryset = Recipe.objects.only(*fields & RECIPE_COLUMNS).annotate(**{
+            name: flag for name, flag in self.get_recipe_flags().items()
+            if name in fields or name in params
+        })
+        for name, prefetch in self.get_relation_prefetches().items():
+            if name not in fields:
+                continue
+            if name not in expand:
+                prefetch = COLLAPSED_PREFETCHES[name]
+            if prefetch is not None:
+                queryset = queryset.prefetch_related(prefetch)
+        return queryset
+
+
+class RecipeList(RecipeQuerySetMixin, generics.ListCreateAPIView):
+    """Лента рецептов.
+
+    С ?ids=1,2,3 отдает эти рецепты списком без пагинации в порядке
+    запроса, остальные фильтры и ?fields= продолжают работать.
+    """
+
     serializer_class = RecipeSerializer
     filterset_class = RecipeFilter
     permission_classes = (IsAuthenticatedOrReadOnly,)
 
-    def get_queryset(self):
-        if not self.request.user.is_authenticated:
-            return Recipe.objects.annotate(
-                is_favorited=Value(False),
-                is_in_shopping_cart=Value(False),
-            ).select_related(
-                'author'
-            ).prefetch_related(
-                'shopping_cart', 'ingredients', 'recipe',
-                'tags', 'favorite_recipe'
-            )
+    @property
+    def throttle_scope(self):
+        if self.request.method == 'POST':
+            return 'recipe_create'
+        return None
+
+    def list(self, request, *args, **kwargs):
+        compute = partial(self.get_list_data, request, *args, **kwargs)
+        key = None
+        if not request.user.is_authenticated:
+            key = feed_cache.key(request)
+        if key is None:
+            return Response(compute())
+        return Response(feed_cache.get_or_set(key, compute))
+
+    def get_requested_ids(self):
+        if hasattr(self, '_requested_ids'):
+            return self._requested_ids
+        value = self.request.query_params.get('ids')
+        self._requested_ids = None
+        if value is None:
+            return None
+        serializer = RecipeBatchSerializer(data={'recipes': value.split(',')})
+        if not serializer.is_valid():
+            raise ValidationError({'ids': serializer.errors['recipes']})
+        self._requested_ids = serializer.validated_data['recipes']
+        return self._requested_ids
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        ids = self.get_requested_ids()
+        if ids is None:
+            return queryset
+        return queryset.filter(id__in=ids).order_by(Case(
+            *(When(id=pk, then=position) for position, pk in enumerate(ids)),
+            output_field=IntegerField()
+        ))
+
+    def paginate_queryset(self, queryset):
+        if self.get_requested_ids() is not None:
+            return None
+        return super().paginate_queryset(queryset)
+
+    def use_fast_path(self, request):
+        return (
+            settings.FAST_RECIPE_LIST
+            and self.get_sparse_fieldset() is None
+            and request.accepted_renderer.format == 'json'
+            and 'indent' not in request.accepted_media_type
+        )
 
-        return Recipe.objects.annotate(
-            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
-                user=self.request.user, recipe=OuterRef('id')
-            )),
-            is_favorited=Exists(Favorite.objects.filter(
-                user=self.request.user, recipe=OuterRef('id')
-            ))
-        ).select_related(
-            'author'
-        ).prefetch_related(
-            'shopping_cart', 'ingredients', 'recipe',
-            'tags', 'favorite_recipe'
+    def get_list_data(self, request, *args, **kwargs):
+        if not self.use_fast_path(request):
+            return super().list(request, *args, **kwargs).data
+
+        rows = self.filter_queryset(
+            Recipe.objects.annotate(**self.get_recipe_flags())
+        ).values(*RECIPE_FIELDS)
+        page = self.paginate_queryset(rows)
+        serializer = FastRecipeListSerializer(
+            list(rows) if page is None else page, request,
+            self.get_subscribed_flag()
         )
+        if page is None:
+            return serializer.data
+        return self.get_paginated_response(serializer.data).data
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        recipe = serializer.save(author=self.request.user)
+        publish_recipe(recipe)
+        # Ответ строится по рецепту с подгруженными связями, иначе каждый
+        # ингредиент в нем читается отдельным запросом.
+        serializer.instance = self.get_queryset().get(pk=recipe.pk)
 
 
-class RecipeDetail(generics.RetrieveUpdateDestroyAPIView):
+class RecipeDetail(ConditionalRetrieveMixin, RecipeQuerySetMixin,
+                   generics.RetrieveUpdateDestroyAPIView):
     serializer_class = RecipeSerializer
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
 
-    def get_queryset(self):
-        if not self.request.user.is_authenticated:
-            return Recipe.objects.annotate(
-                is_favorited=Value(False),
-                is_in_shopping_cart=Value(False),
-            ).select_related(
-                'author'
-            ).prefetch_related(
-                'shopping_cart', 'ingredients', 'recipe',
-                'tags', 'favorite_recipe'
-            )
-
-        return Recipe.objects.annotate(
-            is_favorited=Exists(Favorite.objects.filter(
-                user=self.request.user, recipe=OuterRef('id')
-            )),
-            is_in_shopping_cart=Exists(Favorite.objects.filter(
-                user=self.request.user, recipe=OuterRef('id')
-            ))
-        ).select_related(
-            'author'
-        ).prefetch_related(
-            'shopping_cart', 'ingredients', 'recipe',
-            'tags', 'favorite_recipe'
+    def get_validators(self):
+        """Валидаторы по рецепту, автору, тегам и ингредиентам.
+
+        Тело ответа включает строки автора, тегов и ингредиентов, поэтому
+        их updated_at входят в ETag и Last-Modified, а число тегов и
+        ингредиентов учитывает удаление строк.
+        """
+        row = Recipe.objects.filter(pk=self.kwargs['pk']).annotate(
+            **self.get_recipe_flags(),
+            is_subscribed=self.get_subscribed_flag('author'),
+            tags_updated_at=Max('tags__updated_at'),
+            tags_count=Count('tags', distinct=True),
+            ingredients_updated_at=Max('ingredients__updated_at'),
+            ingredients_count=Count('ingredients', distinct=True)
+        ).values_list(
+            'updated_at', 'author__updated_at', 'tags_updated_at',
+            'ingredients_updated_at', 'tags_count', 'ingredients_count',
+            'is_favorited', 'is_in_shopping_cart', 'is_subscribed'
+        ).first()
+        if row is None:
+            raise Http404
+        if self.request.user.is_authenticated:
+            return make_etag(*row), None
+        return make_etag(*row), max(
+            value for value in row[:4] if value is not None
         )
 
+    def perform_update(self, serializer):
+        recipe = serializer.save()
+        serializer.instance = self.get_queryset().get(pk=recipe.pk)
+
+    def perform_destroy(self, instance):
+        soft_delete_recipes(Recipe.objects.filter(pk=instance.pk))
+
+
+class RecipeSimilarList(generics.ListAPIView):
+    """Похожие рецепты из заранее рассчитанной таблицы одним запросом."""
+
+    serializer_class = RecipeSubscriptionSerializer
+    permission_classes = (AllowAny,)
+    pagination_class = None
+    filter_backends = ()
+
+    def get_queryset(self):
+        return [
+            row.similar for row in RecipeSimilarity.objects.filter(
+                recipe_id=self.kwargs['pk'], similar__deleted_at__isnull=True
+            ).select_related('similar').order_by('-score', 'similar_id')
+        ]
+
 
 class FavoriteDetail(generics.RetrieveDestroyAPIView):
     serializer_class = RecipeSubscriptionSerializer
@@ -132,55 +394,414 @@ class FavoriteDetail(generics.RetrieveDestroyAPIView):
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        request.user.favorite_recipe.recipe.add(instance)
+        now = timezone.now()
+        if not insert_ignoring_conflicts(Favorite, (Favorite(
+            user=request.user, recipe=instance, created_at=now
+        ),)):
+            return Response(
+                {'errors': 'Рецепт уже в избранном'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        popularity.add((instance.id,), 'favorite', now)
+        record(Change.FAVORITE, (instance.id,), request.user.id)
         serializer = self.get_serializer(instance)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def perform_destroy(self, instance):
-        self.request.user.favorite_recipe.recipe.remove(instance)
+        relation = Favorite.objects.filter(
+            user=self.request.user, recipe=instance
+        ).values_list('id', 'created_at').first()
+        if relation is None:
+            return
+        deleted, _ = Favorite.objects.filter(id=relation[0]).delete()
+        if deleted:
+            popularity.remove(((instance.id, relation[1]),), 'favorite')
+            record(Change.FAVORITE, (instance.id,), self.request.user.id,
+                   deleted=True)
+
+
+class RecipeBatchView(generics.GenericAPIView):
+    """Добавление и удаление списка рецептов одним запросом.
+
+    Возвращает статус для каждого id: created, exists, deleted, absent или
+    not_found.
+    """
+
+    model = None
+    popularity_kind = None
+    serializer_class = RecipeBatchSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_ids(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['recipes']
+
+    def make_response(self, ids, statuses):
+        return Response({'results': [
+            {'id': pk, 'status': statuses.get(pk, 'not_found')}
+            for pk in ids
+        ]})
+
+    def post(self, request, *args, **kwargs):
+        ids = self.get_ids(request)
+        with transaction.atomic():
+            rows = Recipe.objects.filter(id__in=ids).annotate(
+                present=Exists(self.model.objects.filter(
+                    user=request.user, recipe=OuterRef('id')
+                ))
+            ).values_list('id', 'present')
+            statuses = {
+                pk: 'exists' if present else 'created'
+                for pk, present in rows
+            }
+            missing = [
+                pk for pk, value in statuses.items() if value == 'created'
+            ]
+            now = timezone.now()
+            self.model.objects.bulk_create(
+                (self.model(user=request.user, recipe_id=pk, created_at=now)
+                 for pk in missing),
+                ignore_conflicts=True
+            )
+            # Строку, которую параллельный запрос вставил раньше, вставка
+            # молча пропустила: созданы только строки с нашим created_at.
+            created = []
+            if missing:
+                created = list(self.model.objects.filter(
+                    user=request.user, recipe_id__in=missing, created_at=now
+                ).values_list('recipe_id', flat=True))
+            for pk in set(missing) - set(created):
+                statuses[pk] = 'exists'
+            popularity.add(created, self.popularity_kind, now)
+            record(USER_KINDS[self.model], created, request.user.id)
+        return self.make_response(ids, statuses)
+
+    def delete(self, request, *args, **kwargs):
+        ids = self.get_ids(request)
+        with transaction.atomic():
+            relations = self.model.objects.filter(
+                user=request.user, recipe_id__in=ids
+            )
+            events = list(relations.values_list('recipe_id', 'created_at'))
+            statuses = dict.fromkeys((pk for pk, _ in events), 'deleted')
+            relations.delete()
+            popularity.remove(events, self.popularity_kind)
+            record(USER_KINDS[self.model], statuses, request.user.id,
+                   deleted=True)
+            statuses.update(
+                (pk, 'absent')
+                for pk in Recipe.objects.filter(
+                    id__in=set(ids) - set(statuses)
+                ).values_list('id', flat=True)
+            )
+        return self.make_response(ids, statuses)
+
+
+class MealPlan(generics.GenericAPIView):
+    """Суммарные ингредиенты для рецептов с учетом числа порций.
+
+    Рецепты, которых нет в базе, ничего не добавляют в итог.
+    """
+
+    serializer_class = MealPlanSerializer
+    permission_classes = (AllowAny,)
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'ingredients': plan_ingredients(
+            serializer.validated_data['recipes']
+        )})
+
+
+class FavoriteBatch(RecipeBatchView):
+    model = Favorite
+    popularity_kind = 'favorite'
+
+
+class ShoppingCartBatch(RecipeBatchView):
+    model = ShoppingCart
+    popularity_kind = 'shopping_cart'
 
 
 class UserList(generics.ListCreateAPIView):
+    """Список пользователей с поиском ?search=.
+
+    С параметром ?cursor= (первая страница - пустое значение) отдает
+    курсорную пагинацию без COUNT и OFFSET по всей таблице.
+    """
+
     permission_classes = (AllowAny,)
+    filterset_class = UserFilter
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return UserCreateSerializer
-        return UserListSerializer
+        return UserSearchSerializer
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if 'cursor' in self.request.query_params:
+                self._paginator = UserCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_queryset(self):
+        users = User.objects.filter(deleted_at__isnull=True)
         if not self.request.user.is_authenticated:
-            return User.objects.annotate(is_subscribed=Value(False))
+            return users.annotate(is_subscribed=Value(False))
 
-        return User.objects.annotate(
+        return users.annotate(
             is_subscribed=Exists(self.request.user.follower.filter(
-                following=OuterRef('id')
+                author=OuterRef('id')
             ))
-        ).prefetch_related('follower', 'following')
+        )
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        counts = subscriber_counts.get_many([user.id for user in page])
+        for user in page:
+            user.subscribers_count = counts[user.id]
+        return page
 
     def perform_create(self, serializer):
         password = make_password(self.request.data['password'])
         serializer.save(password=password)
 
 
-class UserDetail(generics.RetrieveAPIView):
+class UserDetail(ConditionalRetrieveMixin, generics.RetrieveAPIView):
     serializer_class = UserListSerializer
     permission_classes = (AllowAny,)
 
     def get_queryset(self):
+        users = User.objects.filter(deleted_at__isnull=True)
         if not self.request.user.is_authenticated:
-            return User.objects.annotate(is_subscribed=Value(False))
+            return users.annotate(is_subscribed=Value(False))
 
-        return User.objects.annotate(
+        return users.annotate(
             is_subscribed=Exists(self.request.user.follower.filter(
-                following=OuterRef('id')
+                author=OuterRef('id')
             ))
-        ).prefetch_related('follower', 'following')
+        )
+
+    def get_validators(self):
+        row = self.get_queryset().filter(pk=self.kwargs['pk']).values_list(
+            'username', 'email', 'first_name', 'last_name', 'is_subscribed'
+        ).first()
+        if row is None:
+            raise Http404
+        return make_etag(*row), None
+
+
+class NotificationTicket(generics.GenericAPIView):
+    """Билет для /api/notifications/?ticket= вместо токена в адресе."""
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, *args, **kwargs):
+        return Response({
+            'ticket': make_ticket(request.user),
+            'expires_in': settings.NOTIFICATIONS['TICKET_MAX_AGE'],
+        })
+
+
+class JobDetail(generics.RetrieveAPIView):
+    serializer_class = JobSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user).defer('result')
+
+
+class JobResult(generics.GenericAPIView):
+    """Результат готовой задачи. Пока задача в работе - 202, при ошибке - 409.
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        job = self.get_object()
+        if job.status != Job.DONE:
+            return Response(
+                JobSerializer(job, context={'request': request}).data,
+                status=(status.HTTP_409_CONFLICT if job.status == Job.FAILED
+                        else status.HTTP_202_ACCEPTED)
+            )
+        response = HttpResponse(job.result, content_type=job.content_type)
+        if job.filename:
+            response['Content-Disposition'] = (
+                f'attachment; filename="{job.filename}"'
+            )
+        return response
+
+
+class Sync(RecipeQuerySetMixin, generics.GenericAPIView):
+    """Изменения с момента выдачи токена ?since=.
+
+    Без since возвращает только текущий токен: клиент загружает данные
+    обычными запросами и дальше синхронизируется по нему. Токен старше
+    SYNC['RETENTION'] отклоняется с 410, потому что надгробия удаленных
+    объектов к этому времени могли быть сжаты.
+
+    id записи выдается при вставке, а видна она становится при коммите,
+    поэтому запись N+1 может появиться раньше N. Записи моложе SYNC['LAG']
+    не отдаются, и токен не сдвигается дальше первой такой записи:
+    к этому времени все более ранние вставки уже закоммичены.
+    """
+
+    serializer_class = RecipeSerializer
+    permission_classes = (AllowAny,)
+    filter_backends = ()
+
+    def make_token(self, cursor):
+        return f'{cursor}.{int(time.time())}'
+
+    def parse_token(self, token):
+        try:
+            cursor, issued = map(int, token.split('.'))
+        except ValueError:
+            raise ValidationError({'since': 'Неверный токен'})
+        if issued < time.time() - settings.SYNC['RETENTION']:
+            return None
+        return cursor
+
+    def get_objects(self, kind, ids):
+        if kind == Change.RECIPE:
+            return RecipeSerializer(
+                self.get_queryset().filter(id__in=ids), many=True,
+                context=self.get_serializer_context()
+            ).data
+        if kind == Change.TAG:
+            return TagSerializer(
+                Tag.objects.filter(id__in=ids), many=True
+            ).data
+        if kind == Change.INGREDIENT:
+            return IngredientSerializer(
+                Ingredient.objects.filter(id__in=ids), many=True
+            ).data
+        if kind == Change.USER:
+            return UserListSerializer(User.objects.filter(
+                id__in=ids, deleted_at__isnull=True
+            ).annotate(
+                is_subscribed=self.get_subscribed_flag()
+            ), many=True).data
+        return None
+
+    def get_horizon(self):
+        return timezone.now() - timedelta(seconds=settings.SYNC['LAG'])
+
+    def get(self, request, *args, **kwargs):
+        if 'since' not in request.query_params:
+            cursor = Change.objects.aggregate(
+                last=Max('id'),
+                fresh=Min('id', filter=Q(created_at__gte=self.get_horizon()))
+            )
+            if cursor['fresh'] is not None:
+                cursor['last'] = cursor['fresh'] - 1
+            return Response({'token': self.make_token(cursor['last'] or 0)})
+        cursor = self.parse_token(request.query_params['since'])
+        if cursor is None:
+            return Response(
+                {'errors': 'Токен устарел, нужна полная загрузка'},
+                status=status.HTTP_410_GONE
+            )
+
+        visible = Q(user__isnull=True)
+        if request.user.is_authenticated:
+            visible |= Q(user=request.user)
+        limit = settings.SYNC['PAGE_SIZE']
+        rows = Change.objects.filter(visible, id__gt=cursor).values_list(
+            'id', 'kind', 'object_id', 'deleted', 'created_at'
+        )[:limit + 1]
+        has_more = len(rows) > limit
+        horizon = self.get_horizon()
+        changes = []
+        for *change, created_at in rows[:limit]:
+            if created_at >= horizon:
+                has_more = False
+                break
+            changes.append(change)
+
+        latest = {}
+        for _, kind, object_id, deleted in changes:
+            latest[kind, object_id] = deleted
+        data = {
+            kind: {'updated': [], 'deleted': []}
+            for kind, _ in Change.KIND_CHOICES
+        }
+        for (kind, object_id), deleted in latest.items():
+            data[kind]['deleted' if deleted else 'updated'].append(object_id)
+        for kind, group in data.items():
+            objects = self.get_objects(kind, group['updated'])
+            if objects is None:
+                continue
+            # Объект мог быть удален позже последней записи на странице.
+            found = {item['id'] for item in objects}
+            group['deleted'] += [
+                pk for pk in group['updated'] if pk not in found
+            ]
+            group['updated'] = objects
+
+        return Response({
+            'token': self.make_token(changes[-1][0] if changes else cursor),
+            'has_more': has_more,
+            **data,
+        })
+
+
+class ProfilerMixin:
+    permission_classes = (IsAdminUser,)
+
+    def initial(self, request, *args, **kwargs):
+        if not settings.PROFILER['ENABLED']:
+            raise NotFound
+        super().initial(request, *args, **kwargs)
+
+
+class ProfilerSession(ProfilerMixin, generics.GenericAPIView):
+    """Запускает выборку стеков во всех процессах на seconds секунд."""
+
+    serializer_class = ProfilerSessionSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session = start_session(serializer.validated_data['seconds'])
+        return Response(
+            {'id': session['id'], 'until': session['until']},
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': reverse('profile', args=(session['id'],))}
+        )
+
+
+class ProfileDetail(ProfilerMixin, generics.GenericAPIView):
+    """Профиль по id: ?output=speedscope (по умолчанию) или collapsed.
+
+    collapsed - формат flamegraph.pl и speedscope, по строке на стек.
+    """
+
+    def get(self, request, profile_id, *args, **kwargs):
+        counts = read_profile(profile_id)
+        if counts is None:
+            raise NotFound
+        if request.query_params.get('output') == 'collapsed':
+            return HttpResponse(
+                to_collapsed(counts), content_type='text/plain; charset=utf-8'
+            )
+        return Response(to_speedscope(counts, str(profile_id)))
 
 
 class AuthToken(ObtainAuthToken):
     serializer_class = TokenSerializer
     permission_classes = (AllowAny,)
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = 'login'
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -195,13 +816,17 @@ class SubscriptionList(generics.ListAPIView):
     serializer_class = SubscriptionSerializer
 
     def get_queryset(self):
-        return self.request.user.follower.select_related(
-            'following'
+        return self.request.user.follower.filter(
+            author__deleted_at__isnull=True
+        ).select_related(
+            'author'
         ).prefetch_related(
-            'following__recipe'
+            'author__recipe'
         ).annotate(
             is_subscribed=Value(True),
-            recipes_count=Count('following__recipe')
+            recipes_count=Count('author__recipe', filter=Q(
+                author__recipe__deleted_at__isnull=True
+            ))
         )
 
 
@@ -209,42 +834,55 @@ class SubscriptionDetail(generics.RetrieveDestroyAPIView):
     serializer_class = SubscriptionSerializer
 
     def get_queryset(self):
-        return self.request.user.follower.select_related(
-            'following'
+        return self.request.user.follower.filter(
+            author__deleted_at__isnull=True
+        ).select_related(
+            'author'
         ).prefetch_related(
-            'following__recipe'
+            'author__recipe'
         ).annotate(
             is_subscribed=Value(True),
-            recipes_count=Count('following__recipe')
+            recipes_count=Count('author__recipe', filter=Q(
+                author__recipe__deleted_at__isnull=True
+            ))
         )
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
 
-        if request.user.follower.filter(following=instance).exists():
+        if request.user.id == instance.id:
             return Response(
-                {'errors': 'Подписка уже оформлена'},
+                {'errors': 'Нельзя подписаться на себя'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        if request.user.id == instance.id:
+        if not insert_ignoring_conflicts(
+            Subscription, (Subscription(user=request.user, author=instance),)
+        ):
             return Response(
-                {'errors': 'Нельзя подписаться на себя'},
+                {'errors': 'Подписка уже оформлена'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        subscription = request.user.follower.create(following=instance)
-        serializer = self.get_serializer(subscription)
+        subscriber_counts.invalidate(instance.id)
+        publish_follow(request.user.id, instance.id, True)
+        serializer = self.get_serializer(
+            self.get_queryset().get(author=instance)
+        )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def get_object(self):
         user_id = self.kwargs['user_id']
-        user = get_object_or_404(id=user_id)
+        user = get_object_or_404(
+            User.objects.filter(deleted_at__isnull=True), id=user_id
+        )
         self.check_object_permissions(self.request, user)
         return user
 
     def perform_destroy(self, instance):
-        self.request.user.follower.filter(following=instance).delete()
+        self.request.user.follower.filter(author=instance).delete()
+        subscriber_counts.invalidate(instance.id)
+        publish_follow(self.request.user.id, instance.id, False)
 
 
 class ShoppingCartDetail(generics.RetrieveDestroyAPIView):
@@ -258,12 +896,30 @@ class ShoppingCartDetail(generics.RetrieveDestroyAPIView):
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        request.user.shopping_cart.recipe.add(instance)
+        now = timezone.now()
+        if not insert_ignoring_conflicts(ShoppingCart, (ShoppingCart(
+            user=request.user, recipe=instance, created_at=now
+        ),)):
+            return Response(
+                {'errors': 'Рецепт уже в списке покупок'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        popularity.add((instance.id,), 'shopping_cart', now)
+        record(Change.SHOPPING_CART, (instance.id,), request.user.id)
         serializer = self.get_serializer(instance)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def perform_destroy(self, instance):
-        self.request.user.shopping_cart.recipe.remove(instance)
+        relation = ShoppingCart.objects.filter(
+            user=self.request.user, recipe=instance
+        ).values_list('id', 'created_at').first()
+        if relation is None:
+            return
+        deleted, _ = ShoppingCart.objects.filter(id=relation[0]).delete()
+        if deleted:
+            popularity.remove(((instance.id, relation[1]),), 'shopping_cart')
+            record(Change.SHOPPING_CART, (instance.id,),
+                   self.request.user.id, deleted=True)
 
 
 @api_view(['POST'])
@@ -285,38 +941,18 @@ def logout(request):
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@throttle_scope('shopping_cart_pdf')
 @api_view(['POST'])
 def download_shopping_cart(request):
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="yourcart.pdf"'
-    p = canvas.Canvas(response)
-    x = 50
-    y = 800
-    indent = 15
-    shopping_cart = (
-        request.user.shopping_cart.recipe.values(
-            'ingredients__name', 'ingredients__measurement_unit'
-        ).annotate(total=Sum('recipe__amount')).order_by('total')
-    )
-    pdfmetrics.registerFont(TTFont('Vera', 'Vera.ttf', 'UTF-8'))
-    if not shopping_cart:
-        p.setFront('Vera', 20)
-        p.drawString(x, y, 'Список пуст')
-        p.save()
-        return response
-
-    p.setFont('Vera', 20)
-    p.drawString(x, y, 'Список покупок :')
-    p.setFont('Vera', 16)
-    for i, recipe in enumerate(shopping_cart, start=1):
-        p.drawString(
-            x, y - indent, f'{i}. {recipe["ingredients__name"]} -'
-            f'{recipe["amount"]} {recipe["ingredients__measurement_unit"]}.'
+    if request.query_params.get('async'):
+        job = enqueue('shopping_cart_pdf', user=request.user)
+        return Response(
+            JobSerializer(job, context={'request': request}).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': reverse('job_detail', args=(job.id,))}
         )
-        y -= 15
-        if y <= 50:
-            p.showPage()
-            p.setFont('Vera', 16)
-            y = 800
-    p.save()
+    response = HttpResponse(
+        render_shopping_cart(request.user), content_type='application/pdf'
+    )
+    response['Content-Disposition'] = 'attachment; filename="yourcart.pdf"'
     return response
@@ -0,0 +1,77 @@
+import inspect
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.test import RequestFactory
+from django.urls import get_resolver, reverse
+from rest_framework.serializers import BaseSerializer
+
+from . import serializers
+from .exports import load_reportlab
+
+logger = logging.getLogger(__name__)
+
+
+def load_urls():
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver.reverse_dict
+
+
+def load_model_meta():
+    for model in apps.get_models():
+        model._meta.get_fields(include_hidden=True)
+
+
+def load_serializers():
+    for serializer in vars(serializers).values():
+        if (inspect.isclass(serializer)
+                and issubclass(serializer, BaseSerializer)
+                and serializer.__module__ == serializers.__name__):
+            serializer().fields
+
+
+def load_catalog():
+    from .views import IngredientList
+
+    host = next(
+        (host for host in settings.ALLOWED_HOSTS if '*' not in host),
+        'localhost'
+    )
+    request = RequestFactory().get(
+        reverse('ingredient_list'), HTTP_HOST=host
+    )
+    IngredientList.as_view()(request)
+
+
+STEPS = (
+    ('urls', load_urls),
+    ('model_meta', load_model_meta),
+    ('serializers', load_serializers),
+    ('reportlab', load_reportlab),
+    ('catalog', load_catalog),
+)
+
+
+def warmup():
+    """Загружает то, что иначе достраивается на первых запросах.
+
+    Вызывается из foodgram/wsgi.py: с gunicorn --preload это происходит в
+    мастере до fork, и рабочие процессы делят загруженное через
+    copy-on-write (кеш каталога тоже, если кеш в памяти процесса).
+    Возвращает время каждого шага в миллисекундах.
+    """
+    timings = {}
+    for name, step in STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+        except DatabaseError:
+            logger.warning('Прогрев %s пропущен: база недоступна', name)
+        timings[name] = (time.perf_counter() - start) * 1000
+    # Соединения, открытые до fork, нельзя делить между процессами.
+    connections.close_all()
+    return timings
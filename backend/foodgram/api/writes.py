@@ -0,0 +1,23 @@
+from django.db import connections, router
+
+
+def insert_ignoring_conflicts(model, objs):
+    """bulk_create(ignore_conflicts=True) с числом вставленных строк.
+
+    Django не сообщает, какие объекты пропущены из-за конфликта, поэтому
+    счетчик берется у курсора: INSERT ... ON CONFLICT DO NOTHING (INSERT OR
+    IGNORE в SQLite) учитывает только новые строки.
+    """
+    inserted = 0
+
+    def count_rows(execute, sql, params, many, context):
+        nonlocal inserted
+        result = execute(sql, params, many, context)
+        if sql.lstrip().upper().startswith('INSERT'):
+            inserted += max(context['cursor'].rowcount, 0)
+        return result
+
+    connection = connections[router.db_for_write(model)]
+    with connection.execute_wrapper(count_rows):
+        model.objects.bulk_create(objs, ignore_conflicts=True)
+    return inserted
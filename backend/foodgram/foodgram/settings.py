@@ -31,14 +31,21 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipe.apps.RecipeConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
+    'sync.apps.SyncConfig',
+    'notifications.apps.NotificationsConfig',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
+    'api.middleware.QuerySamplerMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -120,5 +127,143 @@ AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.CustomPagination',
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_FILTER_BACKENDS': (
+        'django_filters.rest_framework.DjangoFilterBackend',
+    ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.UserBucketThrottle',
+        'api.throttling.ScopedBucketThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': '600/min',
+        'user': '1200/min',
+        # Хеширование пароля.
+        'login': '20/min',
+        'shopping_cart_pdf': '30/min',
+        # Декодирование и сохранение картинки.
+        'recipe_create': '60/hour',
+    },
+    # Перед бэкендом стоит один nginx, который дописывает адрес клиента
+    # в конец X-Forwarded-For; адреса левее задает сам клиент.
+    'NUM_PROXIES': 1,
     'PAGE_SIZE': 6
 }
+
+# 'local' - корзины в памяти процесса, 'cache' - в кеше CACHE_ALIAS,
+# общем для всех процессов (нужен атомарный incr: Redis, Memcached).
+THROTTLE = {
+    'STORE': 'local',
+    'CACHE_ALIAS': 'default',
+    'MAX_KEYS': 100000,
+}
+
+ADMIN_COUNT_LIMIT = 10000
+
+PUBLIC_CACHE_MAX_AGE = 60
+
+FAST_RECIPE_LIST = True
+
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+RESPONSE_COMPRESSION = {
+    'ENCODINGS': ('br', 'gzip'),
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+}
+
+POPULARITY = {
+    'HALF_LIFE_DAYS': 7,
+    'WEIGHTS': {'favorite': 1.0, 'shopping_cart': 0.5},
+    'MIN_SCORE': 0.01,
+}
+
+RECOMMENDATIONS = {
+    'TOP_K': 10,
+    'MIN_COMMON': 1,
+    'MAX_USER_ITEMS': 500,
+}
+
+SYNC = {
+    'PAGE_SIZE': 500,
+    'RETENTION': 30 * 24 * 60 * 60,
+    # Секунды, за которые вставка записи журнала гарантированно коммитится.
+    'LAG': 5,
+}
+
+NOTIFICATIONS = {
+    # Unix-сокет run_notification_broker, когда процессов ASGI несколько.
+    'BROKER': None,
+    'BROKER_TIMEOUT': 0.5,
+    'BROKER_BUFFER': 1024 * 1024,
+    'QUEUE_SIZE': 100,
+    'HEARTBEAT': 15,
+    # Срок билета ?ticket= для EventSource.
+    'TICKET_MAX_AGE': 60,
+}
+
+# Прогрев при загрузке foodgram.wsgi, см. api/warmup.py.
+WARMUP_ON_WSGI_LOAD = True
+
+PURGE = {
+    'BATCH_SIZE': 500,
+    # Картинка без рецепта моложе этого срока может принадлежать
+    # рецепту из незавершенной транзакции.
+    'ORPHAN_GRACE': 24 * 60 * 60,
+}
+
+JOBS = {
+    'POLL_INTERVAL': 1,
+    'TIMEOUT': 10 * 60,
+    'RESULT_TTL': 24 * 60 * 60,
+    # Как часто исполнитель возвращает пропавшие задачи и чистит старые.
+    'MAINTENANCE_INTERVAL': 60,
+    'MAX_ATTEMPTS': 3,
+}
+
+SUBSCRIBER_COUNT_TIMEOUT = 60 * 60
+# None - только при общем кеше default, как FEED_CACHE['ENABLED'].
+SUBSCRIBER_COUNT_CACHE = None
+
+# Кеш общий для всех процессов. LocMemCache подходит только для одного
+# процесса: генерации FeedCache и счетчики подписчиков сбрасываются лишь в
+# том процессе, который обработал запись. Для нескольких процессов укажите
+# django.core.cache.backends.redis.RedisCache или PyMemcacheCache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Адреса сборщика метрик, которым /metrics доступен без входа staff.
+# Не добавляйте адрес обратного прокси: через него придут все клиенты.
+METRICS_ALLOWED_IPS = ()
+
+FEED_CACHE = {
+    # None - только при общем кеше default, True/False - принудительно.
+    'ENABLED': None,
+    'TIMEOUT': 300,
+    'LOCK_TIMEOUT': 5,
+}
+
+PROFILER = {
+    'ENABLED': False,
+    'HEADER': 'X-Profile',
+    'INTERVAL': 0.005,
+    'MAX_SECONDS': 60,
+    'POLL_INTERVAL': 1,
+    'DIR': BASE_DIR / 'logs' / 'profiles',
+}
+
+QUERY_SAMPLER = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.01,
+    'SLOW_MS': 100,
+    'LOG_FILE': BASE_DIR / 'logs' / 'queries.ndjson',
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'BACKUP_COUNT': 5,
+}
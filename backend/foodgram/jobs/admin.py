@@ -0,0 +1,16 @@
+from django.contrib import admin
+
+from api.admin import LargeTableAdmin
+
+from .models import Job
+
+
+@admin.register(Job)
+class AdminJob(LargeTableAdmin):
+    list_display = ('id', 'kind', 'user', 'status', 'created_at',
+                    'finished_at')
+    list_select_related = ('user',)
+    list_filter = ('status',)
+    search_fields = ('=kind',)
+    raw_id_fields = ('user',)
+    exclude = ('result',)
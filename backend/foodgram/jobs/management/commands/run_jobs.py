@@ -0,0 +1,58 @@
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management import BaseCommand
+from django.db import connection, connections
+
+from jobs.queue import work
+
+
+def work_in_thread(once, poll_interval):
+    try:
+        return work(once, poll_interval)
+    finally:
+        # У каждого потока свое соединение с базой.
+        connections.close_all()
+
+
+def run_worker(threads, once, poll_interval):
+    if threads == 1:
+        return work(once, poll_interval)
+    with ThreadPoolExecutor(threads) as pool:
+        futures = [
+            pool.submit(work_in_thread, once, poll_interval)
+            for _ in range(threads)
+        ]
+        return sum(future.result() for future in futures)
+
+
+class Command(BaseCommand):
+    help = 'Исполнитель фоновых задач из очереди в базе данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=1,
+                            help='Потоков в каждом процессе')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Пауза при пустой очереди, секунды')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить очередь и завершиться')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        if connection.vendor == 'sqlite' and processes > 1:
+            self.stderr.write('SQLite не поддерживает параллельную запись, '
+                              'исполнитель работает в одном процессе')
+            processes = 1
+
+        args = (options['threads'], options['once'], options['poll_interval'])
+        if processes > 1:
+            # Дочерние процессы должны открыть собственные соединения.
+            connections.close_all()
+            with multiprocessing.Pool(processes) as pool:
+                processed = sum(pool.starmap(run_worker, [args] * processes))
+        else:
+            processed = run_worker(*args)
+        self.stdout.write(
+            self.style.SUCCESS(f'Выполнено задач: {processed}')
+        )
@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+User = get_user_model()
+
+
+class Job(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    kind = models.CharField('Тип', max_length=100)
+    payload = models.JSONField('Параметры', default=dict, blank=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='jobs',
+        verbose_name='Пользователь'
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    result = models.BinaryField('Результат', null=True, editable=False)
+    content_type = models.CharField(
+        'Тип результата', max_length=100, blank=True
+    )
+    filename = models.CharField('Имя файла', max_length=255, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+    started_at = models.DateTimeField('Запущена', null=True, blank=True)
+    finished_at = models.DateTimeField('Завершена', null=True, blank=True)
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = (
+            models.Index(fields=('status', 'id'), name='job_status_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.kind} #{self.id} ({self.status})'
@@ -0,0 +1,137 @@
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger('foodgram.jobs')
+
+TASKS = {}
+
+
+def task(name):
+    """Регистрирует обработчик задачи.
+
+    Обработчик получает Job и возвращает dict или list (результат в JSON)
+    либо кортеж (bytes, content_type, filename).
+    """
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload=None, user=None):
+    if kind not in TASKS:
+        raise ValueError(f'Неизвестная задача: {kind}')
+    return Job.objects.create(kind=kind, payload=payload or {}, user=user)
+
+
+def claim():
+    """Забирает самую старую задачу из очереди.
+
+    Захват - условный UPDATE по статусу, поэтому одну задачу не возьмут два
+    исполнителя на любой СУБД, включая SQLite.
+    """
+    pending = Job.objects.filter(status=Job.PENDING).values_list(
+        'id', flat=True
+    )
+    for pk in pending[:10]:
+        claimed = Job.objects.filter(pk=pk, status=Job.PENDING).update(
+            status=Job.RUNNING, started_at=timezone.now(),
+            attempts=F('attempts') + 1
+        )
+        if claimed:
+            return Job.objects.select_related('user').get(pk=pk)
+    return None
+
+
+def run(job):
+    try:
+        result = TASKS[job.kind](job)
+    except Exception as error:
+        logger.exception('Задача %s завершилась с ошибкой', job)
+        job.status = Job.FAILED
+        job.error = f'{type(error).__name__}: {error}'
+    else:
+        if isinstance(result, (dict, list)):
+            result = (json.dumps(result).encode(), 'application/json', '')
+        job.result, job.content_type, job.filename = result
+        job.status = Job.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=(
+        'status', 'result', 'content_type', 'filename', 'error',
+        'finished_at'
+    ))
+    return job
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи, чей исполнитель пропал.
+
+    Задача, которая пропадала вместе с исполнителем MAX_ATTEMPTS раз,
+    скорее всего сама его и роняет, поэтому она завершается ошибкой.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        started_at__lt=now - timedelta(seconds=settings.JOBS['TIMEOUT'])
+    )
+    failed = stale.filter(
+        attempts__gte=settings.JOBS['MAX_ATTEMPTS']
+    ).update(
+        status=Job.FAILED, finished_at=now,
+        error='Исполнитель пропал, попытки исчерпаны'
+    )
+    if failed:
+        logger.warning('Задач с исчерпанными попытками: %s', failed)
+    return stale.update(status=Job.PENDING, started_at=None)
+
+
+def purge():
+    deadline = timezone.now() - timedelta(
+        seconds=settings.JOBS['RESULT_TTL']
+    )
+    deleted, _ = Job.objects.filter(
+        Q(status=Job.DONE) | Q(status=Job.FAILED), finished_at__lt=deadline
+    ).delete()
+    return deleted
+
+
+def maintain():
+    """Обслуживание очереди, которое исполнители выполняют периодически."""
+    requeued = requeue_stale()
+    purged = purge()
+    if requeued or purged:
+        logger.info('Возвращено в очередь: %s, удалено старых задач: %s',
+                    requeued, purged)
+
+
+def work(once=False, poll_interval=None):
+    """Цикл исполнителя. С once=True выходит, когда очередь пуста.
+
+    Раз в JOBS['MAINTENANCE_INTERVAL'] секунд вызывает maintain(), чтобы
+    долго работающий исполнитель подбирал задачи упавших соседей.
+    """
+    poll_interval = poll_interval or settings.JOBS['POLL_INTERVAL']
+    processed = 0
+    maintenance = float('-inf')
+    while True:
+        if time.monotonic() >= maintenance:
+            maintain()
+            maintenance = (
+                time.monotonic() + settings.JOBS['MAINTENANCE_INTERVAL']
+            )
+        job = claim()
+        if job is not None:
+            run(job)
+            processed += 1
+            continue
+        if once:
+            return processed
+        time.sleep(poll_interval)
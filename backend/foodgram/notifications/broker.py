@@ -0,0 +1,50 @@
+import asyncio
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Broker:
+    """Рассылает строки от процессов-публикаторов всем подписанным.
+
+    Процесс, который не успевает читать, отключается, как только его
+    буфер превышает NOTIFICATIONS['BROKER_BUFFER']: брокер и остальные
+    процессы его не ждут, а он после переподключения отправляет своим
+    клиентам overflow.
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+
+    async def handle(self, reader, writer):
+        role = await reader.readline()
+        try:
+            if role == b'SUB\n':
+                self.subscribers.add(writer)
+                await reader.read()
+            else:
+                while line := await reader.readline():
+                    self.broadcast(line)
+        except OSError:
+            pass
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+
+    def broadcast(self, line):
+        limit = settings.NOTIFICATIONS['BROKER_BUFFER']
+        for writer in tuple(self.subscribers):
+            if writer.transport.get_write_buffer_size() > limit:
+                logger.warning('Подписчик брокера не успевает читать, '
+                               'соединение закрыто')
+                self.subscribers.discard(writer)
+                writer.close()
+                continue
+            writer.write(line)
+
+    async def serve(self, path):
+        server = await asyncio.start_unix_server(self.handle, path)
+        async with server:
+            await server.serve_forever()
@@ -0,0 +1,25 @@
+from django.db import transaction
+
+from .hub import hub
+
+
+def publish_recipe(recipe):
+    """Новый рецепт для подписчиков автора после коммита."""
+    event = {
+        'type': 'recipe',
+        'id': recipe.id,
+        'name': recipe.name,
+        'author': recipe.author_id,
+    }
+    transaction.on_commit(
+        lambda: hub.publish(f'author:{recipe.author_id}', event)
+    )
+
+
+def publish_follow(user_id, author_id, following):
+    """Служебное событие: открытые потоки пользователя меняют темы."""
+    event = {
+        'type': 'follow' if following else 'unfollow',
+        'author': author_id,
+    }
+    transaction.on_commit(lambda: hub.publish(f'user:{user_id}', event))
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import socket
+import threading
+from collections import defaultdict
+
+import orjson
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW = {'type': 'overflow'}
+
+
+class Listener:
+    """Ограниченная очередь событий одного подключения.
+
+    Очередь принадлежит циклу событий подключения, публикация из любого
+    потока только планирует вставку и не ждет читателя. При переполнении
+    очередь очищается и получает одно событие overflow: клиент догоняет
+    пропущенное через /api/sync/.
+    """
+
+    def __init__(self, hub, topics, loop):
+        self.hub = hub
+        self.topics = set(topics)
+        self.loop = loop
+        self.queue = asyncio.Queue(settings.NOTIFICATIONS['QUEUE_SIZE'])
+
+    def offer(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self.put, event)
+        except RuntimeError:
+            # Цикл событий уже закрыт.
+            self.hub.unsubscribe(self)
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class BrokerPublisher:
+    """Постоянное соединение процесса с брокером для публикации."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.sock = None
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(settings.NOTIFICATIONS['BROKER_TIMEOUT'])
+        sock.connect(self.path)
+        sock.sendall(b'PUB\n')
+        return sock
+
+    def send(self, line):
+        with self.lock:
+            # Вторая попытка нужна после перезапуска брокера.
+            for attempt in range(2):
+                try:
+                    if self.sock is None:
+                        self.sock = self.connect()
+                    self.sock.sendall(line)
+                    return
+                except OSError:
+                    if self.sock is not None:
+                        self.sock.close()
+                        self.sock = None
+                    if attempt:
+                        raise
+
+
+class Hub:
+    """Pub/sub внутри процесса, темы вида author:<id> и user:<id>.
+
+    Если задан NOTIFICATIONS['BROKER'], публикация уходит в брокер
+    (manage.py run_notification_broker), а каждый процесс получает
+    события всех процессов через одно соединение с ним.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.topics = defaultdict(set)
+        self.publisher = None
+        self.relay = None
+
+    def subscribe(self, topics):
+        listener = Listener(self, topics, asyncio.get_running_loop())
+        with self.lock:
+            for topic in listener.topics:
+                self.topics[topic].add(listener)
+        if settings.NOTIFICATIONS['BROKER']:
+            self.start_relay(listener.loop)
+        return listener
+
+    def update(self, listener, add=(), remove=()):
+        with self.lock:
+            for topic in add:
+                listener.topics.add(topic)
+                self.topics[topic].add(listener)
+            for topic in remove:
+                listener.topics.discard(topic)
+                self.discard(topic, listener)
+
+    def unsubscribe(self, listener):
+        with self.lock:
+            for topic in listener.topics:
+                self.discard(topic, listener)
+
+    def discard(self, topic, listener):
+        listeners = self.topics.get(topic)
+        if listeners is not None:
+            listeners.discard(listener)
+            if not listeners:
+                del self.topics[topic]
+
+    def listeners(self, topic=None):
+        with self.lock:
+            if topic is not None:
+                return tuple(self.topics.get(topic, ()))
+            return tuple(set().union(*self.topics.values()))
+
+    def dispatch(self, topic, event):
+        for listener in self.listeners(topic):
+            listener.offer(event)
+
+    def publish(self, topic, event):
+        path = settings.NOTIFICATIONS['BROKER']
+        if not path:
+            return self.dispatch(topic, event)
+        if self.publisher is None or self.publisher.path != path:
+            self.publisher = BrokerPublisher(path)
+        line = orjson.dumps({'topic': topic, 'event': event}) + b'\n'
+        try:
+            self.publisher.send(line)
+        except OSError:
+            logger.warning('Брокер уведомлений недоступен, событие '
+                           'доставлено только в текущий процесс')
+            self.dispatch(topic, event)
+
+    def start_relay(self, loop):
+        if self.relay is None or self.relay.done():
+            self.relay = loop.create_task(self.listen_broker())
+
+    async def listen_broker(self):
+        path = settings.NOTIFICATIONS['BROKER']
+        connected_before = False
+        while self.listeners():
+            try:
+                reader, writer = await asyncio.open_unix_connection(path)
+            except OSError:
+                await asyncio.sleep(1)
+                continue
+            if connected_before:
+                # Пока соединения не было, события могли потеряться.
+                for listener in self.listeners():
+                    listener.put(OVERFLOW)
+            connected_before = True
+            writer.write(b'SUB\n')
+            try:
+                while line := await reader.readline():
+                    message = orjson.loads(line)
+                    self.dispatch(message['topic'], message['event'])
+            except (OSError, ValueError):
+                logger.exception('Ошибка чтения из брокера уведомлений')
+            finally:
+                writer.close()
+
+
+hub = Hub()
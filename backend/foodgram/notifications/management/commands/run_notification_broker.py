@@ -0,0 +1,30 @@
+import asyncio
+import os
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from notifications.broker import Broker
+
+
+class Command(BaseCommand):
+    help = 'Брокер уведомлений для нескольких процессов ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None,
+                            help="Сокет, по умолчанию NOTIFICATIONS['BROKER']")
+
+    def handle(self, *args, **options):
+        path = options['path'] or settings.NOTIFICATIONS['BROKER']
+        if not path:
+            raise CommandError("Задайте NOTIFICATIONS['BROKER'] или --path")
+        if os.path.exists(path):
+            os.unlink(path)
+        self.stdout.write(f'Брокер уведомлений слушает {path}')
+        try:
+            asyncio.run(Broker().serve(path))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
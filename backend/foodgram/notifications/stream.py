@@ -0,0 +1,162 @@
+import asyncio
+from urllib.parse import parse_qs
+
+import orjson
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import close_old_connections
+
+from .hub import hub
+
+User = get_user_model()
+
+TICKET_SALT = 'notifications.stream'
+
+HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no'),
+]
+
+
+def make_ticket(user):
+    """Короткоживущий подписанный билет на поток для EventSource."""
+    return signing.dumps(user.id, salt=TICKET_SALT)
+
+
+def get_credentials(scope):
+    """Токен из Authorization или билет из ?ticket=.
+
+    EventSource в браузере не умеет передавать заголовки, но сам токен в
+    адресе попал бы в журналы доступа. Поэтому в адресе принимается
+    только билет, который живет NOTIFICATIONS['TICKET_MAX_AGE'] секунд.
+    """
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            keyword, _, key = value.decode('latin-1').partition(' ')
+            if keyword == 'Token':
+                return {'token': key.strip()}
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    if 'ticket' in query:
+        return {'ticket': query['ticket'][0]}
+    return None
+
+
+def get_user(token=None, ticket=None):
+    users = User.objects.filter(is_active=True, deleted_at__isnull=True)
+    if token is not None:
+        return users.filter(auth_token__key=token).first()
+    try:
+        user_id = signing.loads(
+            ticket, salt=TICKET_SALT,
+            max_age=settings.NOTIFICATIONS['TICKET_MAX_AGE']
+        )
+    except signing.BadSignature:
+        return None
+    return users.filter(pk=user_id).first()
+
+
+@sync_to_async
+def get_followed(credentials):
+    close_old_connections()
+    try:
+        user = get_user(**credentials)
+        if user is None:
+            return None, ()
+        return user.id, tuple(
+            user.follower.values_list('author_id', flat=True)
+        )
+    finally:
+        close_old_connections()
+
+
+def format_event(event):
+    return b'event: %s\ndata: %s\n\n' % (
+        event['type'].encode(), orjson.dumps(event)
+    )
+
+
+class EventStream:
+    """Поток новых рецептов авторов из подписок (Server-Sent Events).
+
+    Обслуживает GET /api/notifications/ в обход Django, остальные запросы
+    передает приложению. Авторизация токеном из заголовка Authorization
+    или билетом из POST /api/notifications/ticket/ в параметре ?ticket=.
+    """
+
+    path = '/api/notifications/'
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != self.path:
+            return await self.application(scope, receive, send)
+        if scope['method'] != 'GET':
+            return await self.reply(send, 405, {'detail': 'Метод не разрешен'})
+
+        credentials = get_credentials(scope)
+        user_id, authors = (
+            await get_followed(credentials) if credentials else (None, ())
+        )
+        if user_id is None:
+            return await self.reply(
+                send, 401, {'detail': 'Учетные данные не были предоставлены'}
+            )
+
+        await send({
+            'type': 'http.response.start', 'status': 200, 'headers': HEADERS
+        })
+        listener = hub.subscribe(
+            [f'user:{user_id}', *(f'author:{pk}' for pk in authors)]
+        )
+        disconnected = asyncio.ensure_future(self.wait_disconnect(receive))
+        try:
+            await self.body(send, b': connected\n\n')
+            await self.relay(listener, disconnected, send)
+        finally:
+            hub.unsubscribe(listener)
+            disconnected.cancel()
+
+    async def relay(self, listener, disconnected, send):
+        heartbeat = settings.NOTIFICATIONS['HEARTBEAT']
+        while True:
+            event = asyncio.ensure_future(listener.get())
+            done, _ = await asyncio.wait(
+                (event, disconnected), timeout=heartbeat,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                event.cancel()
+                return
+            if event not in done:
+                event.cancel()
+                await self.body(send, b': ping\n\n')
+                continue
+            event = event.result()
+            if event['type'] in ('follow', 'unfollow'):
+                topic = f'author:{event["author"]}'
+                if event['type'] == 'follow':
+                    hub.update(listener, add=(topic,))
+                else:
+                    hub.update(listener, remove=(topic,))
+                continue
+            await self.body(send, format_event(event))
+
+    async def wait_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def body(self, send, chunk):
+        await send({
+            'type': 'http.response.body', 'body': chunk, 'more_body': True
+        })
+
+    async def reply(self, send, status, data):
+        await send({
+            'type': 'http.response.start', 'status': status,
+            'headers': [(b'content-type', b'application/json')],
+        })
+        await send({'type': 'http.response.body', 'body': orjson.dumps(data)})
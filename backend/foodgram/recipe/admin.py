@@ -1,30 +1,46 @@
 from django.contrib import admin
 
+from api.admin import LargeTableAdmin, SoftDeleteAdmin
+from api.deletion import soft_delete_recipes
+
 from .models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
 
 
 @admin.register(Tag)
 class AdminTag(admin.ModelAdmin):
     list_display = ('id', 'name', 'color')
+    search_fields = ('name', 'slug')
 
 
 @admin.register(Ingredient)
-class AdminIngredient(admin.ModelAdmin):
+class AdminIngredient(LargeTableAdmin):
     list_display = ('name', 'measurement_unit')
-    list_filter = ('name',)
+    search_fields = ('^name',)
 
 
 @admin.register(Recipe)
-class AdminRecipe(admin.ModelAdmin):
+class AdminRecipe(SoftDeleteAdmin):
     list_display = ('author', 'name', 'cooking_time')
-    list_filter = ('author', 'name')
+    list_select_related = ('author',)
+    list_filter = ('tags',)
+    search_fields = ('name', 'author__username', 'author__email')
+    autocomplete_fields = ('author', 'tags')
+
+    def soft_delete(self, queryset):
+        soft_delete_recipes(queryset)
 
 
 @admin.register(ShoppingCart)
-class AdminShoppingCart(admin.ModelAdmin):
+class AdminShoppingCart(LargeTableAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe__author')
+    search_fields = ('user__email', 'recipe__name')
+    raw_id_fields = ('user', 'recipe')
 
 
 @admin.register(Favorite)
-class AdminFavorite(admin.ModelAdmin):
+class AdminFavorite(LargeTableAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe__author')
+    search_fields = ('user__email', 'recipe__name')
+    raw_id_fields = ('user', 'recipe')
@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from recipe.recommendations import build
+
+
+class Command(BaseCommand):
+    help = 'Расчет похожих рецептов по избранному и спискам покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать все рецепты, а не только изменившиеся'
+        )
+
+    def handle(self, *args, **options):
+        total = build(full=options['full'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано рецептов: {total}')
+        )
@@ -0,0 +1,26 @@
+from django.core.management import BaseCommand
+
+from recipe.popularity import compact, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Обслуживание рейтинга популярных рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-score', type=float, default=None,
+            help='Порог затухшей популярности для удаления строк'
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Пересчитать рейтинг по избранному и спискам покупок'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            total = rebuild()
+            self.stdout.write(f'Пересчитано рецептов: {total}')
+        deleted = compact(options['min_score'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Удалено затухших записей: {deleted}')
+        )
@@ -0,0 +1,78 @@
+import json
+import os
+import shutil
+
+from django.core.management import BaseCommand
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка рецептов в NDJSON и каталог с картинками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Путь к NDJSON файлу')
+        parser.add_argument(
+            '--images', default=None,
+            help='Каталог для картинок (по умолчанию <output>_images)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        output = options['output']
+        images = options['images'] or f'{os.path.splitext(output)[0]}_images'
+        batch_size = options['batch_size']
+        os.makedirs(images, exist_ok=True)
+
+        count = 0
+        with open(output, 'w', encoding='utf-8') as file:
+            for recipe in self.iter_recipes(batch_size):
+                record = self.serialize(recipe, images)
+                file.write(json.dumps(record, ensure_ascii=False))
+                file.write('\n')
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f'Выгружено рецептов: {count}'))
+
+    def iter_recipes(self, batch_size):
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'recipe_ingredients__ingredient'
+        ).order_by('id')
+        last_id = 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                return
+            yield from batch
+            last_id = batch[-1].id
+
+    def serialize(self, recipe, images):
+        return {
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'pub_date': recipe.pub_date.isoformat(),
+            'author': recipe.author.email,
+            'image': self.copy_image(recipe, images),
+            'tags': [tag.slug for tag in recipe.tags.all()],
+            'ingredients': [
+                {
+                    'name': item.ingredient.name,
+                    'measurement_unit': item.ingredient.measurement_unit,
+                    'amount': item.amount,
+                }
+                for item in recipe.recipe_ingredients.all()
+            ],
+        }
+
+    def copy_image(self, recipe, images):
+        if not recipe.image:
+            return None
+        filename = f'{recipe.id}_{os.path.basename(recipe.image.name)}'
+        try:
+            with recipe.image.open('rb') as source, open(
+                os.path.join(images, filename), 'wb'
+            ) as target:
+                shutil.copyfileobj(source, target)
+        except FileNotFoundError:
+            self.stderr.write(f'Нет файла картинки: {recipe.image.name}')
+            return None
+        return filename
@@ -0,0 +1,200 @@
+import json
+import multiprocessing
+import os
+from collections import defaultdict
+from functools import partial
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.management import BaseCommand
+from django.db import connection, connections, transaction
+from django.utils.dateparse import parse_datetime
+from api.cache import feed_cache
+from recipe.models import Ingredient, IngredientAmount, Recipe, Tag
+from sync.log import record as record_changes
+from sync.models import Change
+
+User = get_user_model()
+
+
+def read_chunks(path, size):
+    with open(path, 'r', encoding='utf-8') as file:
+        lines = (line for line in file if line.strip())
+        while True:
+            chunk = [json.loads(line) for line in islice(lines, size)]
+            if not chunk:
+                return
+            yield chunk
+
+
+def resolve_ids(records):
+    emails = {record['author'] for record in records}
+    slugs = {slug for record in records for slug in record['tags']}
+    names = {
+        item['name'] for record in records for item in record['ingredients']
+    }
+    authors = dict(
+        User.objects.filter(email__in=emails).values_list('email', 'id')
+    )
+    tags = dict(Tag.objects.filter(slug__in=slugs).values_list('slug', 'id'))
+    ingredients = {
+        (name, unit): pk for name, unit, pk in Ingredient.objects.filter(
+            name__in=names
+        ).values_list('name', 'measurement_unit', 'id')
+    }
+    return authors, tags, ingredients
+
+
+def existing_recipes(records, authors):
+    """Пары (автор, название) уже загруженных рецептов, включая удаленные.
+
+    По ним повторный запуск пропускает загруженное раньше.
+    """
+    return set(Recipe.all_objects.filter(
+        author_id__in=authors.values(),
+        name__in={record['name'] for record in records}
+    ).values_list('author_id', 'name'))
+
+
+def init_worker():
+    # Родитель закрывает соединения перед fork. Если какое-то осталось,
+    # его сокет общий с родителем: забываем его без close(), процесс
+    # откроет свое соединение.
+    for alias in connections:
+        connections[alias].connection = None
+
+
+def import_chunk(records, images):
+    authors, tags, ingredients = resolve_ids(records)
+    seen = existing_recipes(records, authors)
+    recipes, links, errors, pending = [], [], [], []
+
+    for record in records:
+        author_id = authors.get(record['author'])
+        if author_id is None:
+            errors.append(f'{record["name"]}: нет автора {record["author"]}')
+            continue
+        if (author_id, record['name']) in seen:
+            errors.append(f'{record["name"]}: рецепт автора уже загружен')
+            continue
+        tag_ids = {tags[slug] for slug in record['tags'] if slug in tags}
+        amounts = {}
+        for item in record['ingredients']:
+            key = (item['name'], item['measurement_unit'])
+            if key not in ingredients:
+                errors.append(f'{record["name"]}: нет ингредиента {key}')
+                break
+            # Повтор ингредиента в рецепте складываем в одну строку.
+            amounts[ingredients[key]] = (
+                amounts.get(ingredients[key], 0) + item['amount']
+            )
+        else:
+            seen.add((author_id, record['name']))
+            recipe = Recipe(
+                author_id=author_id,
+                name=record['name'],
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+            )
+            if record.get('image'):
+                pending.append((recipe, record['image']))
+            recipes.append(recipe)
+            links.append((record.get('pub_date'), tag_ids, amounts.items()))
+
+    saved = []
+    try:
+        for recipe, name in pending:
+            with open(os.path.join(images, name), 'rb') as file:
+                recipe.image.save(name, File(file), save=False)
+            saved.append(recipe.image)
+        save_chunk(recipes, links, {pk: slug for slug, pk in tags.items()})
+    except BaseException:
+        # Файлы не участвуют в транзакции: без рецептов они сироты.
+        for image in saved:
+            image.storage.delete(image.name)
+        raise
+    return len(recipes), errors
+
+
+def save_chunk(recipes, links, slugs):
+    """Пишет рецепты пачки одной транзакцией.
+
+    bulk_create не шлет сигналов, поэтому ленту и журнал синхронизации
+    пачка обновляет сама.
+    """
+    with transaction.atomic():
+        Recipe.objects.bulk_create(recipes)
+        dated = []
+        for recipe, (pub_date, _, _) in zip(recipes, links):
+            if pub_date:
+                recipe.pub_date = parse_datetime(pub_date)
+                dated.append(recipe)
+        Recipe.objects.bulk_update(dated, ['pub_date'])
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+            for recipe, (_, tag_ids, _) in zip(recipes, links)
+            for tag_id in tag_ids
+        )
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                recipe_id=recipe.id, ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for recipe, (_, _, amounts) in zip(recipes, links)
+            for ingredient_id, amount in amounts
+        )
+        record_changes(Change.RECIPE, [recipe.id for recipe in recipes])
+
+    feeds = defaultdict(set)
+    for recipe, (_, tag_ids, _) in zip(recipes, links):
+        feeds[recipe.author_id].update(slugs[pk] for pk in tag_ids)
+    for author_id, tags in feeds.items():
+        feed_cache.invalidate(author_id, tags)
+
+
+class Command(BaseCommand):
+    help = 'Загрузка рецептов из NDJSON и каталога с картинками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Путь к NDJSON файлу')
+        parser.add_argument(
+            '--images', default=None,
+            help='Каталог с картинками (по умолчанию <input>_images)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов для параллельной загрузки'
+        )
+
+    def handle(self, *args, **options):
+        source = options['input']
+        images = options['images'] or f'{os.path.splitext(source)[0]}_images'
+        workers = options['workers']
+        chunks = read_chunks(source, options['batch_size'])
+        worker = partial(import_chunk, images=images)
+
+        if connection.vendor == 'sqlite' and workers > 1:
+            self.stderr.write('SQLite не поддерживает параллельную запись, '
+                              'загрузка идет в одном процессе')
+            workers = 1
+
+        total = 0
+        if workers > 1:
+            # Дочерние процессы должны открыть собственные соединения.
+            connections.close_all()
+            with multiprocessing.Pool(workers, init_worker) as pool:
+                results = pool.imap_unordered(worker, chunks)
+                total = self.collect(results)
+        else:
+            total = self.collect(map(worker, chunks))
+        self.stdout.write(self.style.SUCCESS(f'Загружено рецептов: {total}'))
+
+    def collect(self, results):
+        total = 0
+        for created, errors in results:
+            total += created
+            for error in errors:
+                self.stderr.write(error)
+        return total
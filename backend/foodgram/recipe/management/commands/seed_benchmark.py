@@ -0,0 +1,136 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from recipe.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                           ShoppingCart, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = 'Генерация синтетических данных для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Избранных рецептов на пользователя')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='Рецептов в списке покупок на пользователя')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Подписок на пользователя')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        if not ingredient_ids or not tag_ids:
+            raise CommandError('Сначала выполните load_ingredients и '
+                               'load_tags')
+
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(
+                rnd, options['recipes'], user_ids, ingredient_ids, tag_ids
+            )
+            self.create_pairs(
+                Favorite, 'recipe_id', rnd, user_ids, recipe_ids,
+                options['favorites']
+            )
+            self.create_pairs(
+                ShoppingCart, 'recipe_id', rnd, user_ids, recipe_ids,
+                options['carts']
+            )
+            self.create_pairs(
+                Subscription, 'author_id', rnd, user_ids, user_ids,
+                options['subscriptions'], exclude_self=True
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(user_ids)}, '
+            f'рецептов: {len(recipe_ids)}'
+        ))
+
+    def create_users(self, count):
+        offset = User.objects.count()
+        password = make_password('benchmark')
+        users = User.objects.bulk_create(
+            (
+                User(
+                    username=f'bench_{offset + i}',
+                    email=f'bench_{offset + i}@example.com',
+                    first_name='Бенчмарк',
+                    last_name=str(offset + i),
+                    password=password,
+                )
+                for i in range(count)
+            ),
+            batch_size=BATCH_SIZE
+        )
+        return [user.id for user in users]
+
+    def create_recipes(self, rnd, count, user_ids, ingredient_ids, tag_ids):
+        recipes = Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=rnd.choice(user_ids),
+                    name=f'Рецепт {i}',
+                    text='Смешать и подавать. ' * rnd.randint(5, 40),
+                    cooking_time=rnd.randint(5, 180),
+                )
+                for i in range(count)
+            ),
+            batch_size=BATCH_SIZE
+        )
+        recipe_ids = [recipe.id for recipe in recipes]
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in rnd.sample(
+                    tag_ids, rnd.randint(1, len(tag_ids))
+                )
+            ),
+            batch_size=BATCH_SIZE
+        )
+        # В настоящих рецептах чаще всего от 4 до 12 ингредиентов.
+        IngredientAmount.objects.bulk_create(
+            (
+                IngredientAmount(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=rnd.randint(1, 500),
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in rnd.sample(
+                    ingredient_ids,
+                    min(len(ingredient_ids),
+                        max(1, round(rnd.triangular(1, 20, 7))))
+                )
+            ),
+            batch_size=BATCH_SIZE
+        )
+        return recipe_ids
+
+    def create_pairs(self, model, field, rnd, user_ids, target_ids, per_user,
+                     exclude_self=False):
+        if not target_ids:
+            return
+        model.objects.bulk_create(
+            (
+                model(user_id=user_id, **{field: target_id})
+                for user_id in user_ids
+                for target_id in rnd.sample(
+                    target_ids, min(per_user, len(target_ids))
+                )
+                if not (exclude_self and target_id == user_id)
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True
+        )
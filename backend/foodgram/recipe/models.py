@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.core import validators
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -21,6 +22,10 @@ class Tag(models.Model):
         max_length=7,
         unique=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
 
     class Meta:
         verbose_name = 'Тег'
@@ -40,6 +45,10 @@ class Ingredient(models.Model):
         verbose_name='Единица измерения',
         max_length=200
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
 
     class Meta:
         verbose_name = 'Ингредиент'
@@ -50,6 +59,13 @@ class Ingredient(models.Model):
         return f'{self.name}, {self.measurement_unit}'
 
 
+class RecipeManager(models.Manager):
+    """Рецепты без помеченных на удаление."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Recipe(models.Model):
     tags = models.ManyToManyField(
         Tag,
@@ -91,11 +107,31 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+    deleted_at = models.DateTimeField(
+        'Дата удаления',
+        null=True,
+        blank=True,
+        editable=False
+    )
+
+    objects = RecipeManager()
+    all_objects = models.Manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date', )
+        indexes = (
+            models.Index(
+                fields=('deleted_at',),
+                condition=models.Q(deleted_at__isnull=False),
+                name='recipe_deleted_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}, {self.author.username}'
@@ -114,6 +150,11 @@ class ShoppingCart(models.Model):
         related_name='shopping_cart',
         verbose_name='Рецепт'
     )
+    created_at = models.DateTimeField(
+        'Дата добавления',
+        default=timezone.now,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -141,6 +182,11 @@ class Favorite(models.Model):
         related_name='favotires',
         verbose_name='Рецепт'
     )
+    created_at = models.DateTimeField(
+        'Дата добавления',
+        default=timezone.now,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -179,3 +225,76 @@ class IngredientAmount(models.Model):
 
     def __str__(self):
         return f'{self.ingredient} {self.recipe} {self.amount}'
+
+
+class RecipePopularity(models.Model):
+    """Материализованный рейтинг популярности рецепта.
+
+    score - логарифм суммы весов событий, растущих со временем, поэтому
+    порядок по score совпадает с порядком по затухающей популярности.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='popularity',
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField('Рейтинг', db_index=True)
+
+    class Meta:
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id} {self.score}'
+
+
+class RecipeSimilarity(models.Model):
+    """Top-K похожих рецептов по совместному избранному и покупкам."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similarities',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similarity',
+            ),
+        )
+        indexes = (
+            models.Index(fields=('recipe', '-score'),
+                         name='similarity_lookup_idx'),
+        )
+
+
+class RecipeInteractionState(models.Model):
+    """Отпечаток пользователей рецепта на момент расчета похожих."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+    fingerprint = models.BigIntegerField('Отпечаток')
+
+    class Meta:
+        verbose_name = 'Состояние рецепта для рекомендаций'
+        verbose_name_plural = 'Состояния рецептов для рекомендаций'
@@ -0,0 +1,122 @@
+"""Инкрементальный рейтинг популярности с экспоненциальным затуханием.
+
+Событие в момент t весит weight * 2 ** ((t - EPOCH) / half_life): вместо
+того чтобы уменьшать старые оценки, новые события получают больший вес.
+В таблице хранится натуральный логарифм суммы весов, поэтому значения не
+переполняются и не требуют периодического пересчета.
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+from .models import Favorite, RecipePopularity, ShoppingCart
+
+EPOCH = datetime(2022, 1, 1, tzinfo=dt_timezone.utc)
+
+# Оценка в пределах TOLERANCE от веса события состоит только из него.
+TOLERANCE = 1e-9
+
+
+def time_weight(now=None):
+    """Логарифм роста веса событий к моменту now."""
+    half_life = settings.POPULARITY['HALF_LIFE_DAYS'] * 24 * 60 * 60
+    elapsed = ((now or timezone.now()) - EPOCH).total_seconds()
+    return elapsed / half_life * math.log(2)
+
+
+def event_weight(kind, now=None):
+    return time_weight(now) + math.log(settings.POPULARITY['WEIGHTS'][kind])
+
+
+def log_add(a, b):
+    """log(e^a + e^b) без переполнения."""
+    if a is None:
+        return b
+    return max(a, b) + math.log1p(math.exp(-abs(a - b)))
+
+
+def add(recipe_ids, kind, now=None):
+    """Учитывает событие kind ('favorite' или 'shopping_cart') в момент now.
+
+    now должен совпадать с created_at связи: remove вычтет вес на этот
+    момент.
+    """
+    ids = set(recipe_ids)
+    if not ids:
+        return
+    weight = Value(event_weight(kind, now))
+    existing = set(RecipePopularity.objects.filter(
+        recipe_id__in=ids
+    ).values_list('recipe_id', flat=True))
+    if existing:
+        # log(e^a + e^b) = max(a, b) + log(1 + e^-|a - b|)
+        RecipePopularity.objects.filter(recipe_id__in=existing).update(
+            score=Greatest(F('score'), weight) + Ln(
+                Value(1.0) + Exp(-Abs(F('score') - weight))
+            )
+        )
+    RecipePopularity.objects.bulk_create(
+        (RecipePopularity(recipe_id=pk, score=weight.value)
+         for pk in ids - existing),
+        ignore_conflicts=True
+    )
+
+
+def remove(events, kind):
+    """Отменяет события kind, пары (id рецепта, created_at связи).
+
+    Вычитается ровно тот вес, который событие добавило в момент
+    created_at, а не вес события на текущий момент.
+    """
+    weights = {
+        pk: event_weight(kind, created_at) for pk, created_at in events
+    }
+    if not weights:
+        return
+    weight = Case(
+        *(When(recipe_id=pk, then=Value(value))
+          for pk, value in weights.items()),
+        output_field=FloatField()
+    )
+    rows = RecipePopularity.objects.filter(recipe_id__in=weights)
+    rows.filter(score__lte=weight + TOLERANCE).delete()
+    # log(e^a - e^b) = a + log(1 - e^(b - a)) при a > b
+    rows.update(
+        score=F('score') + Ln(Value(1.0) - Exp(weight - F('score')))
+    )
+
+
+def compact(min_score=None):
+    """Удаляет рецепты, чья затухшая популярность ниже min_score."""
+    min_score = min_score or settings.POPULARITY['MIN_SCORE']
+    deleted, _ = RecipePopularity.objects.filter(
+        score__lt=time_weight() + math.log(min_score)
+    ).delete()
+    return deleted
+
+
+def rebuild(batch_size=2000):
+    """Пересчет по текущим избранному и спискам покупок с их датами."""
+    totals = {}
+    for model, kind in ((Favorite, 'favorite'),
+                        (ShoppingCart, 'shopping_cart')):
+        rows = model.objects.filter(
+            recipe__deleted_at__isnull=True
+        ).values_list('recipe_id', 'created_at')
+        for pk, created_at in rows.order_by().iterator(batch_size):
+            totals[pk] = log_add(
+                totals.get(pk), event_weight(kind, created_at)
+            )
+    scores = [
+        RecipePopularity(recipe_id=pk, score=score)
+        for pk, score in totals.items()
+    ]
+    with transaction.atomic():
+        RecipePopularity.objects.all().delete()
+        RecipePopularity.objects.bulk_create(scores, batch_size=batch_size)
+    return len(scores)
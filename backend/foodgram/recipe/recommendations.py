@@ -0,0 +1,109 @@
+"""Похожие рецепты по совместным избранному и спискам покупок.
+
+Матрица пользователь x рецепт хранится разреженно: множества рецептов по
+пользователям и пользователей по рецептам. Совместная встречаемость рецепта
+с остальными - сумма строк его пользователей, сходство - косинусное.
+"""
+import heapq
+import math
+import zlib
+from array import array
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import (Favorite, RecipeInteractionState, RecipeSimilarity,
+                     ShoppingCart)
+
+
+def load_matrix():
+    users = defaultdict(set)
+    for model in (Favorite, ShoppingCart):
+        for user_id, recipe_id in model.objects.values_list(
+                'user_id', 'recipe_id').order_by().iterator():
+            users[user_id].add(recipe_id)
+    # Пользователи с огромными списками почти ничего не говорят о сходстве,
+    # но дают квадратичное число пар.
+    limit = settings.RECOMMENDATIONS['MAX_USER_ITEMS']
+    users = {
+        user_id: recipes for user_id, recipes in users.items()
+        if len(recipes) <= limit
+    }
+    recipes = defaultdict(set)
+    for user_id, items in users.items():
+        for recipe_id in items:
+            recipes[recipe_id].add(user_id)
+    return users, recipes
+
+
+def fingerprint(user_ids):
+    return zlib.crc32(array('q', sorted(user_ids)).tobytes())
+
+
+def top_similar(recipe_id, users, recipes):
+    """Пары (сходство, -id), при равном сходстве выше меньший id."""
+    config = settings.RECOMMENDATIONS
+    counts = Counter()
+    for user_id in recipes[recipe_id]:
+        counts.update(users[user_id])
+    del counts[recipe_id]
+    norm = len(recipes[recipe_id])
+    return heapq.nlargest(config['TOP_K'], (
+        (common / math.sqrt(norm * len(recipes[other])), -other)
+        for other, common in counts.items()
+        if common >= config['MIN_COMMON']
+    ))
+
+
+def dirty_recipes(users, recipes):
+    """Рецепты, чьи списки похожих могли измениться с прошлого расчета.
+
+    Это рецепты с изменившимися пользователями, рецепты, которые сейчас
+    встречаются вместе с ними, и рецепты, у которых они уже в списке.
+    """
+    stored = dict(RecipeInteractionState.objects.values_list(
+        'recipe_id', 'fingerprint'
+    ))
+    changed = {
+        recipe_id for recipe_id, user_ids in recipes.items()
+        if stored.pop(recipe_id, None) != fingerprint(user_ids)
+    }
+    # Оставшиеся в stored рецепты потеряли всех пользователей.
+    changed.update(stored)
+    dirty = set(changed)
+    for recipe_id in changed:
+        for user_id in recipes.get(recipe_id, ()):
+            dirty.update(users[user_id])
+    dirty.update(RecipeSimilarity.objects.filter(
+        similar_id__in=changed
+    ).values_list('recipe_id', flat=True))
+    return dirty
+
+
+def build(full=False, batch_size=2000):
+    """Пересчитывает похожие рецепты, возвращает число пересчитанных."""
+    users, recipes = load_matrix()
+    targets = set(recipes) if full else dirty_recipes(users, recipes)
+    rows = [
+        RecipeSimilarity(recipe_id=recipe_id, similar_id=-other, score=score)
+        for recipe_id in targets if recipe_id in recipes
+        for score, other in top_similar(recipe_id, users, recipes)
+    ]
+    states = [
+        RecipeInteractionState(
+            recipe_id=recipe_id, fingerprint=fingerprint(user_ids)
+        )
+        for recipe_id, user_ids in recipes.items()
+    ]
+    with transaction.atomic():
+        similarities = RecipeSimilarity.objects.all()
+        if not full:
+            similarities = similarities.filter(recipe_id__in=targets)
+        similarities.delete()
+        RecipeSimilarity.objects.bulk_create(rows, batch_size=batch_size)
+        RecipeInteractionState.objects.all().delete()
+        RecipeInteractionState.objects.bulk_create(
+            states, batch_size=batch_size
+        )
+    return len(targets)
@@ -0,0 +1,32 @@
+import os
+
+from jobs.queue import task
+
+from . import popularity, recommendations
+from .management.commands.import_recipes import import_chunk, read_chunks
+
+
+@task('import_recipes')
+def import_recipes(job):
+    """Загрузка NDJSON-выгрузки, лежащей на сервере."""
+    source = job.payload['input']
+    images = (job.payload.get('images')
+              or f'{os.path.splitext(source)[0]}_images')
+    created, errors = 0, []
+    for chunk in read_chunks(source, job.payload.get('batch_size', 1000)):
+        count, chunk_errors = import_chunk(chunk, images)
+        created += count
+        errors.extend(chunk_errors)
+    return {'created': created, 'errors': errors}
+
+
+@task('compact_popularity')
+def compact_popularity(job):
+    return {'deleted': popularity.compact(job.payload.get('min_score'))}
+
+
+@task('build_recommendations')
+def build_recommendations(job):
+    return {'recipes': recommendations.build(
+        full=job.payload.get('full', False)
+    )}
@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from api.admin import LargeTableAdmin
+
+from .models import Change
+
+
+@admin.register(Change)
+class AdminChange(LargeTableAdmin):
+    list_display = ('id', 'kind', 'object_id', 'user', 'deleted',
+                    'created_at')
+    list_select_related = ('user',)
+    list_filter = ('kind', 'deleted')
+    raw_id_fields = ('user',)
@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Change
+
+
+def record(kind, object_ids, user_id=None, deleted=False):
+    """Пишет изменения после коммита транзакции.
+
+    Так в журнал не попадают откаченные изменения, а запись появляется
+    не раньше самого изменения. Порядок id при этом не совпадает с порядком
+    коммитов, его учитывает SYNC['LAG'] в представлении синхронизации.
+    """
+    changes = [
+        Change(kind=kind, object_id=pk, user_id=user_id, deleted=deleted)
+        for pk in object_ids
+    ]
+    if changes:
+        transaction.on_commit(lambda: Change.objects.bulk_create(changes))
+
+
+def compact():
+    """Оставляет последнюю запись по каждому объекту и удаляет
+    надгробия старше SYNC['RETENTION'].
+
+    Ответ синхронизации строится по текущему состоянию объектов, поэтому
+    более ранние записи того же объекта ничего не добавляют.
+    """
+    latest = Change.objects.values('kind', 'object_id', 'user').annotate(
+        last=Max('id')
+    ).values('last')
+    superseded, _ = Change.objects.exclude(id__in=latest).delete()
+    horizon = timezone.now() - timedelta(
+        seconds=settings.SYNC['RETENTION']
+    )
+    tombstones, _ = Change.objects.filter(
+        deleted=True, created_at__lt=horizon
+    ).delete()
+    return superseded, tombstones
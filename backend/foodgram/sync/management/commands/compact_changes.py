@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from sync.log import compact
+
+
+class Command(BaseCommand):
+    help = 'Сжатие журнала изменений для синхронизации'
+
+    def handle(self, *args, **options):
+        superseded, tombstones = compact()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено устаревших записей: {superseded}, '
+            f'надгробий: {tombstones}'
+        ))
@@ -0,0 +1,37 @@
+# Generated by Django 4.0.6 on 2026-10-19 09:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('recipes', 'Рецепт'), ('tags', 'Тег'), ('ingredients', 'Ингредиент'), ('users', 'Пользователь'), ('favorites', 'Избранное'), ('shopping_cart', 'Список покупок')], max_length=20, verbose_name='Тип')),
+                ('object_id', models.BigIntegerField(verbose_name='Объект')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Удален')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Владелец')),
+            ],
+            options={
+                'verbose_name': 'Изменение',
+                'verbose_name_plural': 'Журнал изменений',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['kind', 'object_id', 'user'], name='change_object_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+User = get_user_model()
+
+
+class Change(models.Model):
+    """Запись журнала изменений для синхронизации клиентов.
+
+    id служит монотонным курсором. Для избранного и списка покупок
+    заполнен user: такие записи видит только их владелец.
+    """
+
+    RECIPE = 'recipes'
+    TAG = 'tags'
+    INGREDIENT = 'ingredients'
+    USER = 'users'
+    FAVORITE = 'favorites'
+    SHOPPING_CART = 'shopping_cart'
+    KIND_CHOICES = (
+        (RECIPE, 'Рецепт'),
+        (TAG, 'Тег'),
+        (INGREDIENT, 'Ингредиент'),
+        (USER, 'Пользователь'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Список покупок'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField('Тип', max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField('Объект')
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Владелец'
+    )
+    deleted = models.BooleanField('Удален', default=False)
+    created_at = models.DateTimeField('Время', auto_now_add=True)
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+        indexes = (
+            models.Index(fields=('kind', 'object_id', 'user'),
+                         name='change_object_idx'),
+        )
+
+    def __str__(self):
+        action = 'удален' if self.deleted else 'изменен'
+        return f'#{self.id} {self.kind} {self.object_id} {action}'
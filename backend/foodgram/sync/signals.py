@@ -0,0 +1,57 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from recipe.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+
+from .log import record
+from .models import Change
+
+User = get_user_model()
+
+KINDS = {
+    Recipe: Change.RECIPE,
+    Tag: Change.TAG,
+    Ingredient: Change.INGREDIENT,
+    User: Change.USER,
+}
+
+USER_KINDS = {
+    Favorite: Change.FAVORITE,
+    ShoppingCart: Change.SHOPPING_CART,
+}
+
+
+def object_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    record(KINDS[sender], (instance.pk,))
+
+
+def object_deleted(sender, instance, **kwargs):
+    record(KINDS[sender], (instance.pk,), deleted=True)
+
+
+def relation_saved(sender, instance, created, **kwargs):
+    if created:
+        record(USER_KINDS[sender], (instance.recipe_id,), instance.user_id)
+
+
+for model in KINDS:
+    post_save.connect(object_saved, sender=model)
+    post_delete.connect(object_deleted, sender=model)
+
+# Удаления избранного и списка покупок пишут представления: приемник
+# post_delete заставил бы Django выбирать строки перед каждым DELETE.
+for model in USER_KINDS:
+    post_save.connect(relation_saved, sender=model)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        record(Change.RECIPE, pk_set or ())
+    else:
+        record(Change.RECIPE, (instance.pk,))
@@ -0,0 +1,9 @@
+from jobs.queue import task
+
+from .log import compact
+
+
+@task('compact_changes')
+def compact_changes(job):
+    superseded, tombstones = compact()
+    return {'superseded': superseded, 'tombstones': tombstones}
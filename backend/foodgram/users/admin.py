@@ -1,18 +1,27 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 
+from api.admin import LargeTableAdmin, SoftDeleteAdmin
+from api.deletion import soft_delete_users
+
 from .models import Subscription
 
 User = get_user_model()
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(SoftDeleteAdmin):
     list_display = ('id', 'first_name', 'last_name', 'username', 'email')
-    list_filter = ('first_name', 'email')
+    list_filter = ('is_staff', 'is_active')
+    search_fields = ('^username', '^email', '^first_name', '^last_name')
+
+    def soft_delete(self, queryset):
+        soft_delete_users(queryset)
 
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(LargeTableAdmin):
     list_display = ('user', 'author')
-    list_filter = ('user', 'author')
+    list_select_related = ('user', 'author')
+    search_fields = ('user__email', 'author__email')
+    autocomplete_fields = ('user', 'author')
@@ -0,0 +1,32 @@
+# Generated by Django 4.0.6 on 2026-10-19 09:23
+
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+def delete_self_subscriptions(apps, schema_editor):
+    Subscription = apps.get_model('users', 'Subscription')
+    Subscription.objects.filter(
+        user=django.db.models.expressions.F('author')
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='subscription',
+            options={'ordering': ('author_id',), 'verbose_name': 'Подписка', 'verbose_name_plural': 'Подписки'},
+        ),
+        migrations.RunPython(
+            delete_self_subscriptions, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.CheckConstraint(check=models.Q(('user', django.db.models.expressions.F('author')), _negated=True), name='prevent_self_subscription'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Upper
 
 
 class User(AbstractUser):
@@ -16,6 +18,16 @@ class User(AbstractUser):
         max_length=254,
         unique=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+    deleted_at = models.DateTimeField(
+        'Дата удаления',
+        null=True,
+        blank=True,
+        editable=False
+    )
 
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
     USERNAME_FIELD = 'email'
@@ -24,6 +36,12 @@ class User(AbstractUser):
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
         ordering = ('id',)
+        indexes = (
+            models.Index(Upper('username'), name='user_username_upper_idx'),
+            models.Index(Upper('first_name'),
+                         name='user_first_name_upper_idx'),
+            models.Index(Upper('last_name'), name='user_last_name_upper_idx'),
+        )
 
     def __str__(self):
         return self.email
@@ -52,6 +70,10 @@ class Subscription(models.Model):
                 fields=('user', 'author',),
                 name='unique_subscription'
             ),
+            models.CheckConstraint(
+                check=~Q(user=F('author')),
+                name='prevent_self_subscription'
+            ),
         )
 
     def __str__(self):